@@ -0,0 +1,53 @@
+"""
+Compares the batch balance methods of ESretail with a loop calling the per-product methods.
+
+Usage:
+    python -m benchmarks.bench_balance_batch [--rows 1000000] [--products 5000] [--days 365]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+from src.retail import ESretail
+from benchmarks.synthetic import make_transactions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = np.random.default_rng(0)
+    df = make_transactions(args.rows).rename(columns={'description': 'name'})
+    df['name'] = [f"Product {i:05d}" for i in rng.integers(0, args.products, args.rows)]
+    dates = np.datetime64('2020-01-01') + rng.integers(0, args.days, args.rows)
+    df['transaction_date'] = dates.astype(str)
+    product_names = sorted(df['name'].unique())
+
+    with tempfile.TemporaryDirectory() as folder:
+        retail = ESretail(os.path.join(folder, 'retail.db'))
+        retail.bulk_import(df)
+
+        for label, loop, batch in [
+            ("balance", lambda name: retail.get_balance_by_date_sql(name), retail.get_balance_by_date_batch),
+            ("cumulated balance", lambda name: retail.get_cumulated_balance_by_date(name), retail.get_cumulated_balance_by_date_batch),
+        ]:
+            start = time.perf_counter()
+            for name in product_names:
+                loop(name)
+            loop_time = time.perf_counter() - start
+            start = time.perf_counter()
+            batch(product_names)
+            batch_time = time.perf_counter() - start
+            print(f"{label:>18}: {len(product_names)} products, loop {loop_time:.2f}s, batch {batch_time:.2f}s, "
+                  f"speedup {loop_time / batch_time:.0f}x")
+        retail.conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the time and the peak of memory allocated by ESretail.bulk_import, which binds tuples built batch by
+batch from the columns, with the former load path converting the DataFrame to a dict per row.
+
+Usage:
+    python -m benchmarks.bench_bulk_import [--rows 1000000] [--batch-size 10000]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from src.retail import ALL_SCOPE, BUMP_VERSION_QUERY, ESretail, date_scope, product_scope, to_cents
+from benchmarks.synthetic import make_transactions
+
+
+def bulk_import_records(retail: ESretail, df: pd.DataFrame, batch_size: int) -> int:
+    """
+    The former bulk_import: a dict per row, checked one by one, bound by name.
+    """
+    retail.migrate()
+    df = df.assign(amount_excl_tax_cents=to_cents(df['amount_excl_tax']), amount_inc_tax_cents=to_cents(df['amount_inc_tax']))
+    cents = df[['amount_excl_tax_cents', 'amount_inc_tax_cents']]
+    df = df.assign(**cents.astype(object).where(cents.notna(), None))
+    list_dict = df.to_dict(orient="records")
+    for record in list_dict:
+        if 'transaction_date' not in record or record.get('transaction_date') is None:
+            raise ValueError("Transaction date is missing or None.")
+
+    sql_query = """
+    INSERT INTO transactions (id, category, product_id, quantity, amount_excl_tax_cents, amount_inc_tax_cents, transaction_date)
+    VALUES (:id, :category, (SELECT product_id FROM products WHERE name = IFNULL(:name, '')),
+            :quantity, :amount_excl_tax_cents, :amount_inc_tax_cents, :transaction_date)
+    ON CONFLICT (id) DO NOTHING
+    """
+    products_query = "INSERT OR IGNORE INTO products (name) VALUES (IFNULL(:name, ''))"
+    inserted = 0
+    with retail.conn:
+        for i in range(0, len(list_dict), batch_size):
+            batch_dict = list_dict[i:i + batch_size]
+            retail.cursor.executemany(products_query, batch_dict)
+            retail.cursor.executemany(sql_query, batch_dict)
+            inserted += retail.cursor.rowcount
+            scopes = {ALL_SCOPE}
+            scopes.update(date_scope(record['transaction_date']) for record in batch_dict)
+            scopes.update(product_scope('' if pd.isna(record['name']) else record['name']) for record in batch_dict)
+            retail.cursor.executemany(BUMP_VERSION_QUERY, [(scope,) for scope in scopes])
+    return inserted
+
+
+def bulk_import_columns(retail: ESretail, df: pd.DataFrame, batch_size: int) -> int:
+    return retail.bulk_import(df, batch_size=batch_size)
+
+
+def measure(function, df: pd.DataFrame, batch_size: int, trace_memory: bool) -> tuple[int, float, int]:
+    """
+    Loads the DataFrame into a new database and returns the rows inserted, the seconds and the peak of memory allocated.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        retail = ESretail(os.path.join(folder, 'retail.db'), profile='ingest')
+        retail.migrate()
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        inserted = function(retail, df, batch_size)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        tracemalloc.stop()
+        retail.conn.close()
+    return inserted, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    df = make_transactions(args.rows).rename(columns={'description': 'name'}).assign(transaction_date='2022-01-15')
+    print(f"{'method':>16} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'peak MB':>9}")
+    for name, function in (("dict per row", bulk_import_records), ("columns", bulk_import_columns)):
+        # The time is measured without tracemalloc, which slows the allocations down
+        inserted, elapsed, _ = measure(function, df, args.batch_size, trace_memory=False)
+        _, _, peak = measure(function, df, args.batch_size, trace_memory=True)
+        print(f"{name:>16} {inserted:>9} {elapsed:>9.2f} {inserted / elapsed:>10.0f} {peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measures the footprint of the categorical encoding of the transactions.
+
+Compares the memory of the validated DataFrame with object and category columns, the size of its Parquet file
+with plain and dictionary-encoded strings, and the size of the SQLite database keyed on the product name
+(schema version 6) and on the integer key of the products dimension (current schema, name column dropped).
+
+Usage:
+    python -m benchmarks.bench_compact_encoding [--rows 1000000] [--workdir bench_db]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+from src.etl import Cols, read_transaction_file
+from src.retail import MIGRATIONS, ESretail
+from benchmarks.synthetic import make_transactions
+
+
+def file_size(path: str) -> float:
+    return os.path.getsize(path) / 1e6
+
+
+def build_database(db_path: str, df: pd.DataFrame, version: int) -> float:
+    """
+    Loads the transactions in a new database migrated to a schema version and returns its size in MB.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    if version < len(MIGRATIONS):
+        # Same statement as bulk_import, without the product_id and the cents of the later schemas
+        df = df.assign(amount_excl_tax=df['amount_excl_tax_cents'] / 100, amount_inc_tax=df['amount_inc_tax_cents'] / 100)
+        conn = sqlite3.connect(db_path)
+        with conn:
+            for statements in MIGRATIONS[:version]:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.executemany(
+                "INSERT INTO transactions (id, category, name, quantity, amount_excl_tax, amount_inc_tax, transaction_date) "
+                "VALUES (:id, :category, :name, :quantity, :amount_excl_tax, :amount_inc_tax, :transaction_date)",
+                df.to_dict(orient="records"))
+        conn.execute("VACUUM")
+        conn.close()
+    else:
+        retail = ESretail(db_path)
+        retail.bulk_import(df)
+        # The compaction applied on demand, which vacuums the database
+        retail.drop_name_column()
+        retail.conn.close()
+    return file_size(db_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workdir", default="bench_db")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv_path = os.path.join(folder, "transactions.csv")
+        make_transactions(args.rows).to_csv(csv_path, index=False)
+        categorical_df, _ = read_transaction_file(pd.read_csv(csv_path))
+    object_df = categorical_df.astype({Cols.category: object, Cols.description: object})
+
+    print(f"DataFrame, object columns:      {object_df.memory_usage(deep=True).sum() / 1e6:8.1f} MB")
+    print(f"DataFrame, category columns:    {categorical_df.memory_usage(deep=True).sum() / 1e6:8.1f} MB")
+
+    for label, df in (("plain strings", object_df), ("dictionary", categorical_df)):
+        parquet_path = os.path.join(workdir, "encoding.parquet")
+        df.to_parquet(parquet_path, index=False, engine='fastparquet')
+        print(f"Parquet, {label + ':':22}{file_size(parquet_path):8.1f} MB")
+        os.remove(parquet_path)
+
+    load_df = categorical_df.rename(columns={Cols.description: 'name'}).assign(transaction_date='2024-01-01')
+    db_path = os.path.join(workdir, "encoding.db")
+    print(f"SQLite, name keys (v6):         {build_database(db_path, load_df, 6):8.1f} MB")
+    print(f"SQLite, product_id keys (v{len(MIGRATIONS)}):   {build_database(db_path, load_df, len(MIGRATIONS)):8.1f} MB")
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
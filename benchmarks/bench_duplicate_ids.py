@@ -0,0 +1,72 @@
+"""
+Compares the memory per id and the time of the duplicate detection with DuplicateIds (128-bit keys in sorted
+NumPy arrays) and with the former set of Python strings, the ids being added chunk by chunk.
+
+Usage:
+    python -m benchmarks.bench_duplicate_ids [--rows 10000000] [--chunk-size 100000] [--duplicate-rate 0.01]
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+import numpy as np
+import pandas as pd
+from src.etl import DuplicateIds
+
+
+def make_ids(n_rows: int, duplicate_rate: float, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    random_bytes = rng.bytes(16 * n_rows)
+    ids = np.array([str(uuid.UUID(bytes=random_bytes[i:i + 16], version=4)) for i in range(0, 16 * n_rows, 16)], dtype=object)
+    copies = rng.random(n_rows) < duplicate_rate
+    ids[copies] = ids[rng.integers(0, n_rows, copies.sum())]
+    return pd.Series(ids)
+
+
+def with_set(ids: pd.Series, chunk_size: int) -> int:
+    seen_ids = set()
+    duplicated_ids = set()
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids.iloc[start:start + chunk_size]
+        duplicated_ids.update(chunk[chunk.duplicated() | chunk.isin(seen_ids)])
+        seen_ids.update(chunk)
+    return len(duplicated_ids)
+
+
+def with_duplicate_ids(ids: pd.Series, chunk_size: int) -> int:
+    duplicate_ids = DuplicateIds()
+    for start in range(0, len(ids), chunk_size):
+        duplicate_ids.add(ids.iloc[start:start + chunk_size])
+    print(f"DuplicateIds reports {duplicate_ids.bytes_per_id:.1f} bytes per id")
+    return len(duplicate_ids)
+
+
+def measure(function, ids: pd.Series, chunk_size: int) -> tuple[int, float, float]:
+    """
+    Returns the number of duplicated ids, the seconds and the peak of memory allocated, in bytes per id.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    duplicated = function(ids, chunk_size)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duplicated, elapsed, peak / len(ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    ids = make_ids(args.rows, args.duplicate_rate)
+    print(f"{'method':>14} {'duplicated':>11} {'seconds':>9} {'peak bytes/id':>14}")
+    for name, function in (("set of str", with_set), ("DuplicateIds", with_duplicate_ids)):
+        duplicated, elapsed, peak_per_id = measure(function, ids, args.chunk_size)
+        print(f"{name:>14} {duplicated:>11} {elapsed:>9.2f} {peak_per_id:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
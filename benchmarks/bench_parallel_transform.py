@@ -0,0 +1,43 @@
+"""
+Compares the validation of a large CSV file by one process and by a pool of processes.
+
+Usage:
+    python -m benchmarks.bench_parallel_transform [--rows 10000000] [--processes 2 4 8 16 32] [--workdir bench_db]
+"""
+import argparse
+import os
+import time
+from src.etl import read_transaction_csv, read_transaction_file, read_transaction_file_parallel
+from benchmarks.synthetic import make_transactions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    parser.add_argument("--workdir", default="bench_db")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    csv_path = os.path.join(workdir, f"transactions_{args.rows}.csv")
+    if not os.path.exists(csv_path):
+        make_transactions(args.rows).to_csv(csv_path, index=False)
+    print(f"CSV file: {os.path.getsize(csv_path) / 1e6:.0f} MB, {os.cpu_count()} CPU(s)")
+
+    # Same parse and validation as transforme_transactions with one process
+    start = time.perf_counter()
+    read_transaction_file(read_transaction_csv(csv_path))
+    single = time.perf_counter() - start
+    print(f"{'processes':>10} {'seconds':>10} {'speedup':>9}")
+    print(f"{1:>10} {single:>10.2f} {1:>8.1f}x")
+
+    for processes in args.processes:
+        start = time.perf_counter()
+        read_transaction_file_parallel(csv_path, processes)
+        elapsed = time.perf_counter() - start
+        print(f"{processes:>10} {elapsed:>10.2f} {single / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
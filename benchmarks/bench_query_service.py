@@ -0,0 +1,83 @@
+"""
+Measures the latency of the analytical queries for many concurrent asyncio callers: with a new ESretail
+per call run in a thread, and with AsyncESretail with and without the coalescing of identical calls.
+
+Usage:
+    python -m benchmarks.bench_query_service [--history-rows 1000000] [--callers 100 200 500] [--pool-size 4] [--workdir bench_db]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from src.retail import ESretail
+from src.query_service import AsyncESretail
+from benchmarks.bench_sqlite_profiles import build_history
+from benchmarks.synthetic import PRODUCTS
+
+QUERIES = [
+    ('count_transactions_by_date', ('2019-01-02',)),
+    ('sum_total_transaction', ()),
+    *[('get_balance_by_date_sql', (name,)) for name in PRODUCTS],
+    *[('get_cumulated_balance_by_date', (name,)) for name in PRODUCTS],
+]
+
+
+def new_connection_per_call(db_path: str, method: str, args: tuple):
+    retail = ESretail(db_path)
+    try:
+        return getattr(retail, method)(*args)
+    finally:
+        retail.conn.close()
+
+
+async def run_callers(callers: int, call) -> list[float]:
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(QUERIES), callers)
+
+    async def caller(i: int) -> float:
+        method, args = QUERIES[picks[i]]
+        start = time.perf_counter()
+        await call(method, args)
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*[caller(i) for i in range(callers)])
+
+
+async def bench(db_path: str, callers: int, pool_size: int) -> dict[str, list[float]]:
+    latencies = {
+        'ESretail per call': await run_callers(
+            callers, lambda method, args: asyncio.to_thread(new_connection_per_call, db_path, method, args)),
+    }
+    for coalesce in (False, True):
+        async with AsyncESretail(db_path, pool_size=pool_size, coalesce=coalesce) as service:
+            name = f"AsyncESretail{' coalesced' if coalesce else ''}"
+            latencies[name] = await run_callers(callers, lambda method, args: getattr(service, method)(*args))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-rows", type=int, default=1_000_000)
+    parser.add_argument("--file-rows", type=int, default=100_000)
+    parser.add_argument("--callers", type=int, nargs="+", default=[100, 200, 500])
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--workdir", default="bench_db")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, f"history_{args.history_rows}.db")
+    build_history(db_path, args.history_rows, args.file_rows)
+
+    print(f"{'callers':>8} {'method':>26} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    for callers in args.callers:
+        for name, latencies in asyncio.run(bench(db_path, callers, args.pool_size)).items():
+            p50, p95, worst = np.percentile(latencies, [50, 95, 100]) * 1000
+            print(f"{callers:>8} {name:>26} {p50:>9.1f} {p95:>9.1f} {worst:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
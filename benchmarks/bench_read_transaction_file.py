@@ -0,0 +1,63 @@
+"""
+Compares the column-wise read_transaction_file with the former row-by-row loop.
+
+Usage:
+    python -m benchmarks.bench_read_transaction_file [--sizes 10000 1000000 10000000] [--legacy-max-rows 1000000]
+"""
+import argparse
+import time
+import pandas as pd
+from src.etl import Cols, read_transaction_file
+from benchmarks.synthetic import make_transactions
+
+
+def legacy_read_transaction_file(df: pd.DataFrame) -> tuple[pd.DataFrame, list]:
+    """
+    Row-by-row implementation of read_transaction_file kept as the benchmark reference.
+    """
+    bad_lines = []
+    clean_lines = []
+    for i in range(df.shape[0]):
+        id = str(df[Cols.id].iloc[i])
+        try:
+            transaction_dict = {
+                Cols.id: id,
+                Cols.category: str(df[Cols.category].iloc[i]),
+                Cols.description: str(df[Cols.description].iloc[i]),
+                Cols.quantity: int(df[Cols.quantity].iloc[i]),
+                Cols.amount_excl_tax: round(float(df[Cols.amount_excl_tax].iloc[i]), 2),
+                Cols.amount_inc_tax: round(float(df[Cols.amount_inc_tax].iloc[i]), 2),
+            }
+        except ValueError:
+            bad_lines.append(id)
+            continue
+        clean_lines.append(transaction_dict)
+    return pd.DataFrame(clean_lines, columns=list(df.columns)), bad_lines
+
+
+def timed(function, df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    function(df)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000_000,
+                        help="Skip the row-by-row loop above this size, it takes minutes per million rows.")
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'loop (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for size in args.sizes:
+        df = make_transactions(size)
+        vectorized = timed(read_transaction_file, df)
+        if size <= args.legacy_max_rows:
+            legacy = timed(legacy_read_transaction_file, df)
+            print(f"{size:>12} {legacy:>12.3f} {vectorized:>15.3f} {legacy / vectorized:>8.0f}x")
+        else:
+            print(f"{size:>12} {'skipped':>12} {vectorized:>15.3f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measures ingest and query throughput of each ESretail connection profile.
+
+A history database is built once in the work folder (about 100 bytes per row, use --history-rows 30000000
+for a database of several GB), then for each profile a copy of it receives new files through bulk_import
+and the analytical queries are run against it. The history is left in rollback journal mode, each copy
+being switched to WAL by the ingest and analytics profiles only.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profiles [--history-rows 30000000] [--files 5] [--file-rows 100000] [--workdir bench_db]
+"""
+import argparse
+import logging
+import os
+import shutil
+import time
+import pandas as pd
+from src.retail import PROFILES, ESretail
+from benchmarks.synthetic import make_transactions
+
+
+def make_file(n_rows: int, seed: int, transaction_date: str) -> pd.DataFrame:
+    df = make_transactions(n_rows, seed).rename(columns={'description': 'name'})
+    df['transaction_date'] = transaction_date
+    return df
+
+
+def build_history(db_path: str, history_rows: int, file_rows: int) -> None:
+    built = os.path.exists(db_path)
+    retail = ESretail(db_path, profile='ingest')
+    if not built:
+        for seed, start in enumerate(range(0, history_rows, file_rows)):
+            day = pd.Timestamp('2019-01-01') + pd.Timedelta(days=seed)
+            retail.bulk_import(make_file(min(file_rows, history_rows - start), seed, day.strftime('%Y-%m-%d')))
+    # The WAL mode of the ingest profile is stored in the database file: it is set back to the rollback journal,
+    # so that the copies of the default and readonly profiles are not measured in WAL mode
+    retail.cursor.execute("PRAGMA journal_mode=DELETE")
+    retail.conn.close()
+
+
+def bench_profile(profile: str, db_path: str, files: int, file_rows: int, repeat: int) -> dict[str, float | None]:
+    """
+    Loads the new files and runs the queries with a profile. The readonly profile cannot write: its copy receives
+    the files through the default profile, so that it is queried with the same rows, and its ingest is not measured.
+    """
+    new_files = [make_file(file_rows, 1_000_000 + i, '2030-01-01') for i in range(files)]
+    start = time.perf_counter()
+    for df in new_files:
+        retail = ESretail(db_path, profile=profile if profile != 'readonly' else 'default')
+        retail.bulk_import(df)
+        retail.conn.close()
+    ingest_rows_per_s = files * file_rows / (time.perf_counter() - start) if profile != 'readonly' else None
+
+    retail = ESretail(db_path, profile=profile)
+    queries = {
+        'count_transactions_by_date': lambda: retail.count_transactions_by_date('2019-01-02'),
+        'sum_total_transaction': retail.sum_total_transaction,
+        'get_balance_by_date_sql': lambda: retail.get_balance_by_date_sql('Amazon Echo Dot'),
+        'get_cumulated_balance_by_date': lambda: retail.get_cumulated_balance_by_date('Amazon Echo Dot'),
+    }
+    results = {'ingest rows/s': ingest_rows_per_s}
+    for name, query in queries.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        results[f'{name} queries/s'] = repeat / (time.perf_counter() - start)
+    retail.conn.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-rows", type=int, default=30_000_000)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--file-rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", default="bench_db")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    history_path = os.path.join(workdir, f"history_{args.history_rows}.db")
+    build_history(history_path, args.history_rows, args.file_rows)
+    print(f"History database: {os.path.getsize(history_path) / 1e9:.2f} GB")
+
+    for profile in PROFILES:
+        db_path = os.path.join(workdir, f"{profile}.db")
+        shutil.copy(history_path, db_path)
+        results = bench_profile(profile, db_path, args.files, args.file_rows, args.repeat)
+        print(profile.ljust(10), "  ".join(f"{name}: {'n/a' if value is None else f'{value:,.1f}'}"
+                                           for name, value in results.items()))
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Times the stages of the pipeline and the query methods of ESretail at several scales and writes the results
+to a JSON file, to compare runs of different versions of the code.
+
+For each number of rows of --file-rows, an incoming CSV file is generated (with --bad-line-rate bad lines and
+--duplicate-rate duplicated ids), then transformed and loaded into a copy of the smallest history database;
+the stages are measured as in run_etl. For each number of years of --years, a history database of
+--rows-per-day transactions a day is built once in the work folder, then each query method runs --repeat times.
+
+Usage:
+    python -m benchmarks.bench_suite [--file-rows 10000 100000 1000000] [--years 1 3] [--rows-per-day 1000]
+        [--repeat 5] [--workdir bench_db] [--output bench_results.json]
+    python -m benchmarks.bench_suite --compare baseline.json bench_results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from src import metrics
+from src.etl import transforme_transactions, load_data
+from src.retail import ESretail
+from benchmarks.synthetic import PRODUCTS, build_history_db, write_transaction_csv
+
+FIRST_DATE = '2019-01-01'
+INCOMING_DATE = '2030-01-15'
+
+
+def query_calls(retail: ESretail) -> dict:
+    product_names = list(PRODUCTS)
+    return {
+        'count_transactions_by_date': lambda: retail.count_transactions_by_date(FIRST_DATE),
+        'count_total_id': retail.count_total_id,
+        'sum_total_transaction': retail.sum_total_transaction,
+        'get_balance_by_date_sql': lambda: retail.get_balance_by_date_sql(product_names[0]),
+        'get_cumulated_balance_by_date': lambda: retail.get_cumulated_balance_by_date(product_names[0]),
+        'get_cumulated_balance_by_date (last 30 days)': lambda: retail.get_cumulated_balance_by_date(
+            product_names[0], start_date='2019-12-01', end_date='2019-12-31'),
+        'get_balance_by_date_batch': lambda: retail.get_balance_by_date_batch(product_names),
+        'get_cumulated_balance_by_date_batch': lambda: retail.get_cumulated_balance_by_date_batch(product_names),
+    }
+
+
+def bench_pipeline(workdir: str, history_db: str, file_rows: int, bad_line_rate: float, duplicate_rate: float) -> list[dict]:
+    with tempfile.TemporaryDirectory(dir=workdir) as folder:
+        file_name = write_transaction_csv(folder, INCOMING_DATE, file_rows, seed=file_rows,
+                                          bad_line_rate=bad_line_rate, duplicate_rate=duplicate_rate)
+        db_path = os.path.join(folder, 'retail.db')
+        shutil.copy(history_db, db_path)
+        with metrics.collect_run() as run:
+            unique_df = transforme_transactions(folder, file_name)
+            load_data(unique_df, db_path, profile='ingest', file_name=file_name)
+    return [{key: value for key, value in stage.to_dict().items() if key != 'file_name'} for stage in run.stages]
+
+
+def bench_queries(db_path: str, repeat: int) -> dict[str, dict[str, float]]:
+    retail = ESretail(db_path, profile='readonly')
+    results = {}
+    try:
+        for name, call in query_calls(retail).items():
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                call()
+                seconds.append(time.perf_counter() - start)
+            results[name] = {'median_seconds': statistics.median(seconds), 'min_seconds': min(seconds), 'repeat': repeat}
+    finally:
+        retail.conn.close()
+    return results
+
+
+def environment() -> dict[str, str | None]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    results = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        **environment(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('compare', 'output')},
+        'pipeline': [],
+        'queries': [],
+    }
+
+    history_dbs = {}
+    for years in sorted(args.years):
+        db_path = os.path.join(workdir, f"history_{years}y_{args.rows_per_day}.db")
+        history_rows = build_history_db(db_path, years, args.rows_per_day, first_date=FIRST_DATE)
+        history_dbs[years] = db_path
+        print(f"queries on {years} year(s), {history_rows} rows")
+        results['queries'].append({'years': years, 'history_rows': history_rows,
+                                   'queries': bench_queries(db_path, args.repeat)})
+
+    for file_rows in args.file_rows:
+        print(f"pipeline on a file of {file_rows} rows")
+        stages = bench_pipeline(workdir, history_dbs[min(history_dbs)], file_rows, args.bad_line_rate, args.duplicate_rate)
+        results['pipeline'].append({'file_rows': file_rows, 'stages': stages})
+    return results
+
+
+def flatten(results: dict) -> dict[str, float]:
+    """
+    Returns the seconds of each measure of a results file, by a name such as 'pipeline 100000 rows: validate'.
+    """
+    seconds = {}
+    for scale in results['pipeline']:
+        for stage in scale['stages']:
+            seconds[f"pipeline {scale['file_rows']} rows: {stage['stage']}"] = stage['wall_seconds']
+    for scale in results['queries']:
+        for name, timing in scale['queries'].items():
+            seconds[f"queries {scale['years']} year(s): {name}"] = timing['median_seconds']
+    return seconds
+
+
+def compare(baseline_path: str, results_path: str) -> None:
+    with open(baseline_path) as baseline_file, open(results_path) as results_file:
+        baseline, results = flatten(json.load(baseline_file)), flatten(json.load(results_file))
+    print(f"{'measure':<70} {'baseline (s)':>12} {'new (s)':>10} {'ratio':>7}")
+    for name, seconds in results.items():
+        if name in baseline:
+            ratio = seconds / baseline[name] if baseline[name] else float('nan')
+            print(f"{name:<70} {baseline[name]:>12.4f} {seconds:>10.4f} {ratio:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file-rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--rows-per-day", type=int, default=1_000)
+    parser.add_argument("--bad-line-rate", type=float, default=0.001)
+    parser.add_argument("--duplicate-rate", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", default="bench_db")
+    parser.add_argument("--output", default=None, help="Default is bench_suite_<time>.json in the work folder.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"), help="Compares two results files.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    logging.disable(logging.INFO)
+    results = run(args)
+    output = args.output or os.path.join(args.workdir, f"bench_suite_{datetime.now():%Y%m%dT%H%M%S}.json")
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
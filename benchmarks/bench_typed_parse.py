@@ -0,0 +1,79 @@
+"""
+Compares the parse and validation of an incoming CSV file with the types inferred by pandas, as before,
+and with the types declared by read_transaction_csv (the 'c' engine of pandas, and pyarrow when installed).
+
+Each method runs in a new process, whose peak RSS is reported above the RSS after the imports
+(Linux only: ru_maxrss is inherited from the parent process, VmHWM of /proc/self/status is used instead).
+
+Usage:
+    python -m benchmarks.bench_typed_parse [--rows 1000000] [--bad-line-rate 0 0.001] [--repeat 3]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.etl import HAS_PYARROW, read_transaction_csv, read_transaction_file
+from benchmarks.synthetic import write_transaction_csv
+
+
+def parse(csv_path: str, method: str) -> pd.DataFrame:
+    if method == 'inferred':
+        return pd.read_csv(csv_path, memory_map=True)
+    return read_transaction_csv(csv_path, engine=method)
+
+
+def memory_status(field: str) -> int:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def measure(csv_path: str, method: str) -> tuple[float, float, int, int]:
+    """
+    Returns the seconds of the parse and of the validation, the number of bad lines and the peak RSS added, in bytes.
+    """
+    logging.disable(logging.INFO)
+    # Resets the peak RSS (VmHWM) of the process to its current RSS
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+    rss_before = memory_status('VmRSS')
+    start = time.perf_counter()
+    df = parse(csv_path, method)
+    parsed = time.perf_counter()
+    _, bad_lines = read_transaction_file(df)
+    validated = time.perf_counter()
+    return parsed - start, validated - parsed, len(bad_lines), memory_status('VmHWM') - rss_before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--bad-line-rate", type=float, nargs="+", default=[0.0, 0.001])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    methods = ['inferred', 'c'] + (['pyarrow'] if HAS_PYARROW else [])
+    context = multiprocessing.get_context('spawn')
+    print(f"{'bad lines':>10} {'method':>9} {'parse (s)':>10} {'validate (s)':>13} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as folder:
+        for bad_line_rate in args.bad_line_rate:
+            csv_path = os.path.join(folder, write_transaction_csv(folder, '2022-01-15', args.rows, bad_line_rate=bad_line_rate))
+            for method in methods:
+                runs = []
+                for _ in range(args.repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        runs.append(pool.submit(measure, csv_path, method).result())
+                parse_s, validate_s, bad_lines, rss = (statistics.median(values) for values in zip(*runs))
+                print(f"{bad_lines:>10} {method:>9} {parse_s:>10.2f} {validate_s:>13.2f} {rss / 1e6:>14.0f}")
+            os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from src.etl import Cols, TAX_RATE_PERCENT
+from src.retail import ESretail
+
+
+PRODUCTS = {
+    "Amazon Echo Dot": 24.99,
+    "Apple iPhone 14": 799.99,
+    "Dell XPS 13": 1099.99,
+    "Fitbit Charge 5": 89.99,
+    "Levis Jeans": 39.99,
+    "Nike Running Shoes": 79.99,
+    "Patagonia Jacket": 159.99,
+    "Ray-Ban Sunglasses": 109.99,
+}
+
+# Kinds of bad lines, in turn: a quantity that is not a number, an amount that is not a number, a wrong tax
+BAD_LINE_KINDS = 3
+
+
+def make_transactions(n_rows: int, seed: int = 0, bad_line_rate: float = 0.0, duplicate_rate: float = 0.0) -> pd.DataFrame:
+    """
+    Builds a DataFrame of synthetic transactions with the columns of the incoming CSV.
+
+    The amounts including tax are amount_excl_tax plus TAX_RATE_PERCENT, rounded to the nearest cent.
+    A duplicated transaction repeats the id of another transaction of the DataFrame.
+
+    Args:
+        n_rows (int): The number of transactions to generate.
+        seed (int): The seed of the random generator.
+        bad_line_rate (float): The share of the transactions rejected by read_transaction_file.
+        duplicate_rate (float): The share of the transactions repeating the id of another one.
+
+    Returns:
+        pd.DataFrame: The generated transactions.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(list(PRODUCTS))
+    price_cents = np.round(np.array(list(PRODUCTS.values())) * 100).astype(np.int64)
+    product = rng.integers(0, len(names), n_rows)
+    quantity = rng.integers(1, 6, n_rows)
+    # The tax is computed on integer cents, so the amounts pass the check of read_transaction_file
+    amount_excl_tax_cents = price_cents[product] * quantity
+    amount_inc_tax_cents = (amount_excl_tax_cents * (100 + TAX_RATE_PERCENT) + 50) // 100
+    random_bytes = rng.bytes(16 * n_rows)
+    df = pd.DataFrame({
+        Cols.id: [str(uuid.UUID(bytes=random_bytes[i:i + 16], version=4)) for i in range(0, 16 * n_rows, 16)],
+        Cols.category: np.where(rng.random(n_rows) < 0.5, "SELL", "BUY"),
+        Cols.description: names[product],
+        Cols.quantity: quantity,
+        Cols.amount_excl_tax: amount_excl_tax_cents / 100,
+        Cols.amount_inc_tax: amount_inc_tax_cents / 100,
+    })
+
+    if bad_line_rate > 0:
+        bad = np.flatnonzero(rng.random(n_rows) < bad_line_rate)
+        df[[Cols.quantity, Cols.amount_excl_tax]] = df[[Cols.quantity, Cols.amount_excl_tax]].astype(object)
+        df.loc[bad[0::BAD_LINE_KINDS], Cols.quantity] = "n/a"
+        df.loc[bad[1::BAD_LINE_KINDS], Cols.amount_excl_tax] = "12,50"
+        df.loc[bad[2::BAD_LINE_KINDS], Cols.amount_inc_tax] = df.loc[bad[2::BAD_LINE_KINDS], Cols.amount_inc_tax] * 2
+    if duplicate_rate > 0:
+        copies = np.flatnonzero(rng.random(n_rows) < duplicate_rate)
+        df.loc[copies, Cols.id] = df[Cols.id].to_numpy()[rng.integers(0, n_rows, len(copies))]
+    return df
+
+
+def csv_file_name(transaction_date: str) -> str:
+    """
+    Returns the name of the incoming CSV file of a day, e.g. retail_15_01_2022.csv for '2022-01-15'.
+
+    Args:
+        transaction_date (str): The day in the format 'YYYY-MM-DD'.
+
+    Returns:
+        str: The name of the file.
+    """
+    return f"retail_{pd.Timestamp(transaction_date):%d_%m_%Y}.csv"
+
+
+def write_transaction_csv(folder: str, transaction_date: str, n_rows: int, seed: int = 0, bad_line_rate: float = 0.0,
+                          duplicate_rate: float = 0.0) -> str:
+    """
+    Writes the incoming CSV file of a day with synthetic transactions, see make_transactions.
+
+    Args:
+        folder (str): The folder of the file.
+        transaction_date (str): The day of the transactions in the format 'YYYY-MM-DD', which names the file.
+        n_rows (int): The number of transactions.
+        seed (int): The seed of the random generator.
+        bad_line_rate (float): The share of bad lines.
+        duplicate_rate (float): The share of transactions repeating the id of another one.
+
+    Returns:
+        str: The name of the file.
+    """
+    file_name = csv_file_name(transaction_date)
+    make_transactions(n_rows, seed, bad_line_rate, duplicate_rate).to_csv(os.path.join(folder, file_name), index=False)
+    return file_name
+
+
+def build_history_db(db_path: str, years: int, rows_per_day: int, seed: int = 0, first_date: str = '2019-01-01') -> int:
+    """
+    Fills a database with the transactions of every day of a number of years, as loaded by the pipeline.
+    An existing database file is kept as is, to be reused by the next benchmarks.
+
+    Args:
+        db_path (str): The path of the SQLite database file.
+        years (int): The number of years of history, of 365 days.
+        rows_per_day (int): The number of transactions of each day.
+        seed (int): The seed of the random generator of the first day, incremented for each day.
+        first_date (str): The first day of the history in the format 'YYYY-MM-DD'.
+
+    Returns:
+        int: The number of transactions of the database.
+    """
+    retail = ESretail(db_path, profile='ingest')
+    try:
+        retail.migrate()
+        if not retail.count_total_id():
+            for day in range(365 * years):
+                transaction_date = (pd.Timestamp(first_date) + pd.Timedelta(days=day)).strftime('%Y-%m-%d')
+                df = make_transactions(rows_per_day, seed + day).rename(columns={Cols.description: 'name'})
+                retail.bulk_import(df.assign(transaction_date=transaction_date))
+            retail.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return retail.count_total_id()
+    finally:
+        retail.conn.close()
@@ -0,0 +1,118 @@
+import argparse
+import logging
+import sys
+import time
+from src import datalake, metrics
+from src.retail import ESretail
+
+log = logging.getLogger("retail")
+log.setLevel(logging.DEBUG)
+
+# Runs the pipeline of run_etl without Prefect, for the small files uploaded during the day whose run would
+# otherwise be dominated by the start of Prefect. pandas is imported only once a file has to be transformed.
+
+
+def process_files(db_file_name: str = 'retail.db', chunk_size: int | None = None, tail: bool = False,
+                  processes: int | None = None, data_path: str = datalake.DATA_FOLDER,
+                  datalake_path: str = datalake.DATALAKE_FOLDER,
+                  dry_run: bool = False) -> tuple[dict[str, dict[str, float]], list[str]]:
+    """
+    Extracts, transforms and loads the CSV files of the data folder missing from the manifest of the database,
+    one at a time, as run_etl does with Prefect. A file that fails is logged and skipped, without being added
+    to the manifest, and the next files are processed.
+
+    Args:
+        db_file_name (str): The name of the SQLite database file.
+        chunk_size (int | None): When set, each file is streamed and loaded chunk by chunk of this number of rows.
+        tail (bool): When True, only the rows appended to each file since the previous run are loaded.
+        processes (int | None): The number of processes validating each file read in memory at once.
+        data_path (str): The folder of the incoming CSV files.
+        datalake_path (str): The root folder of the datalake.
+        dry_run (bool): When True, the files to process are only logged.
+
+    Returns:
+        tuple: A tuple containing:
+            - (dict[str, dict[str, float]]) timings: The time spent on each file processed, in seconds, by step.
+            - (list[str]) failed_files: The names of the files that failed.
+    """
+    retail = ESretail(db_file_name)
+    timings, failed_files = {}, []
+    try:
+        if tail:
+            # The tailing mode reads only the appended rows, from its checkpoints, and keeps no manifest
+            appended_files = datalake.select_appended_files(data_path, datalake.find_csv_files(data_path), retail)
+            fingerprints = dict.fromkeys(appended_files)
+        else:
+            fingerprints = datalake.select_pending_files(data_path, datalake.find_csv_files(data_path), retail)
+        if not fingerprints:
+            log.info("No CSV file to process")
+            return timings, failed_files
+        if dry_run:
+            for csv_file_name in fingerprints:
+                log.info(f"The file: {csv_file_name} would be processed")
+            return timings, failed_files
+
+        # The DataFrame path of the pipeline, and pandas with it
+        from src import etl
+
+        for csv_file_name, fingerprint in fingerprints.items():
+            start = time.perf_counter()
+            try:
+                incoming_file_path, file_name = datalake.extract(csv_file_name, data_path, datalake_path, append=tail)
+                if tail:
+                    etl.tail_transactions(incoming_file_path, file_name, db_file_name)
+                elif chunk_size:
+                    for chunk_df in etl.iter_transactions(incoming_file_path, file_name, chunk_size):
+                        etl.load_data(chunk_df, db_file_name, file_name=csv_file_name)
+                else:
+                    unique_df = etl.transforme_transactions(incoming_file_path, file_name, processes)
+                    etl.load_data(unique_df, db_file_name, file_name=csv_file_name)
+                if not tail:
+                    datalake.mark_processed(retail, csv_file_name, fingerprint)
+            except Exception as e:
+                log.error(f"The file: {csv_file_name} could not be processed, it is left for the next run: {e}")
+                failed_files.append(csv_file_name)
+                continue
+            timings[csv_file_name] = {'total': time.perf_counter() - start}
+        return timings, failed_files
+    finally:
+        retail.conn.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the pipeline from the command line, see python -m src.cli --help.
+
+    Args:
+        argv (list[str] | None): The arguments. Default is the arguments of the process.
+
+    Returns:
+        int: The exit status of the process, 1 if some files could not be processed.
+    """
+    parser = argparse.ArgumentParser(description="Loads the new CSV files of the data folder into the database, without Prefect.")
+    parser.add_argument("--db", default="retail.db", help="Database file, relative to the project root.")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Streams each file by chunks of this number of rows.")
+    parser.add_argument("--tail", action="store_true", help="Loads only the rows appended since the previous run.")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes validating each file.")
+    parser.add_argument("--data-folder", default=datalake.DATA_FOLDER, help="Folder of the incoming CSV files.")
+    parser.add_argument("--datalake-folder", default=datalake.DATALAKE_FOLDER, help="Root folder of the datalake.")
+    parser.add_argument("--dry-run", action="store_true", help="Only lists the files to process.")
+    args = parser.parse_args(argv)
+
+    with metrics.collect_run('retail-cli') as run_metrics:
+        with metrics.profiling(run_metrics):
+            timings, failed_files = process_files(args.db, args.chunk_size, args.tail, args.processes, args.data_folder,
+                                                  args.datalake_folder, args.dry_run)
+        if run_metrics.stages:
+            log.info(f"The metrics of the run have been saved in: {run_metrics.write_json()}")
+
+    for csv_file_name, timing in timings.items():
+        log.info(f"{csv_file_name}: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timing.items()))
+    if failed_files:
+        log.error(f"{len(failed_files)} file(s) could not be processed: {', '.join(failed_files)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
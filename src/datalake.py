@@ -0,0 +1,271 @@
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from src import metrics
+from src.retail import ESretail
+
+log = logging.getLogger("retail")
+log.setLevel(logging.DEBUG)
+
+# The files of the data folder, of the datalake and the manifest of the processed files. This module imports
+# neither pandas nor Prefect, so that a run finding no new file starts and ends quickly.
+
+# Folders of the incoming CSV files and of the datalake, at the project root
+DATA_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+DATALAKE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'datalake'))
+
+
+def find_csv(folder_path: str) -> str:
+    """
+    Finds the CSV file in the specified folder path.
+
+    Args:
+        folder_path (str): The path to the folder containing the CSV file.
+
+    Returns:
+        str: The name of the CSV file found in the folder.
+
+    Raises:
+        FileExistsError: If there are multiple CSV files in the folder.
+        FileNotFoundError: If no CSV files are found in the folder.
+    """
+    csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
+    if len(csv_files) > 1:
+        raise FileExistsError("Data folder should have only one file")
+    if len(csv_files) == 0:
+        raise FileNotFoundError("Data folder should have one file")
+    return csv_files[0]
+
+
+def find_csv_files(folder_path: str) -> list[str]:
+    """
+    Finds all the CSV files in the specified folder path.
+
+    Args:
+        folder_path (str): The path to the folder containing the CSV files.
+
+    Returns:
+        list[str]: The names of the CSV files found in the folder, sorted.
+    """
+    return sorted(f for f in os.listdir(folder_path) if f.endswith('.csv'))
+
+
+def parquet_file_name(file_name: str) -> str:
+    """
+    Returns the name of the Parquet file written for a CSV file, e.g. retail_data_15_01_2022.parquet
+    for retail_15_01_2022.csv, so that several files of the same day don't overwrite each other.
+
+    Args:
+        file_name (str): The name of the CSV file.
+
+    Returns:
+        str: The name of the Parquet file.
+    """
+    return f"retail_data{file_name[6:-4]}.parquet"
+
+
+def copy_to_datalake(source_path: str, target_path: str, append: bool = False) -> str:
+    """
+    Saves a file in the datalake without reading it in memory.
+
+    The file is hard linked when the data folder and the datalake share a filesystem, otherwise it is
+    copied with shutil.copyfile, which lets the kernel copy the bytes (os.sendfile on Linux).
+    The target is written under a temporary name then renamed, so it is never seen half written.
+    A hard link shares its content with the source: a file rewritten in place in the data folder
+    is also rewritten in the datalake, which is what the next run would copy anyway.
+
+    With append, for a file that only grows (see tail_transactions), a copy saved by a previous run
+    only receives the bytes appended to the source since then. Its last line may then be seen half written,
+    which the tailing mode leaves for its next read.
+
+    Args:
+        source_path (str): The path of the file to save.
+        target_path (str): The path of the file in the datalake.
+        append (bool): When True, an existing copy no larger than the source is completed rather than replaced.
+
+    Returns:
+        str: 'link' if the file was hard linked, 'copy' if it was copied, 'append' if the copy was completed.
+    """
+    if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+        # Already linked by a previous run
+        return 'link'
+    if append and os.path.exists(target_path) and os.path.getsize(target_path) <= os.path.getsize(source_path):
+        with open(source_path, 'rb') as source_file, open(target_path, 'ab') as target_file:
+            source_file.seek(os.path.getsize(target_path))
+            shutil.copyfileobj(source_file, target_file)
+        return 'append'
+    tmp_path = f"{target_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source_path, tmp_path)
+        method = 'link'
+    except OSError:
+        # Different filesystems or no hard link support
+        shutil.copyfile(source_path, tmp_path)
+        method = 'copy'
+    os.replace(tmp_path, target_path)
+    return method
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Computes the SHA-256 of a file, reading it by blocks.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        str: The hexadecimal digest of the content of the file.
+    """
+    with open(file_path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """
+    Identifies the content of an incoming file in the manifest of the processed files.
+    """
+    sha256: str
+    size: int
+    mtime_ns: int
+
+
+def mark_processed(retail: ESretail, csv_file_name: str, fingerprint: FileFingerprint) -> None:
+    """
+    Adds a loaded file to the manifest of the processed files.
+
+    Args:
+        retail (ESretail): The database holding the manifest.
+        csv_file_name (str): The name of the CSV file.
+        fingerprint (FileFingerprint): The fingerprint of the file computed before it was processed.
+    """
+    retail.record_processed_file(fingerprint.sha256, csv_file_name, fingerprint.size, fingerprint.mtime_ns)
+
+
+def select_pending_files(folder_path: str, csv_file_names: list[str], retail: ESretail) -> dict[str, FileFingerprint]:
+    """
+    Returns the files that are not in the manifest of the processed files.
+
+    A file whose name, size and modification time are in the manifest is skipped without being read,
+    otherwise it is hashed and skipped if its content is in the manifest, e.g. a retried or duplicated upload.
+
+    Args:
+        folder_path (str): The path to the folder containing the CSV files.
+        csv_file_names (list[str]): The names of the CSV files.
+        retail (ESretail): The database holding the manifest.
+
+    Returns:
+        dict[str, FileFingerprint]: The fingerprint of each file still to be processed, by file name.
+    """
+    pending_files = {}
+    for csv_file_name in csv_file_names:
+        file_path = os.path.join(folder_path, csv_file_name)
+        stat = os.stat(file_path)
+        if retail.is_file_processed(file_name=csv_file_name, size=stat.st_size, mtime_ns=stat.st_mtime_ns):
+            log.info(f"The file: {csv_file_name} has already been processed")
+            continue
+
+        fingerprint = FileFingerprint(file_sha256(file_path), stat.st_size, stat.st_mtime_ns)
+        if retail.is_file_processed(sha256=fingerprint.sha256):
+            log.info(f"The content of the file: {csv_file_name} has already been processed")
+            mark_processed(retail, csv_file_name, fingerprint)
+            continue
+        pending_files[csv_file_name] = fingerprint
+    return pending_files
+
+
+def select_appended_files(folder_path: str, csv_file_names: list[str], retail: ESretail) -> list[str]:
+    """
+    Returns the files whose size differs from the position reached in them by the tailing mode.
+
+    Only the size of the files is read: the tailing mode relies on its checkpoints rather than on the
+    manifest of the processed files, whose content hash would read the whole file at every append.
+
+    Args:
+        folder_path (str): The path to the folder containing the CSV files.
+        csv_file_names (list[str]): The names of the CSV files.
+        retail (ESretail): The database holding the checkpoints.
+
+    Returns:
+        list[str]: The names of the files with bytes not loaded yet, or smaller than at the previous run.
+    """
+    appended_files = []
+    for csv_file_name in csv_file_names:
+        byte_offset, _ = retail.get_file_checkpoint(csv_file_name)
+        if os.path.getsize(os.path.join(folder_path, csv_file_name)) == byte_offset:
+            log.info(f"No new line in the file: {csv_file_name}")
+            continue
+        appended_files.append(csv_file_name)
+    return appended_files
+
+
+def extract(csv_file_name: str | None = None, data_path: str = DATA_FOLDER, datalake_path: str = DATALAKE_FOLDER,
+            append: bool = False) -> tuple[str, str]:
+    """
+    Extracts data from a CSV file located in a specified folder and saves it in a structured format in the datalake.
+
+    Args:
+        csv_file_name (str | None): The name of the CSV file in the data folder. Default is the only CSV file of the folder.
+        data_path (str): The folder of the incoming CSV files. Default is DATA_FOLDER.
+        datalake_path (str): The root folder of the datalake. Default is DATALAKE_FOLDER.
+        append (bool): When True, a copy saved by a previous run only receives the bytes appended since then,
+            see copy_to_datalake.
+
+    Returns:
+        tuple: A tuple containing:
+            - (str) raw_data_folder: The path of the folder where the raw data is saved.
+            - (str) csv_file_name: The name of the CSV file extracted.
+    
+    Raises:
+        FileNotFoundError: If the data folder does not contain exactly one CSV file.
+        OSError: If there is an issue creating the raw data folder.
+    """
+    if csv_file_name is None:
+        csv_file_name = find_csv(data_path)
+    csv_file_path = os.path.join(data_path, csv_file_name)
+    raw_data_folder = os.path.join(
+        datalake_path,
+        csv_file_name.split("_")[3][0:4],
+        csv_file_name.split("_")[2],
+        csv_file_name.split("_")[1],
+    )
+    incoming_file_path = os.path.join(raw_data_folder, csv_file_name)
+
+    # Save raw data in datalake 
+    # exist_ok because the files of the same day may be extracted concurrently
+    if not os.path.exists(raw_data_folder):
+        os.makedirs(raw_data_folder, exist_ok=True)
+        log.info(f"The folder: {raw_data_folder} has been created")
+    else:
+        log.warning(f"The folder: {raw_data_folder} already exists")
+
+    with metrics.stage('extract', csv_file_name) as stage_metrics:
+        saved_size = os.path.getsize(incoming_file_path) if os.path.exists(incoming_file_path) else 0
+        method = copy_to_datalake(csv_file_path, incoming_file_path, append)
+        stage_metrics.bytes_read = os.path.getsize(incoming_file_path) - (saved_size if method == 'append' else 0)
+        # A hard link writes no data
+        stage_metrics.bytes_written = stage_metrics.bytes_read if method != 'link' else 0
+    log.info(f"The file: {csv_file_name} has been saved in the datalake ({method})")
+
+    return raw_data_folder, csv_file_name
+
+
+
+def file_transaction_date(file_name: str) -> str:
+    """
+    Returns the transaction date encoded in a file name such as retail_15_01_2022.csv.
+
+    Args:
+        file_name (str): The name of the CSV file.
+
+    Returns:
+        str: The transaction date in the format 'YYYY-MM-DD'.
+    """
+    file_year = file_name.split("_")[3][0:4]
+    file_month = file_name.split("_")[2]
+    file_day = file_name.split("_")[1]
+    return f"{file_year}-{file_month}-{file_day}"
@@ -0,0 +1,778 @@
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import os
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+import fastparquet
+import numpy as np
+import pandas as pd
+import logging
+from src import metrics
+from src.datalake import file_transaction_date, parquet_file_name
+from src.retail import DEFAULT_BATCH_SIZE, CommitPolicy, ESretail, to_cents
+
+log = logging.getLogger("retail")
+log.setLevel(logging.DEBUG)
+
+# The transform and load steps of the pipeline as plain functions, run as Prefect tasks by etl_pipeline
+# and without Prefect by the command line of src.cli
+
+# Number of rows read at a time by the streaming mode
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Smallest byte range validated by one process of the parallel transform
+MIN_SHARD_BYTES = 1 << 20
+
+# Tax of all the products, amount_inc_tax must be amount_excl_tax plus this rate within the tolerance
+TAX_RATE_PERCENT = 20
+TAX_TOLERANCE_CENTS = 1
+
+
+
+class Cols :
+    id = 'id'
+    category = 'category'
+    description = 'description'
+    quantity = 'quantity'
+    amount_excl_tax = 'amount_excl_tax'
+    amount_inc_tax = 'amount_inc_tax'
+    amount_excl_tax_cents = 'amount_excl_tax_cents'
+    amount_inc_tax_cents = 'amount_inc_tax_cents'
+
+
+# Types of the columns of the incoming CSV files. With pandas the numeric columns are inferred, a column with
+# an unparseable cell being read as strings that read_transaction_file coerces.
+CSV_DTYPES = {Cols.id: str, Cols.category: 'category', Cols.description: 'category'}
+# With pyarrow all the columns are declared, see read_transaction_csv. The numeric columns are parsed as strings
+# then cast, so that a bad line does not fail the parse of the whole file, see read_csv_arrow.
+ARROW_CSV_TYPES = {
+    Cols.id: 'string',
+    Cols.category: 'dictionary',
+    Cols.description: 'dictionary',
+    Cols.quantity: 'int64',
+    Cols.amount_excl_tax: 'float64',
+    Cols.amount_inc_tax: 'float64',
+}
+
+# pyarrow is optional, it is imported by read_transaction_csv only
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+
+def read_csv_arrow(source: str | io.BytesIO) -> pd.DataFrame:
+    """
+    Parses a CSV file with the multi-threaded reader of pyarrow and the types of ARROW_CSV_TYPES.
+
+    The numeric columns are parsed as strings and cast column by column: a column with a cell that is not
+    a number, e.g. of a bad line, is left as strings, which read_transaction_file coerces.
+
+    Args:
+        source (str | io.BytesIO): The path or the content of the CSV file.
+
+    Returns:
+        pd.DataFrame: The rows, the dictionary columns being categorical. An empty cell is missing, as with pandas.
+
+    Raises:
+        pyarrow.ArrowInvalid: If a line does not have the cells of the header, or the file is empty.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    types = {
+        'string': pa.string(),
+        'dictionary': pa.dictionary(pa.int32(), pa.string()),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+    }
+    table = csv.read_csv(
+        source,
+        read_options=csv.ReadOptions(use_threads=True),
+        convert_options=csv.ConvertOptions(
+            column_types={column: types[name] if name in ('string', 'dictionary') else pa.string()
+                          for column, name in ARROW_CSV_TYPES.items()},
+            strings_can_be_null=True,
+        ),
+    )
+    for column, name in ARROW_CSV_TYPES.items():
+        if name in ('string', 'dictionary'):
+            continue
+        try:
+            table = table.set_column(table.schema.get_field_index(column), column, table[column].cast(types[name]))
+        except pa.ArrowInvalid:
+            # Not a number, e.g. a bad line
+            pass
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_transaction_csv(source: str | io.BytesIO, engine: str | None = None) -> pd.DataFrame:
+    """
+    Parses an incoming CSV file with the types of its columns declared rather than inferred, before read_transaction_file.
+
+    With the 'pyarrow' engine, the default when pyarrow is installed, the file is parsed in one multi-threaded
+    pass, see read_csv_arrow, the numeric column of an unparseable cell being left as strings that
+    read_transaction_file coerces, the cell being reported in bad_lines. With the 'c' engine the category and description columns are parsed as categorical and the
+    numeric columns are inferred.
+
+    Args:
+        source (str | io.BytesIO): The path or the content of the CSV file.
+        engine (str | None): 'pyarrow' or 'c'. Default is 'pyarrow' if pyarrow is installed, else 'c'.
+
+    Returns:
+        pd.DataFrame: The rows of the file, to be validated by read_transaction_file.
+
+    Raises:
+        pd.errors.EmptyDataError: If the CSV file is empty, with the 'c' engine.
+        pyarrow.ArrowInvalid: If the CSV file is empty or malformed, with the 'pyarrow' engine.
+        ValueError: If the engine is unknown.
+    """
+    engine = engine or ('pyarrow' if HAS_PYARROW else 'c')
+    if engine not in ('pyarrow', 'c'):
+        raise ValueError(f"Unknown CSV engine {engine}, expected 'pyarrow' or 'c'.")
+    if engine == 'pyarrow':
+        return read_csv_arrow(source)
+    # The file is memory mapped rather than read through a buffer
+    return pd.read_csv(source, dtype=CSV_DTYPES, memory_map=isinstance(source, str))
+
+
+def as_string_category(values: pd.Series) -> pd.Series:
+    """
+    Returns values.astype(str).astype('category'), a missing value being the string 'nan'. A column parsed
+    as categorical is converted by its categories rather than row by row.
+
+    Args:
+        values (pd.Series): The values, as strings or categorical.
+
+    Returns:
+        pd.Series: The values with the category dtype, the categories being the strings of the values, sorted.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(str).astype('category')
+    categories = values.cat.categories.astype(str).tolist() + ['nan']
+    codes = values.cat.codes.to_numpy(dtype=np.int64)
+    # A missing value (code -1) takes the last category, 'nan'
+    codes = np.where(codes == -1, len(categories) - 1, codes)
+    # The strings of two categories may be equal, e.g. 1 and '1', and the categories are sorted as by astype
+    names, category_codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    codes = category_codes[codes]
+    # Only the categories of the values are kept
+    used = np.bincount(codes, minlength=len(names)) > 0
+    codes = (np.cumsum(used) - 1)[codes]
+    return pd.Series(pd.Categorical.from_codes(codes, pd.Index(names[used], dtype=object)), index=values.index)
+
+
+def read_transaction_file(df:pd.DataFrame) -> tuple[pd.DataFrame, list]:
+    """
+    Reads a transaction DataFrame and validates its contents.
+
+    The validation is column-wise: numeric columns are coerced in one pass each,
+    a per-row validity mask is built from the coercion results and the amounts
+    are converted to integer cents in bulk. The category and description columns, which repeat a few
+    values, are returned with the pandas category dtype.
+
+    The tax is checked on the cents with integer arithmetic: a line whose amount_inc_tax differs from
+    amount_excl_tax * (1 + TAX_RATE_PERCENT / 100) by more than TAX_TOLERANCE_CENTS is a bad line.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing transaction data.
+
+    Returns:
+        tuple: A tuple containing:
+            - (pd.DataFrame) clean_df: A DataFrame with valid transaction entries, the amounts being
+              in the amount_excl_tax_cents and amount_inc_tax_cents columns (nullable int64).
+            - (List[str]) bad_lines: A list of IDs for entries that could not be processed.
+
+    Raises:
+        KeyError: If the DataFrame does not contain the required columns or has extra columns.
+    """
+    required_columns = {Cols.id, Cols.category, Cols.description, Cols.quantity, Cols.amount_excl_tax, Cols.amount_inc_tax}
+    if not required_columns.issubset(df.columns) or len(df.columns) != len(required_columns):
+        raise KeyError("The columns of the DataFrame don't correspond to the columns of the database.")
+
+    # A missing id is the string 'nan' whatever the parser, pyarrow giving None where pandas gives NaN
+    ids = df[Cols.id].astype(str).where(df[Cols.id].notna(), 'nan')
+    quantity = pd.to_numeric(df[Cols.quantity], errors='coerce')
+    amount_excl_tax = pd.to_numeric(df[Cols.amount_excl_tax], errors='coerce')
+    amount_inc_tax = pd.to_numeric(df[Cols.amount_inc_tax], errors='coerce')
+
+    # A quantity is mandatory, a missing amount is kept as NA but an unparseable one is rejected
+    valid = np.isfinite(quantity)
+    valid &= amount_excl_tax.notna() | df[Cols.amount_excl_tax].isna()
+    valid &= amount_inc_tax.notna() | df[Cols.amount_inc_tax].isna()
+
+    amount_excl_tax_cents = to_cents(amount_excl_tax.where(np.isfinite(amount_excl_tax)))
+    amount_inc_tax_cents = to_cents(amount_inc_tax.where(np.isfinite(amount_inc_tax)))
+    # 100 * inc and (100 + rate) * excl are compared in hundredths of cents, a line missing an amount is not checked
+    tax_gap = (100 * amount_inc_tax_cents - (100 + TAX_RATE_PERCENT) * amount_excl_tax_cents).abs()
+    valid &= ~(tax_gap > 100 * TAX_TOLERANCE_CENTS).fillna(False).to_numpy(dtype=bool)
+
+    bad_lines = ids[~valid].tolist()
+
+    clean_df = pd.DataFrame({
+        Cols.id: ids[valid],
+        Cols.category: as_string_category(df[Cols.category][valid]),
+        Cols.description: as_string_category(df[Cols.description][valid]),
+        Cols.quantity: quantity[valid].astype('int64'),
+        Cols.amount_excl_tax_cents: amount_excl_tax_cents[valid],
+        Cols.amount_inc_tax_cents: amount_inc_tax_cents[valid],
+    }).reset_index(drop=True)
+
+    return clean_df, bad_lines
+
+def shard_byte_ranges(csv_path: str, shards: int, min_shard_bytes: int = MIN_SHARD_BYTES) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    Splits the rows of a CSV file into byte ranges of about the same size, each one starting and ending
+    on a line boundary. The fields of the file are not expected to contain line breaks.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        shards (int): The maximum number of ranges.
+        min_shard_bytes (int): The minimum size of a range, a small file gets fewer ranges.
+
+    Returns:
+        tuple: A tuple containing:
+            - (bytes) header: The header line of the file.
+            - (list[tuple[int, int]]) ranges: The start and end offsets of each range, covering all the rows.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as file:
+        header = file.readline()
+        data_start = file.tell()
+        shards = max(1, min(shards, (size - data_start) // max(min_shard_bytes, 1)))
+
+        bounds = [data_start]
+        for i in range(1, shards):
+            target = data_start + (size - data_start) * i // shards
+            # The range ends after the line containing the byte before target
+            file.seek(max(target - 1, bounds[-1]))
+            file.readline()
+            if bounds[-1] < file.tell() < size:
+                bounds.append(file.tell())
+        bounds.append(size)
+    return header, list(zip(bounds[:-1], bounds[1:]))
+
+
+def validate_shard(csv_path: str, header: bytes, start: int, end: int) -> tuple[bytes, list[str]]:
+    """
+    Validates the rows of a byte range of a CSV file and serializes the valid ones as an Arrow IPC stream.
+    Runs in a worker process of read_transaction_file_parallel.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        header (bytes): The header line of the file.
+        start (int): The offset of the first byte of the range.
+        end (int): The offset of the byte following the range.
+
+    Returns:
+        tuple: A tuple containing:
+            - (bytes) shard: The valid rows of the range as an Arrow IPC stream.
+            - (list[str]) bad_lines: The IDs of the bad lines of the range.
+    """
+    import pyarrow as pa
+
+    with open(csv_path, 'rb') as file:
+        file.seek(start)
+        rows = file.read(end - start)
+    clean_df, bad_lines = read_transaction_file(read_transaction_csv(io.BytesIO(header + rows)))
+    table = pa.Table.from_pandas(clean_df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), bad_lines
+
+
+def read_transaction_file_parallel(csv_path: str, processes: int, min_shard_bytes: int = MIN_SHARD_BYTES) -> tuple[pd.DataFrame, list]:
+    """
+    Parallel version of read_transaction_file reading a CSV file: the rows are split into byte ranges
+    validated by a pool of processes.
+
+    Each process returns its valid rows as an Arrow IPC buffer rather than as a pickled DataFrame. The
+    results are concatenated in the order of the file, so the bad lines and the rows are the ones of
+    read_transaction_file on the whole file.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        processes (int): The number of worker processes.
+        min_shard_bytes (int): The minimum size of a range, a small file uses fewer processes.
+
+    Returns:
+        tuple: A tuple containing:
+            - (pd.DataFrame) clean_df: A DataFrame with valid transaction entries.
+            - (List[str]) bad_lines: A list of IDs for entries that could not be processed.
+    """
+    import pyarrow as pa
+
+    header, ranges = shard_byte_ranges(csv_path, processes, min_shard_bytes)
+    # The flow runs tasks in threads, the workers are spawned rather than forked from them
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as pool:
+        futures = [pool.submit(validate_shard, csv_path, header, start, end) for start, end in ranges]
+        results = [future.result() for future in futures]
+
+    bad_lines = [line for _, shard_bad_lines in results for line in shard_bad_lines]
+    frames = [pa.ipc.open_stream(shard).read_all().to_pandas() for shard, _ in results]
+    clean_df = pd.concat(frames, ignore_index=True)
+    # The categories of the shards differ, concat returns plain strings
+    clean_df = clean_df.astype({Cols.id: object, Cols.category: 'category', Cols.description: 'category'})
+    return clean_df, bad_lines
+
+
+# Value of each hexadecimal digit by ASCII code, 255 for the other characters
+HEX_VALUES = np.full(128, 255, dtype=np.uint8)
+HEX_VALUES[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16, dtype=np.uint8)
+# Positions of the hyphens and of the hexadecimal digits in a UUID such as 0284f92e-54f7-4766-880d-2cc5a8993a89
+UUID_HYPHENS = [8, 13, 18, 23]
+UUID_DIGITS = [i for i in range(36) if i not in UUID_HYPHENS]
+
+
+def id_keys(ids: pd.Series) -> np.ndarray:
+    """
+    Converts transaction ids to 128-bit keys stored as 16 bytes.
+
+    A UUID in its canonical lowercase form is parsed into its 128-bit value in a vectorized way.
+    Any other id is hashed with BLAKE2b to 128 bits, so that two different ids only get the same key
+    with a negligible probability.
+
+    Args:
+        ids (pd.Series): The ids.
+
+    Returns:
+        np.ndarray: The key of each id, of dtype S16, in the order of ids.
+    """
+    ids = ids.astype(str).to_numpy(dtype=object)
+    keys = np.zeros(len(ids), dtype='S16')
+    parsed = np.zeros(len(ids), dtype=bool)
+
+    candidates = np.flatnonzero(pd.Series(ids, dtype=object).str.len().to_numpy() == 36)
+    if len(candidates):
+        chars = np.asarray(ids[candidates], dtype='U36').view(np.uint32).reshape(-1, 36)
+        digits = HEX_VALUES[np.minimum(chars[:, UUID_DIGITS], 127)]
+        is_uuid = (
+            (chars[:, UUID_DIGITS] < 128).all(axis=1)
+            & (digits < 16).all(axis=1)
+            & (chars[:, UUID_HYPHENS] == ord('-')).all(axis=1)
+        )
+        uuid_bytes = np.ascontiguousarray((digits[is_uuid, 0::2] << 4) | digits[is_uuid, 1::2])
+        keys[candidates[is_uuid]] = uuid_bytes.view('S16').ravel()
+        parsed[candidates[is_uuid]] = True
+
+    for i in np.flatnonzero(~parsed):
+        keys[i] = hashlib.blake2b(ids[i].encode(), digest_size=16).digest()
+    return keys
+
+
+class DuplicateIds:
+    """
+    Finds the ids present more than once among all the ids added to it, e.g. chunk by chunk or shard by shard.
+
+    The ids are kept as 128-bit keys (see id_keys) in sorted NumPy arrays, about 16 bytes per distinct id,
+    instead of a set or a Series of Python strings. The ids added are merged into the sorted arrays
+    the first time a mask is asked for.
+
+    Attributes:
+        ids_added (int): The number of ids added, copies included.
+    """
+
+    def __init__(self, ids: pd.Series | None = None) -> None:
+        """
+        Initializes an empty set of ids.
+
+        Args:
+            ids (pd.Series | None): Ids to add at once.
+
+        Returns:
+            None
+        """
+        self._unique_keys = np.zeros(0, dtype='S16')
+        self._duplicated_keys = np.zeros(0, dtype='S16')
+        self._pending = []
+        self.ids_added = 0
+        if ids is not None:
+            self.add(ids)
+
+    def add(self, ids: pd.Series) -> None:
+        """
+        Adds ids.
+
+        Args:
+            ids (pd.Series): The ids.
+
+        Returns:
+            None
+        """
+        self._pending.append(id_keys(ids))
+        self.ids_added += len(ids)
+
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        keys = np.sort(np.concatenate([self._unique_keys, *self._pending]))
+        self._pending = []
+        if keys.size == 0:
+            return
+        repeated = keys[1:] == keys[:-1]
+        self._duplicated_keys = np.union1d(self._duplicated_keys, keys[1:][repeated])
+        self._unique_keys = keys[np.concatenate(([True], ~repeated))]
+
+    def is_duplicated(self, ids: pd.Series) -> np.ndarray:
+        """
+        Tells which ids are present more than once among the ids added.
+
+        Args:
+            ids (pd.Series): The ids to look up.
+
+        Returns:
+            np.ndarray: A boolean mask of the ids present more than once, in the order of ids.
+        """
+        self._merge()
+        return np.isin(id_keys(ids), self._duplicated_keys)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of distinct ids present more than once.
+        """
+        self._merge()
+        return len(self._duplicated_keys)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory used by the keys, in bytes.
+        """
+        return self._unique_keys.nbytes + self._duplicated_keys.nbytes + sum(keys.nbytes for keys in self._pending)
+
+    @property
+    def bytes_per_id(self) -> float:
+        """
+        The memory used by the keys per distinct id, in bytes.
+        """
+        self._merge()
+        return self.nbytes / max(len(self._unique_keys), 1)
+
+
+def prepare_for_load(clean_df: pd.DataFrame, duplicated: pd.Series | np.ndarray, transaction_date: str) -> pd.DataFrame:
+    """
+    Drops the duplicated transactions and shapes a clean DataFrame like the transactions table.
+
+    Args:
+        clean_df (pd.DataFrame): The validated transactions.
+        duplicated (pd.Series | np.ndarray): A boolean mask of the rows whose id appears more than once in the file.
+        transaction_date (str): The date of the transactions in the format 'YYYY-MM-DD'.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing unique transaction entries with a transaction date.
+    """
+    unique_df = clean_df[~duplicated].copy()
+    unique_df['transaction_date'] = transaction_date
+    return unique_df.rename(columns={'description': 'name'})
+
+
+def transforme_transactions(incoming_file_path: str, file_name: str, processes: int | None = None) -> pd.DataFrame:
+    """
+    Transforms transaction data from a CSV file into a cleaned DataFrame and saves it as a Parquet file.
+
+    The duplicated ids are looked for in the whole file, also when it is validated by several processes.
+
+    Args:
+        incoming_file_path (str): The path to the folder containing the incoming CSV file.
+        file_name (str): The name of the CSV file to be transformed.
+        processes (int | None): When greater than 1, the file is validated by this number of processes,
+            see read_transaction_file_parallel.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing unique transaction entries with a transaction date.
+
+    Raises:
+        FileNotFoundError: If the incoming file path does not exist.
+        pd.errors.EmptyDataError: If the CSV file is empty or cannot be read.
+    """
+    csv_path = os.path.join(incoming_file_path, file_name)
+    parquet_retail_path = os.path.join(incoming_file_path, parquet_file_name(file_name))
+
+    if processes and processes > 1:
+        # The workers read and validate their range at once
+        with metrics.stage('read_validate', file_name) as stage_metrics:
+            clean_df, bad_lines = read_transaction_file_parallel(csv_path, processes)
+            stage_metrics.bytes_read = os.path.getsize(csv_path)
+            stage_metrics.rows_in = len(clean_df) + len(bad_lines)
+            stage_metrics.rows_out = len(clean_df)
+            stage_metrics.bad_lines = len(bad_lines)
+    else:
+        with metrics.stage('read_csv', file_name) as stage_metrics:
+            df = read_transaction_csv(csv_path)
+            stage_metrics.bytes_read = os.path.getsize(csv_path)
+            stage_metrics.rows_out = len(df)
+        with metrics.stage('validate', file_name) as stage_metrics:
+            clean_df, bad_lines = read_transaction_file(df)
+            stage_metrics.rows_in = len(df)
+            stage_metrics.rows_out = len(clean_df)
+            stage_metrics.bad_lines = len(bad_lines)
+        del df
+
+    with metrics.stage('deduplicate', file_name) as stage_metrics:
+        duplicate_ids = DuplicateIds(clean_df[Cols.id])
+        unique_df = prepare_for_load(clean_df, duplicate_ids.is_duplicated(clean_df[Cols.id]), file_transaction_date(file_name))
+        stage_metrics.rows_in = len(clean_df)
+        stage_metrics.rows_out = len(unique_df)
+
+    if not os.path.exists(parquet_retail_path):
+        if bad_lines:
+            log.warning(f"Bad line(s) in the file: {incoming_file_path}\nID of the bad lines: {bad_lines[0]}")
+            for line in bad_lines[1:0]:
+                log.warning(line)
+        with metrics.stage('write_parquet', file_name) as stage_metrics:
+            clean_df.to_parquet(parquet_retail_path, index=False)
+            stage_metrics.rows_in = len(clean_df)
+            stage_metrics.bytes_written = os.path.getsize(parquet_retail_path)
+
+    return unique_df
+
+
+def iter_transactions(incoming_file_path: str, file_name: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Streaming version of transforme_transactions: reads the CSV file in chunks, validates each chunk,
+    appends it to the Parquet file and yields the rows ready to be loaded.
+
+    The file is read in two passes so that, as in transforme_transactions, the duplicated ids are looked
+    for among the valid rows of the whole file and every copy of them is dropped. The first pass validates
+    the chunks, appends them to a spill Parquet file, one row group each, and keeps the ids of the valid rows
+    as 16-byte keys and the categories met. The second pass reads the row groups back, gives the category and
+    description columns the categories of the whole file and drops the duplicated ids. The row groups are
+    appended to the Parquet file of the CSV file with these categories, i.e. dictionary-encoded, unless it
+    already exists. The memory used is bounded by the chunk size, except for the ids and the categories.
+
+    Args:
+        incoming_file_path (str): The path to the folder containing the incoming CSV file.
+        file_name (str): The name of the CSV file to be transformed.
+        chunk_size (int): The number of rows read at a time.
+
+    Yields:
+        pd.DataFrame: The unique transaction entries of each chunk with a transaction date.
+
+    Raises:
+        FileNotFoundError: If the incoming file path does not exist.
+        pd.errors.EmptyDataError: If the CSV file is empty or cannot be read.
+    """
+    csv_path = os.path.join(incoming_file_path, file_name)
+    parquet_retail_path = os.path.join(incoming_file_path, parquet_file_name(file_name))
+    # The Parquet file is written next to its final name and renamed once complete, from the row groups of the spill file
+    parquet_tmp_path = f"{parquet_retail_path}.tmp"
+    spill_path = f"{parquet_retail_path}.spill"
+    write_parquet = not os.path.exists(parquet_retail_path)
+    for path in (parquet_tmp_path, spill_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    duplicate_ids = DuplicateIds()
+    categories = {Cols.category: set(), Cols.description: set()}
+    reader = pd.read_csv(csv_path, dtype=CSV_DTYPES, chunksize=chunk_size, memory_map=True)
+    while True:
+        with metrics.stage('read_csv', file_name) as stage_metrics:
+            chunk = next(reader, None)
+            if chunk is None:
+                stage_metrics.bytes_read = os.path.getsize(csv_path)
+            else:
+                stage_metrics.rows_out = len(chunk)
+        if chunk is None:
+            break
+
+        with metrics.stage('validate', file_name) as stage_metrics:
+            clean_df, bad_lines = read_transaction_file(chunk)
+            duplicate_ids.add(clean_df[Cols.id])
+            for column, values in categories.items():
+                values.update(clean_df[column].cat.categories)
+            stage_metrics.rows_in = len(chunk)
+            stage_metrics.rows_out = len(clean_df)
+            stage_metrics.bad_lines = len(bad_lines)
+        if bad_lines:
+            log.warning(f"{len(bad_lines)} bad line(s) in the file: {csv_path}\nID of the first bad line: {bad_lines[0]}")
+        if not clean_df.empty or not os.path.exists(spill_path):
+            with metrics.stage('spill', file_name) as stage_metrics:
+                # fastparquet cannot append categorical columns whose categories differ between chunks
+                plain_df = clean_df.astype({Cols.category: object, Cols.description: object})
+                plain_df.to_parquet(spill_path, index=False, engine='fastparquet', append=os.path.exists(spill_path))
+                stage_metrics.rows_in = len(clean_df)
+    log.info(f"{len(duplicate_ids)} duplicated id(s) among {duplicate_ids.ids_added} valid rows in the file: {csv_path}, "
+             f"{duplicate_ids.bytes_per_id:.1f} bytes per id")
+
+    if not os.path.exists(spill_path):
+        # The file has no row
+        return
+
+    transaction_date = file_transaction_date(file_name)
+    # Every row group has the same categories, which fastparquet needs to append them
+    dtypes = {column: pd.CategoricalDtype(sorted(values)) for column, values in categories.items()}
+    spill_file = fastparquet.ParquetFile(spill_path)
+    try:
+        # The row groups are read from one open file, which fastparquet would otherwise open for each of them
+        with open(spill_path, 'rb') as spill_infile:
+            for row_group in spill_file.row_groups:
+                with metrics.stage('read_parquet', file_name) as stage_metrics:
+                    clean_df = spill_file.read_row_group_file(row_group, spill_file.columns, spill_file.categories,
+                                                              index=False, infile=spill_infile).astype(dtypes)
+                    stage_metrics.rows_out = len(clean_df)
+                if write_parquet and (not clean_df.empty or not os.path.exists(parquet_tmp_path)):
+                    with metrics.stage('write_parquet', file_name) as stage_metrics:
+                        clean_df.to_parquet(parquet_tmp_path, index=False, engine='fastparquet',
+                                            append=os.path.exists(parquet_tmp_path))
+                        stage_metrics.rows_in = len(clean_df)
+                if clean_df.empty:
+                    continue
+
+                with metrics.stage('deduplicate', file_name) as stage_metrics:
+                    unique_df = prepare_for_load(clean_df, duplicate_ids.is_duplicated(clean_df[Cols.id]), transaction_date)
+                    stage_metrics.rows_in = len(clean_df)
+                    stage_metrics.rows_out = len(unique_df)
+                yield unique_df
+        if write_parquet and not os.path.exists(parquet_tmp_path):
+            # The spill file of a file without valid row has no row group
+            spill_file.to_pandas(index=False).astype(dtypes).to_parquet(parquet_tmp_path, index=False, engine='fastparquet')
+    finally:
+        os.remove(spill_path)
+
+    if write_parquet:
+        os.replace(parquet_tmp_path, parquet_retail_path)
+        with metrics.stage('write_parquet', file_name) as stage_metrics:
+            stage_metrics.bytes_written = os.path.getsize(parquet_retail_path)
+
+def load_data(df: pd.DataFrame, db_file_name: str= 'retail.db', batch_size: int = DEFAULT_BATCH_SIZE,
+              commit_policy: CommitPolicy | None = None, profile: str = 'default', file_name: str | None = None) -> None:
+    """
+    Loads transaction data into a SQLite database.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing transaction data to be loaded.
+        db_file_name (str): The name of the SQLite database file.
+        batch_size (int): The number of rows inserted by each executemany call.
+        commit_policy (CommitPolicy | None): When to commit. Default is a single commit for the whole DataFrame.
+        profile (str): The connection profile of the database, 'ingest' is tuned for loading.
+        file_name (str | None): The file the rows come from, which names the stage in the metrics of the run.
+
+    Returns:
+        None
+
+    Raises:
+        Exception: If there is an error during the bulk import of data.
+    """
+    retail = ESretail(db_file_name, profile=profile)
+    try:
+        with metrics.stage('load', file_name) as stage_metrics:
+            stage_metrics.rows_in = len(df)
+            stage_metrics.rows_out = retail.bulk_import(df, batch_size=batch_size, commit_policy=commit_policy)
+    except Exception as e:
+        log.error(f"Error during bulk import: {e}")
+        raise
+    finally:
+        retail.conn.close()
+
+
+def read_appended_rows(csv_path: str, byte_offset: int) -> tuple[pd.DataFrame, int]:
+    """
+    Reads the complete lines of a CSV file that start at or after a byte offset.
+
+    A last line without its end of line is being written: it is left for the next read.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        byte_offset (int): The offset of the first byte to read, 0 to read the file from its header.
+
+    Returns:
+        tuple: A tuple containing:
+            - (pd.DataFrame) df: The rows read, with the columns of the header of the file.
+            - (int) byte_offset: The offset following the last complete line read.
+    """
+    with open(csv_path, 'rb') as csv_file:
+        header = csv_file.readline()
+        if not header.endswith(b'\n'):
+            # The header itself is not complete yet
+            return pd.DataFrame(), 0
+        byte_offset = max(byte_offset, len(header))
+        csv_file.seek(byte_offset)
+        appended = csv_file.read()
+
+    complete = appended[:appended.rfind(b'\n') + 1]
+    df = read_transaction_csv(io.BytesIO(header + complete))
+    return df, byte_offset + len(complete)
+
+
+def tail_transactions(incoming_file_path: str, file_name: str, db_file_name: str = 'retail.db') -> int:
+    """
+    Loads the rows appended to a CSV file since the previous call, for files uploaded several times a day.
+
+    The position reached in the file is stored in the database in the transaction of the rows loaded.
+    A file smaller than the checkpoint has been replaced and is read from its beginning again: as on the
+    first call, the ids already stored are then ignored by the unique id.
+
+    As in the other modes every copy of an id present several times in the file is dropped, also when the
+    copies are appended by different uploads: the copy loaded by a previous call is deleted and the id
+    is recorded, so that its later copies are dropped as well. A copy is looked for among the rows loaded
+    from the same file only: an id already loaded from another file is ignored by the unique id, whether
+    it comes in the first read of the file or in an append.
+
+    The valid rows are appended to the Parquet file of the CSV file, once loaded. The category and description
+    columns are written as plain strings, their categories differing between the calls.
+
+    Args:
+        incoming_file_path (str): The path to the folder containing the incoming CSV file.
+        file_name (str): The name of the CSV file.
+        db_file_name (str): The name of the SQLite database file.
+
+    Returns:
+        int: The number of new rows read.
+    """
+    csv_path = os.path.join(incoming_file_path, file_name)
+    parquet_retail_path = os.path.join(incoming_file_path, parquet_file_name(file_name))
+    transaction_date = file_transaction_date(file_name)
+    retail = ESretail(db_file_name)
+    try:
+        byte_offset, row_count = retail.get_file_checkpoint(file_name)
+        if os.path.getsize(csv_path) < byte_offset:
+            log.warning(f"The file: {csv_path} is smaller than at the previous run, it is read from the beginning")
+            byte_offset, row_count = 0, 0
+
+        with metrics.stage('read_csv', file_name) as stage_metrics:
+            df, new_byte_offset = read_appended_rows(csv_path, byte_offset)
+            stage_metrics.bytes_read = new_byte_offset - byte_offset if new_byte_offset else 0
+            stage_metrics.rows_out = len(df)
+        if df.empty:
+            log.info(f"No new line in the file: {csv_path}")
+            return 0
+
+        with metrics.stage('validate', file_name) as stage_metrics:
+            clean_df, bad_lines = read_transaction_file(df)
+            stage_metrics.rows_in = len(df)
+            stage_metrics.rows_out = len(clean_df)
+            stage_metrics.bad_lines = len(bad_lines)
+        if bad_lines:
+            log.warning(f"{len(bad_lines)} bad line(s) in the file: {csv_path}\nID of the first bad line: {bad_lines[0]}")
+        with metrics.stage('deduplicate', file_name) as stage_metrics:
+            ids = clean_df[Cols.id]
+            duplicated = DuplicateIds(ids).is_duplicated(ids)
+            if byte_offset == 0:
+                # The file is read from its beginning: nothing has been met in it yet
+                retail.forget_dropped_ids(file_name)
+            else:
+                earlier_copies = retail.find_earlier_copies(file_name, ids.unique().tolist())
+                duplicated |= ids.isin(earlier_copies).to_numpy()
+            dropped_ids = ids[duplicated].unique().tolist()
+            if dropped_ids:
+                deleted = retail.drop_copies(file_name, transaction_date, dropped_ids)
+                log.warning(f"{len(dropped_ids)} id(s) present several times in the file: {csv_path} are dropped, "
+                            f"{deleted} of them loaded by a previous run")
+            unique_df = prepare_for_load(clean_df, duplicated, transaction_date)
+            stage_metrics.rows_in = len(clean_df)
+            stage_metrics.rows_out = len(unique_df)
+        with metrics.stage('load', file_name) as stage_metrics:
+            stage_metrics.rows_in = len(unique_df)
+            stage_metrics.rows_out = retail.bulk_import(unique_df, file_checkpoint=(file_name, new_byte_offset, row_count + len(df)))
+        with metrics.stage('write_parquet', file_name) as stage_metrics:
+            # fastparquet cannot append categorical columns whose categories differ between calls
+            plain_df = clean_df.astype({Cols.category: object, Cols.description: object})
+            append = byte_offset > 0 and os.path.exists(parquet_retail_path)
+            plain_df.to_parquet(parquet_retail_path, index=False, engine='fastparquet', append=append)
+            stage_metrics.rows_in = len(clean_df)
+        log.info(f"{len(df)} new line(s) read from the file: {csv_path}")
+        return len(df)
+    finally:
+        retail.conn.close()
@@ -1,216 +1,174 @@
-import os
-import pandas as pd
 import logging
+import time
+import pandas as pd
+from src import datalake, etl, metrics
+from src.datalake import find_csv_files, mark_processed, select_pending_files
+from src.etl import iter_transactions
 from src.retail import ESretail
-from prefect import flow, task
+from prefect import flow, task, unmapped
+from prefect.artifacts import create_table_artifact
+from prefect.task_runners import ThreadPoolTaskRunner
 
 log = logging.getLogger("retail")
 log.setLevel(logging.DEBUG)
 
+# Number of files extracted and transformed concurrently by run_etl
+MAX_WORKERS = 4
 
-
-class Cols :
-    id = 'id'
-    category = 'category'
-    description = 'description'
-    quantity = 'quantity'
-    amount_excl_tax = 'amount_excl_tax'
-    amount_inc_tax = 'amount_inc_tax'
+# The steps of src.datalake and src.etl run as Prefect tasks, see src.cli to run them without Prefect
+extract = task(datalake.extract)
+transforme_transactions = task(etl.transforme_transactions)
+load_data = task(etl.load_data)
+tail_transactions = task(etl.tail_transactions)
 
 
-
-def find_csv(folder_path: str) -> str:
+@task
+def extract_and_transform(csv_file_name: str, processes: int | None = None) -> tuple[pd.DataFrame, float]:
     """
-    Finds the CSV file in the specified folder path.
+    Extracts and transforms one CSV file of the data folder.
 
     Args:
-        folder_path (str): The path to the folder containing the CSV file.
-
-    Returns:
-        str: The name of the CSV file found in the folder.
-
-    Raises:
-        FileExistsError: If there are multiple CSV files in the folder.
-        FileNotFoundError: If no CSV files are found in the folder.
-    """
-    csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
-    if len(csv_files) > 1:
-        raise FileExistsError("Data folder should have only one file")
-    if len(csv_files) == 0:
-        raise FileNotFoundError("Data folder should have one file")
-    return csv_files[0]
-@task
-def extract() -> tuple[str, str]:
-    """
-    Extracts data from a CSV file located in a specified folder and saves it in a structured format in the datalake.
+        csv_file_name (str): The name of the CSV file in the data folder.
+        processes (int | None): The number of processes validating the file, see transforme_transactions.
 
     Returns:
         tuple: A tuple containing:
-            - (str) raw_data_folder: The path of the folder where the raw data is saved.
-            - (str) csv_file_name: The name of the CSV file extracted.
-    
-    Raises:
-        FileNotFoundError: If the data folder does not contain exactly one CSV file.
-        OSError: If there is an issue creating the raw data folder.
+            - (pd.DataFrame) unique_df: The unique transaction entries of the file, ready to be loaded.
+            - (float) elapsed: The time spent extracting and transforming the file, in seconds.
     """
-    current_path = os.path.dirname(os.path.abspath(__file__))
-    datalake_path = os.path.abspath(os.path.join(current_path, '..', 'datalake'))
-    csv_file_name = find_csv(os.path.abspath(os.path.join(current_path, '..', 'data')))
-    csv_file_path = os.path.join('data', csv_file_name)
-    raw_data_folder = os.path.join(
-        datalake_path,
-        csv_file_name.split("_")[3][0:4],
-        csv_file_name.split("_")[2],
-        csv_file_name.split("_")[1],
-    )
-    incoming_file_path = os.path.join(raw_data_folder, csv_file_name)
+    start = time.perf_counter()
+    incoming_file_path, file_name = extract(csv_file_name)
+    unique_df = transforme_transactions(incoming_file_path, file_name, processes)
+    return unique_df, time.perf_counter() - start
 
-    # Save raw data in datalake 
-    if not os.path.exists(raw_data_folder):
-        os.makedirs(raw_data_folder)
-        log.info(f"The folder: {raw_data_folder} has been created")
-    else:
-        log.warning(f"The folder: {raw_data_folder} already exists")
 
-    with open(csv_file_path, 'rb') as source_file:
-        with open(incoming_file_path, 'wb') as target_file:
-            target_file.write(source_file.read())
-        
-    return raw_data_folder, csv_file_name
-
-
-def read_transaction_file(df:pd.DataFrame) -> tuple[pd.DataFrame, list]:
+def process_files(db_file_name: str, chunk_size: int | None, tail: bool,
+                  processes: int | None) -> tuple[dict[str, dict[str, float]], list[str]]:
     """
-    Reads a transaction DataFrame and validates its contents.
+    Processes the pending CSV files of the data folder for run_etl.
+
+    A file whose extract, transform or load fails is logged and skipped, without being added to the manifest,
+    and the next files are processed.
 
     Args:
-        df (pd.DataFrame): The DataFrame containing transaction data.
+        db_file_name (str): The name of the SQLite database file.
+        chunk_size (int | None): When set, each file is streamed and loaded chunk by chunk of this number of rows.
+        tail (bool): When True, only the rows appended to each file since the previous run are loaded.
+        processes (int | None): The number of processes validating each file read in memory at once.
 
     Returns:
         tuple: A tuple containing:
-            - (pd.DataFrame) clean_df: A DataFrame with valid transaction entries.
-            - (List[str]) bad_lines: A list of IDs for entries that could not be processed.
-
-    Raises:
-        KeyError: If the DataFrame does not contain the required columns or has extra columns.
+            - (dict[str, dict[str, float]]) timings: The time spent on each file processed, in seconds, by step.
+            - (list[str]) failed_files: The names of the files that failed.
     """
-    required_columns = {Cols.id, Cols.category, Cols.description, Cols.quantity, Cols.amount_excl_tax, Cols.amount_inc_tax}
-    if not required_columns.issubset(df.columns) or len(df.columns) != len(required_columns):
-        raise KeyError("The columns of the DataFrame don't correspond to the columns of the database.")
-
-    bad_lines = []
-    clean_lines = []
-
-    for i in range(df.shape[0]):
-        try:
-            id = str(df[Cols.id].iloc[i])
-        except ValueError:
-            continue
-
-        try:
-            category = str(df[Cols.category].iloc[i])
-            description = str(df[Cols.description].iloc[i])
-            quantity = int(df[Cols.quantity].iloc[i])
-            amount_excl_tax = round(float(df[Cols.amount_excl_tax].iloc[i]), 2)
-            amount_inc_tax = round(float(df[Cols.amount_inc_tax].iloc[i]), 2)
-        except ValueError:
-            bad_lines.append(id)
-            continue  
-
-        transaction_dict = {
-            Cols.id: id,
-            Cols.category: category,
-            Cols.description: description,
-            Cols.quantity: quantity,
-            Cols.amount_excl_tax: amount_excl_tax,
-            Cols.amount_inc_tax: amount_inc_tax
-        }
-        clean_lines.append(transaction_dict)
-
-    clean_df = pd.DataFrame(
-        clean_lines,
-        columns=[
-            Cols.id,
-            Cols.category,
-            Cols.description,
-            Cols.quantity,
-            Cols.amount_excl_tax,
-            Cols.amount_inc_tax
-        ]
-    )
+    retail = ESretail(db_file_name)
+    timings, failed_files = {}, []
+    try:
+        if tail:
+            # The tailing mode reads only the appended rows, from its checkpoints, and keeps no manifest
+            fingerprints = {}
+            csv_file_names = datalake.select_appended_files(datalake.DATA_FOLDER, find_csv_files(datalake.DATA_FOLDER), retail)
+        else:
+            fingerprints = select_pending_files(datalake.DATA_FOLDER, find_csv_files(datalake.DATA_FOLDER), retail)
+            csv_file_names = list(fingerprints)
+        if not csv_file_names:
+            log.info("No CSV file to process")
+            return timings, failed_files
+
+        if not tail and not chunk_size:
+            futures = dict(zip(csv_file_names, extract_and_transform.map(csv_file_names, processes=unmapped(processes))))
+        for csv_file_name in csv_file_names:
+            start = time.perf_counter()
+            try:
+                if tail:
+                    incoming_file_path, file_name = extract(csv_file_name, append=True)
+                    tail_transactions(incoming_file_path, file_name, db_file_name)
+                    timing = {'total': time.perf_counter() - start}
+                elif chunk_size:
+                    incoming_file_path, file_name = extract(csv_file_name)
+                    for chunk_df in iter_transactions(incoming_file_path, file_name, chunk_size):
+                        load_data(chunk_df, db_file_name, file_name=csv_file_name)
+                    timing = {'total': time.perf_counter() - start}
+                else:
+                    unique_df, transform_time = futures.pop(csv_file_name).result()
+                    start = time.perf_counter()
+                    load_data(unique_df, db_file_name, file_name=csv_file_name)
+                    load_time = time.perf_counter() - start
+                    timing = {'extract_transform': transform_time, 'load': load_time, 'total': transform_time + load_time}
+                if not tail:
+                    mark_processed(retail, csv_file_name, fingerprints[csv_file_name])
+            except Exception as e:
+                log.error(f"The file: {csv_file_name} could not be processed, it is left for the next run: {e}")
+                failed_files.append(csv_file_name)
+                continue
+            timings[csv_file_name] = timing
+    finally:
+        retail.conn.close()
+    return timings, failed_files
 
-    return clean_df, bad_lines
 
-@task
-def transforme_transactions(incoming_file_path: str, file_name: str) -> pd.DataFrame:
+def publish_metrics(run_metrics: metrics.RunMetrics) -> None:
     """
-    Transforms transaction data from a CSV file into a cleaned DataFrame and saves it as a Parquet file.
+    Writes the metrics of a run to its JSON file and shows them as a table artifact of the flow run.
 
     Args:
-        incoming_file_path (str): The path to the folder containing the incoming CSV file.
-        file_name (str): The name of the CSV file to be transformed.
+        run_metrics (metrics.RunMetrics): The metrics of the run.
 
     Returns:
-        pd.DataFrame: A DataFrame containing unique transaction entries with a transaction date.
-
-    Raises:
-        FileNotFoundError: If the incoming file path does not exist.
-        pd.errors.EmptyDataError: If the CSV file is empty or cannot be read.
+        None
     """
-    df = pd.read_csv(os.path.join(incoming_file_path, file_name))
-    parquet_retail_file_name = f"retail_data{file_name[7:0]}.parquet"
-    parquet_retail_path = os.path.join(incoming_file_path, parquet_retail_file_name)
-
-    clean_df, bad_lines = read_transaction_file(df)
-
-    unique_df = clean_df[~clean_df['id'].duplicated(keep=False)]
-
-    file_year = file_name.split("_")[3][0:4]
-    file_month = file_name.split("_")[2]
-    file_day = file_name.split("_")[1]
-    unique_df['transaction_date'] = f"{file_year}-{file_month}-{file_day}"
+    metrics_path = run_metrics.write_json()
+    log.info(f"The metrics of the run have been saved in: {metrics_path}")
+    create_table_artifact(
+        key="retail-etl-metrics",
+        table=run_metrics.table(),
+        description=f"Wall time, rows, bytes and peak RSS of each stage and file of the run, also saved in {metrics_path}",
+    )
 
-    unique_df.rename(columns={'description': 'name'}, inplace=True)
 
-    if not os.path.exists(parquet_retail_path):
-        if bad_lines:
-            log.warning(f"Bad line(s) in the file: {incoming_file_path}\nID of the bad lines: {bad_lines[0]}")
-            for line in bad_lines[1:0]:
-                log.warning(line)
-        clean_df.to_parquet(parquet_retail_path, index=False)
+@flow(name="Retail Flow", task_runner=ThreadPoolTaskRunner(max_workers=MAX_WORKERS))
+def run_etl(chunk_size: int | None = None, db_file_name: str = 'retail.db', tail: bool = False,
+            processes: int | None = None) -> dict[str, dict[str, float]]:
+    """
+    Extracts every CSV file of the data folder, transforms them and loads them into the database.
 
-    return unique_df
+    The files found in the manifest of the database are skipped. The files are extracted and transformed
+    concurrently by the task runner of the flow (MAX_WORKERS threads, see run_etl.with_options to change it).
+    They are loaded one at a time in the order of their names, as soon as each one is transformed, since
+    SQLite accepts a single writer, and each loaded file is added to the manifest. A file that fails is
+    skipped and left out of the manifest, the flow failing once the other files are loaded.
 
-@task
-def load_data(df: pd.DataFrame, db_file_name: str= 'retail.db') -> None:
-    """
-    Loads transaction data into a SQLite database.
+    The wall time, rows, bad lines, bytes and peak RSS of each stage (extract, read_csv, validate, deduplicate,
+    write_parquet, load) and file are saved in a JSON file of the metrics folder (RETAIL_METRICS_DIR) and shown
+    as the retail-etl-metrics table artifact. RETAIL_PROFILER=cprofile or tracemalloc profiles the run as well.
 
     Args:
-        df (pd.DataFrame): The DataFrame containing transaction data to be loaded.
+        chunk_size (int | None): When set, each file is streamed and loaded chunk by chunk of this
+            number of rows instead of being read in memory at once. The files are then processed one at a time.
         db_file_name (str): The name of the SQLite database file.
+        tail (bool): When True, only the rows appended to each file since the previous run are loaded,
+            see tail_transactions. The files are then processed one at a time, selected by their checkpoints
+            rather than by the manifest, and only their appended bytes are copied to the datalake.
+        processes (int | None): When greater than 1, each file read in memory at once is validated by this
+            number of processes, for the very large files whose transform is bound by a single core.
 
     Returns:
-        None
+        dict[str, dict[str, float]]: The time spent on each file, in seconds, by step.
 
     Raises:
-        Exception: If there is an error during the bulk import of data.
+        RuntimeError: If some files could not be processed, once the other files are loaded.
     """
-    retail = ESretail(db_file_name)
-    try:
-        retail.bulk_import(df)
-    except Exception as e:
-        log.error(f"Error during bulk import: {e}")
-        raise
-    finally:
-        retail.conn.close()
-
-
-@flow(name="Retail Flow")
-def run_etl():
-    incoming_file_path, file_name = extract()
-    clean_df = transforme_transactions(incoming_file_path, file_name)
-    load_data(clean_df)
+    with metrics.collect_run() as run_metrics:
+        with metrics.profiling(run_metrics):
+            timings, failed_files = process_files(db_file_name, chunk_size, tail, processes)
+        if run_metrics.stages:
+            publish_metrics(run_metrics)
+
+    for csv_file_name, timing in timings.items():
+        log.info(f"{csv_file_name}: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timing.items()))
+    if failed_files:
+        raise RuntimeError(f"{len(failed_files)} file(s) could not be processed: {', '.join(failed_files)}")
+    return timings
 
 if __name__ == "__main__":
     run_etl()
\ No newline at end of file
@@ -0,0 +1,327 @@
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Environment variables: the profiler run around the flow ('cprofile' or 'tracemalloc') and the folder of the metrics files
+PROFILER_ENV = "RETAIL_PROFILER"
+METRICS_DIR_ENV = "RETAIL_METRICS_DIR"
+DEFAULT_METRICS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'metrics'))
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of the process since it started.
+
+    Returns:
+        int: The peak RSS in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@dataclass
+class StageMetrics:
+    """
+    Measures of a stage of the pipeline for a file, summed over the calls of the stage (e.g. one per chunk).
+
+    Attributes:
+        stage (str): The name of the stage, e.g. 'extract', 'validate' or 'load'.
+        file_name (str | None): The file processed by the stage.
+        calls (int): The number of times the stage ran.
+        wall_seconds (float): The time spent in the stage.
+        rows_in (int): The number of rows received by the stage.
+        rows_out (int): The number of rows produced by the stage.
+        bad_lines (int): The number of rows rejected by the stage.
+        bytes_read (int): The number of bytes read from files.
+        bytes_written (int): The number of bytes written to files.
+        peak_rss_bytes (int): The peak RSS of the process at the end of the stage.
+    """
+    stage: str
+    file_name: str | None = None
+    calls: int = 0
+    wall_seconds: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    bad_lines: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    peak_rss_bytes: int = 0
+
+    @property
+    def rows_per_second(self) -> float | None:
+        """
+        The throughput of the stage, in rows received (or produced when it receives none) per second.
+        """
+        rows = self.rows_in or self.rows_out
+        return rows / self.wall_seconds if rows and self.wall_seconds > 0 else None
+
+    def add(self, other: "StageMetrics") -> None:
+        """
+        Adds the measures of another call of the stage.
+
+        Args:
+            other (StageMetrics): The measures of the other call.
+
+        Returns:
+            None
+        """
+        for field in ('calls', 'wall_seconds', 'rows_in', 'rows_out', 'bad_lines', 'bytes_read', 'bytes_written'):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.peak_rss_bytes = max(self.peak_rss_bytes, other.peak_rss_bytes)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the measures and the throughput as a dict.
+
+        Returns:
+            dict: The fields of the dataclass and rows_per_second.
+        """
+        return {**asdict(self), 'rows_per_second': self.rows_per_second}
+
+
+class RunMetrics:
+    """
+    Collects the StageMetrics of a run of the pipeline, the stages running in several threads.
+    """
+
+    def __init__(self, name: str = 'retail-etl') -> None:
+        """
+        Initializes an empty run.
+
+        Args:
+            name (str): The name of the run, used in the name of its metrics file.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.extra = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, stage: str, file_name: str | None = None) -> Iterator[StageMetrics]:
+        """
+        Measures the wall time and the peak RSS of a block, the caller filling the rows and the bytes.
+
+        Args:
+            stage (str): The name of the stage.
+            file_name (str | None): The file processed by the stage.
+
+        Yields:
+            StageMetrics: The measures of this call, added to the run when the block exits.
+        """
+        metrics = StageMetrics(stage, file_name, calls=1)
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds = time.perf_counter() - start
+            metrics.peak_rss_bytes = peak_rss_bytes()
+            with self._lock:
+                if (stage, file_name) in self._stages:
+                    self._stages[(stage, file_name)].add(metrics)
+                else:
+                    self._stages[(stage, file_name)] = metrics
+
+    @property
+    def stages(self) -> list[StageMetrics]:
+        """
+        The measures of each stage and file, in the order the stages first ran.
+        """
+        with self._lock:
+            return list(self._stages.values())
+
+    def to_dict(self) -> dict:
+        """
+        Returns the run as a JSON-serializable dict.
+
+        Returns:
+            dict: The name, the start time, the peak RSS, the extra values and the stages of the run.
+        """
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            **self.extra,
+            'stages': [metrics.to_dict() for metrics in self.stages],
+        }
+
+    def write_json(self, folder: str | None = None) -> str:
+        """
+        Writes the run to a JSON file named after the run and its start time.
+
+        Args:
+            folder (str | None): The folder of the file. Default is the RETAIL_METRICS_DIR environment variable,
+                or the metrics folder at the project root.
+
+        Returns:
+            str: The path of the file.
+        """
+        folder = folder or os.environ.get(METRICS_DIR_ENV) or DEFAULT_METRICS_DIR
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{self.name}_{self.started_at:%Y%m%dT%H%M%S%f}.json")
+        with open(path, 'w') as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+        return path
+
+    def table(self) -> list[dict]:
+        """
+        Returns one row per stage and file, e.g. for a Prefect table artifact.
+
+        Returns:
+            list[dict]: The measures of each stage and file, rounded for display.
+        """
+        rows = []
+        for metrics in self.stages:
+            row = metrics.to_dict()
+            row['wall_seconds'] = round(row['wall_seconds'], 3)
+            row['rows_per_second'] = round(row['rows_per_second']) if row['rows_per_second'] else None
+            rows.append(row)
+        return rows
+
+
+# Run collecting the stages of the pipeline, None outside of run_etl
+_active_run: RunMetrics | None = None
+
+# Profiles of the stages run by other threads than the one of the cprofile profiler, None outside of it.
+# cProfile only traces the thread which enables it, and the task runner of run_etl runs the stages in its threads.
+_thread_profiles: list[cProfile.Profile] | None = None
+_profiled_thread = threading.local()
+
+
+@contextlib.contextmanager
+def collect_run(name: str = 'retail-etl') -> Iterator[RunMetrics]:
+    """
+    Makes a new RunMetrics the one collecting the stages of the pipeline for the duration of a block.
+
+    Args:
+        name (str): The name of the run.
+
+    Yields:
+        RunMetrics: The run.
+    """
+    global _active_run
+    previous_run, _active_run = _active_run, RunMetrics(name)
+    try:
+        yield _active_run
+    finally:
+        _active_run = previous_run
+
+
+@contextlib.contextmanager
+def stage(stage: str, file_name: str | None = None) -> Iterator[StageMetrics]:
+    """
+    Measures a stage of the pipeline in the active run. Outside of a run the measures are dropped.
+
+    Args:
+        stage (str): The name of the stage.
+        file_name (str | None): The file processed by the stage.
+
+    Yields:
+        StageMetrics: The measures of this call.
+    """
+    with _profile_thread():
+        if _active_run is None:
+            yield StageMetrics(stage, file_name, calls=1)
+            return
+        with _active_run.stage(stage, file_name) as metrics:
+            yield metrics
+
+
+@contextlib.contextmanager
+def _profile_thread() -> Iterator[None]:
+    """
+    Profiles a block for the cprofile profiler when it runs in a thread the profiler does not trace yet.
+
+    Yields:
+        None
+    """
+    thread_profiles = _thread_profiles
+    if thread_profiles is None or getattr(_profiled_thread, 'active', False):
+        yield
+        return
+    profile = cProfile.Profile()
+    _profiled_thread.active = True
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiled_thread.active = False
+        thread_profiles.append(profile)
+
+
+@contextlib.contextmanager
+def profiling(run: RunMetrics, folder: str | None = None) -> Iterator[None]:
+    """
+    Profiles a block with the profiler named by the RETAIL_PROFILER environment variable, if set.
+
+    With 'cprofile' the statistics are written to a .prof file next to the metrics file (see pstats or snakeviz).
+    The stages run by other threads, e.g. the workers of the task runner, are profiled in their thread and
+    their statistics merged into the file.
+    With 'tracemalloc' the 25 lines allocating the most memory are written to a .txt file and the peak of
+    the traced memory is added to the run.
+
+    Args:
+        run (RunMetrics): The run, which names the files.
+        folder (str | None): The folder of the files, default as in RunMetrics.write_json.
+
+    Yields:
+        None
+    """
+    profiler = os.environ.get(PROFILER_ENV, '').lower()
+    if profiler not in ('cprofile', 'tracemalloc'):
+        if profiler:
+            logging.warning(f"Unknown profiler {profiler} in {PROFILER_ENV}, expected 'cprofile' or 'tracemalloc'.")
+        yield
+        return
+
+    folder = folder or os.environ.get(METRICS_DIR_ENV) or DEFAULT_METRICS_DIR
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{run.name}_{run.started_at:%Y%m%dT%H%M%S%f}")
+    if profiler == 'cprofile':
+        global _thread_profiles
+        profile = cProfile.Profile()
+        _thread_profiles = []
+        _profiled_thread.active = True
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _profiled_thread.active = False
+            thread_profiles, _thread_profiles = _thread_profiles, None
+            stats = pstats.Stats(profile)
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            stats.dump_stats(f"{path}.prof")
+            run.extra['profile'] = f"{path}.prof"
+    else:
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            run.extra['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(f"{path}.txt", 'w') as profile_file:
+                for statistic in snapshot.statistics('lineno')[:25]:
+                    profile_file.write(f"{statistic}\n")
+            run.extra['profile'] = f"{path}.txt"
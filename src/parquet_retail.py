@@ -0,0 +1,140 @@
+import os
+import logging
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class PQretail:
+    def __init__(self, datalake_path: str | None = None, deduplicate: bool = True) -> None:
+        """
+        Initializes the PQretail class, which answers the questions of ESretail from the Parquet files of the
+        datalake so that the scans of the history don't run on the SQLite database.
+
+        The datalake is read as a dataset partitioned by year, month and day (datalake/YYYY/MM/DD):
+        the partitions outside of the requested dates are not opened and only the needed columns are read.
+
+        Args:
+            datalake_path (str | None): The path of the datalake. Default is the datalake folder at the project root.
+            deduplicate (bool): If True, the transactions are deduplicated like in the database: the ids present
+                several times in a file are dropped and an id already seen in an earlier file is ignored.
+                Only the files of the requested dates are compared with each other.
+                This reads the id column, set it to False to read only the columns of each question.
+
+        Returns:
+            None
+        """
+        self.datalake_path = datalake_path or os.path.join(os.path.dirname(__file__), '..', 'datalake')
+        self.deduplicate = deduplicate
+
+    def partitions(self, start_date: str | None = None, end_date: str | None = None) -> list[tuple[str, str]]:
+        """
+        Lists the Parquet files of the datalake between two dates.
+
+        Args:
+            start_date (str | None): The first date in the format 'YYYY-MM-DD', default is the first partition.
+            end_date (str | None): The last date in the format 'YYYY-MM-DD', default is the last partition.
+
+        Returns:
+            list[tuple[str, str]]: The date and the path of each Parquet file, sorted by date.
+        """
+        files = []
+        if not os.path.isdir(self.datalake_path):
+            return files
+
+        for year in sorted(os.listdir(self.datalake_path)):
+            year_path = os.path.join(self.datalake_path, year)
+            if not os.path.isdir(year_path):
+                continue
+            for month in sorted(os.listdir(year_path)):
+                month_path = os.path.join(year_path, month)
+                if not os.path.isdir(month_path):
+                    continue
+                for day in sorted(os.listdir(month_path)):
+                    transaction_date = f"{year}-{month}-{day}"
+                    if (start_date and transaction_date < start_date) or (end_date and transaction_date > end_date):
+                        continue
+                    day_path = os.path.join(month_path, day)
+                    for file_name in sorted(os.listdir(day_path)):
+                        if file_name.startswith('retail_data') and file_name.endswith('.parquet'):
+                            files.append((transaction_date, os.path.join(day_path, file_name)))
+        return files
+
+    def read(self, columns: list[str], start_date: str | None = None, end_date: str | None = None,
+             product_name: str | None = None) -> pd.DataFrame:
+        """
+        Reads some columns of the transactions between two dates.
+
+        Args:
+            columns (list[str]): The columns to read, as named in the Parquet files.
+            start_date (str | None): The first date in the format 'YYYY-MM-DD', default is the first partition.
+            end_date (str | None): The last date in the format 'YYYY-MM-DD', default is the last partition.
+            product_name (str | None): If set, only the rows of this product (description column) are kept,
+                the filter being applied by the Parquet reader. The deduplication then only sees these rows.
+
+        Returns:
+            pd.DataFrame: The requested columns and the transaction_date of each transaction.
+        """
+        read_columns = list(dict.fromkeys(columns + (['id'] if self.deduplicate else [])))
+        filters = [('description', '==', product_name)] if product_name is not None else None
+
+        frames = []
+        for transaction_date, path in self.partitions(start_date, end_date):
+            df = pd.read_parquet(path, engine='fastparquet', columns=read_columns, filters=filters, row_filter=filters is not None)
+            if self.deduplicate:
+                df = df[~df['id'].duplicated(keep=False)]
+            frames.append(df.assign(transaction_date=transaction_date))
+
+        if not frames:
+            return pd.DataFrame(columns=columns + ['transaction_date'])
+        transactions = pd.concat(frames, ignore_index=True)
+        if self.deduplicate:
+            transactions = transactions.drop_duplicates('id', keep='first')
+        return transactions[columns + ['transaction_date']]
+
+    def count_transactions_by_date(self, transaction_date: str) -> int:
+        """
+        Counts the number of transactions of a specific transaction_date.
+
+        :param transaction_date: The date to search for in the format 'YYYY-MM-DD'.
+        :return: The count of matching transactions.
+        """
+        count = len(self.read(['id'], transaction_date, transaction_date))
+        logging.info(f"Count of transactions on {transaction_date}: {count}")
+        return count
+
+    def sum_total_transaction(self, start_date: str | None = None, end_date: str | None = None) -> float:
+        """
+        Returns the sum of the values amount_inc_tax column, summed exactly in cents.
+
+        :param start_date: The first date in the format 'YYYY-MM-DD', default is the first partition.
+        :param end_date: The last date in the format 'YYYY-MM-DD', default is the last partition.
+        :return: The sum of the values in the column.
+        """
+        total_sum = self.read(['amount_inc_tax_cents'], start_date, end_date)['amount_inc_tax_cents'].sum() / 100
+        logging.info(f"Sum of amount_inc_tax: {total_sum}")
+        return total_sum
+
+    def get_balance_by_date(self, product_name: str = "Amazon Echo Dot", start_date: str | None = None,
+                            end_date: str | None = None) -> pd.DataFrame:
+        """
+        Calculates the balance (SELL - BUY) by date for a specific product.
+
+        :param product_name: The name of the product to filter on, default is "Amazon Echo Dot".
+        :param start_date: The first date in the format 'YYYY-MM-DD', default is the first partition.
+        :param end_date: The last date in the format 'YYYY-MM-DD', default is the last partition.
+        :return: A DataFrame with the balance (SELL - BUY) by date.
+        """
+        transactions = self.read(['category', 'amount_inc_tax_cents'], start_date, end_date, product_name)
+        sign = transactions['category'].astype(object).map({'SELL': 1, 'BUY': -1}).fillna(0).astype('int64')
+        balance_by_date = (
+            (transactions['amount_inc_tax_cents'] * sign)
+            .groupby(transactions['transaction_date'])
+            .sum()
+            .div(100)
+            .rename('balance')
+            .reset_index()
+        )
+        logging.info(f"Balance by date calculated for {product_name} from Parquet.")
+        return balance_by_date
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.retail import ESretail, is_dataframe
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Number of read-only connections of the pool, i.e. of queries run at the same time
+DEFAULT_POOL_SIZE = 4
+
+
+class AsyncESretail:
+    def __init__(self, db_filename: str = 'retail.db', pool_size: int = DEFAULT_POOL_SIZE, coalesce: bool = True) -> None:
+        """
+        Initializes the AsyncESretail class, which answers the questions of ESretail to asyncio callers.
+
+        The queries run in a thread executor on a pool of connections opened with the readonly profile,
+        at most pool_size at a time: the other callers wait for a free connection without blocking the event loop.
+        Identical calls made while one of them is running share its result instead of running the query again.
+
+        Args:
+            db_filename (str): The name of the SQLite database file. Default is 'retail.db'.
+            pool_size (int): The number of connections, and of queries run at the same time. Default is DEFAULT_POOL_SIZE.
+            coalesce (bool): If True, identical calls in flight share a single query.
+
+        Returns:
+            None
+
+        Raises:
+            sqlite3.Error: If there is an error connecting to the SQLite database.
+            ValueError: If pool_size is lower than 1.
+        """
+        if pool_size < 1:
+            raise ValueError(f"The pool needs at least one connection, got {pool_size}.")
+        self.coalesce = coalesce
+        self.queries_run = 0
+        self.queries_coalesced = 0
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="retail-query")
+        self._connections = [ESretail(db_filename, profile='readonly', check_same_thread=False) for _ in range(pool_size)]
+        self._pool = None
+        self._in_flight = {}
+
+    async def __aenter__(self) -> "AsyncESretail":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Waits for the running queries and closes the connections of the pool.
+
+        Returns:
+            None
+        """
+        self._executor.shutdown(wait=True)
+        for retail in self._connections:
+            retail.conn.close()
+
+    def _get_pool(self) -> asyncio.Queue:
+        # The queue is created in the event loop of the first query
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for retail in self._connections:
+                self._pool.put_nowait(retail)
+        return self._pool
+
+    async def _execute(self, method: str, args: tuple):
+        pool = self._get_pool()
+        retail = await pool.get()
+        try:
+            self.queries_run += 1
+            return await asyncio.get_running_loop().run_in_executor(self._executor, getattr(retail, method), *args)
+        finally:
+            pool.put_nowait(retail)
+
+    async def _query(self, method: str, *args):
+        if not self.coalesce:
+            return await self._execute(method, args)
+
+        key = (method, args)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._execute(method, args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.queries_coalesced += 1
+        # A cancelled caller does not cancel the query shared with the others
+        result = await asyncio.shield(task)
+        # Each caller gets its own DataFrame
+        return result.copy() if is_dataframe(result) else result
+
+    async def count_transactions_by_date(self, transaction_date: str):
+        """
+        Counts the number of rows with a specific transaction_date.
+
+        :param transaction_date: The date to search for in the format 'YYYY-MM-DD'.
+        :return: The count of matching rows.
+        """
+        return await self._query('count_transactions_by_date', transaction_date)
+
+    async def sum_total_transaction(self):
+        """
+        Returns the sum of the values amount_inc_tax column.
+
+        :return: The sum of the values in the column, or None if an error occurs.
+        """
+        return await self._query('sum_total_transaction')
+
+    async def get_balance_by_date_sql(self, product_name: str = "Amazon Echo Dot"):
+        """
+        Calculates the balance (SELL - BUY) by date for a specific product.
+
+        :param product_name: The name of the product to filter on, default is "Amazon Echo Dot".
+        :return: A DataFrame with the balance (SELL - BUY) by date.
+        """
+        return await self._query('get_balance_by_date_sql', product_name)
+
+    async def get_cumulated_balance_by_date(self, product_name: str = "Amazon Echo Dot", start_date: str | None = None,
+                                            end_date: str | None = None):
+        """
+        Calculates the cumulated balance (SELL - BUY) by date for a specific product.
+
+        :param product_name: The name of the product to filter on, default is "Amazon Echo Dot".
+        :param start_date: The first date returned in the format 'YYYY-MM-DD', default is the first date of the history.
+        :param end_date: The last date returned in the format 'YYYY-MM-DD', default is the last date of the history.
+        :return: A DataFrame with the cumulated balance by date.
+        """
+        return await self._query('get_cumulated_balance_by_date', product_name, start_date, end_date)
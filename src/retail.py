@@ -1,88 +1,1339 @@
+from __future__ import annotations
+import argparse
+import functools
+import inspect
+import itertools
+import json
 import sqlite3
-import pandas as pd
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 import os
 import logging
 
+# pandas is imported by the methods returning or receiving DataFrames only: the SQL-only paths,
+# e.g. the counts or the manifest of the processed files, don't pay for its import
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Schema migrations, applied in order by ESretail.migrate.
+# The number of migrations already applied to a database is stored in its PRAGMA user_version.
+MIGRATIONS: list[tuple[str, ...]] = [
+    # 1. Transactions table, as in the historical retail.db
+    (
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id TEXT,
+            transaction_date TEXT,
+            category TEXT,
+            name TEXT,
+            quantity BIGINT,
+            amount_excl_tax FLOAT,
+            amount_inc_tax FLOAT
+        )
+        """,
+    ),
+    # 2. Unique index on the id used to deduplicate the imports, existing duplicates are removed first
+    (
+        """
+        DELETE FROM transactions
+        WHERE id IS NOT NULL
+          AND rowid NOT IN (SELECT MIN(rowid) FROM transactions GROUP BY id)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_id ON transactions (id)",
+    ),
+    # 3. Covering indexes of the analytical queries
+    (
+        "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (transaction_date)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_name_date
+        ON transactions (name, transaction_date, category, amount_inc_tax)
+        """,
+    ),
+    # 4. Daily totals by product and category, maintained by triggers in the transaction that writes the rows
+    (
+        """
+        CREATE TABLE IF NOT EXISTS daily_product_balance (
+            transaction_date TEXT NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount_excl_tax FLOAT NOT NULL,
+            amount_inc_tax FLOAT NOT NULL,
+            quantity BIGINT NOT NULL,
+            transaction_count BIGINT NOT NULL,
+            PRIMARY KEY (name, transaction_date, category)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO daily_product_balance
+        SELECT IFNULL(transaction_date, ''), IFNULL(name, ''), IFNULL(category, ''),
+               TOTAL(amount_excl_tax), TOTAL(amount_inc_tax), TOTAL(quantity), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance AFTER INSERT ON transactions
+        BEGIN
+            INSERT INTO daily_product_balance
+            VALUES (IFNULL(NEW.transaction_date, ''), IFNULL(NEW.name, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax, 0), IFNULL(NEW.amount_inc_tax, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (name, transaction_date, category) DO UPDATE SET
+                amount_excl_tax = amount_excl_tax + excluded.amount_excl_tax,
+                amount_inc_tax = amount_inc_tax + excluded.amount_inc_tax,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance AFTER DELETE ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax = amount_excl_tax - IFNULL(OLD.amount_excl_tax, 0),
+                amount_inc_tax = amount_inc_tax - IFNULL(OLD.amount_inc_tax, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE name = IFNULL(OLD.name, '')
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE name = IFNULL(OLD.name, '')
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+        AFTER UPDATE OF transaction_date, name, category, quantity, amount_excl_tax, amount_inc_tax ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax = amount_excl_tax - IFNULL(OLD.amount_excl_tax, 0),
+                amount_inc_tax = amount_inc_tax - IFNULL(OLD.amount_inc_tax, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE name = IFNULL(OLD.name, '')
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE name = IFNULL(OLD.name, '')
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+            INSERT INTO daily_product_balance
+            VALUES (IFNULL(NEW.transaction_date, ''), IFNULL(NEW.name, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax, 0), IFNULL(NEW.amount_inc_tax, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (name, transaction_date, category) DO UPDATE SET
+                amount_excl_tax = amount_excl_tax + excluded.amount_excl_tax,
+                amount_inc_tax = amount_inc_tax + excluded.amount_inc_tax,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+    ),
+    # 5. Manifest of the files already loaded, looked up by content hash or by name, size and modification time
+    (
+        """
+        CREATE TABLE IF NOT EXISTS processed_files (
+            sha256 TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL,
+            processed_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_processed_files_stat ON processed_files (file_name, size, mtime_ns)",
+    ),
+    # 6. Position reached in each file loaded by the tailing mode
+    (
+        """
+        CREATE TABLE IF NOT EXISTS file_checkpoints (
+            file_name TEXT PRIMARY KEY,
+            byte_offset BIGINT NOT NULL,
+            row_count BIGINT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+    ),
+    # 7. Products dimension: the summary and the covering index are keyed on an integer product_id instead of the name,
+    #    the views give the analytical queries the name of the product back through the integer key
+    (
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        "INSERT OR IGNORE INTO products (name) SELECT DISTINCT IFNULL(name, '') FROM transactions ORDER BY 1",
+        "ALTER TABLE transactions ADD COLUMN product_id INTEGER REFERENCES products (product_id)",
+        "DROP TRIGGER IF EXISTS trg_transactions_insert_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_delete_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_update_balance",
+        "DROP INDEX IF EXISTS idx_transactions_name_date",
+        "DROP TABLE IF EXISTS daily_product_balance",
+        """
+        UPDATE transactions
+        SET product_id = (SELECT product_id FROM products WHERE products.name = IFNULL(transactions.name, ''))
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_product_date
+        ON transactions (product_id, transaction_date, category, amount_inc_tax)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_product_balance (
+            product_id INTEGER NOT NULL,
+            transaction_date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount_excl_tax FLOAT NOT NULL,
+            amount_inc_tax FLOAT NOT NULL,
+            quantity BIGINT NOT NULL,
+            transaction_count BIGINT NOT NULL,
+            PRIMARY KEY (product_id, transaction_date, category)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO daily_product_balance
+        SELECT product_id, IFNULL(transaction_date, ''), IFNULL(category, ''),
+               TOTAL(amount_excl_tax), TOTAL(amount_inc_tax), TOTAL(quantity), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3
+        """,
+        # The rows inserted without product_id (i.e. not by bulk_import) get the id of their name
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance AFTER INSERT ON transactions
+        BEGIN
+            INSERT OR IGNORE INTO products (name) SELECT IFNULL(NEW.name, '') WHERE NEW.product_id IS NULL;
+            UPDATE transactions
+            SET product_id = (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))
+            WHERE rowid = NEW.rowid AND NEW.product_id IS NULL;
+            INSERT INTO daily_product_balance
+            VALUES (IFNULL(NEW.product_id, (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))),
+                    IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax, 0), IFNULL(NEW.amount_inc_tax, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+                amount_excl_tax = amount_excl_tax + excluded.amount_excl_tax,
+                amount_inc_tax = amount_inc_tax + excluded.amount_inc_tax,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance AFTER DELETE ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax = amount_excl_tax - IFNULL(OLD.amount_excl_tax, 0),
+                amount_inc_tax = amount_inc_tax - IFNULL(OLD.amount_inc_tax, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+        END
+        """,
+        # product_id is not in the columns of the trigger, so that the update of the key does not fire it again
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+        AFTER UPDATE OF transaction_date, name, category, quantity, amount_excl_tax, amount_inc_tax ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax = amount_excl_tax - IFNULL(OLD.amount_excl_tax, 0),
+                amount_inc_tax = amount_inc_tax - IFNULL(OLD.amount_inc_tax, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+            INSERT OR IGNORE INTO products (name) VALUES (IFNULL(NEW.name, ''));
+            UPDATE transactions
+            SET product_id = (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))
+            WHERE rowid = NEW.rowid;
+            INSERT INTO daily_product_balance
+            VALUES ((SELECT product_id FROM products WHERE name = IFNULL(NEW.name, '')),
+                    IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax, 0), IFNULL(NEW.amount_inc_tax, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+                amount_excl_tax = amount_excl_tax + excluded.amount_excl_tax,
+                amount_inc_tax = amount_inc_tax + excluded.amount_inc_tax,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+        """
+        CREATE VIEW IF NOT EXISTS product_transactions AS
+        SELECT products.name AS name, transactions.transaction_date, transactions.category,
+               transactions.quantity, transactions.amount_excl_tax, transactions.amount_inc_tax
+        FROM transactions JOIN products USING (product_id)
+        """,
+        """
+        CREATE VIEW IF NOT EXISTS daily_balance AS
+        SELECT products.name AS name, daily_product_balance.transaction_date, daily_product_balance.category,
+               daily_product_balance.amount_excl_tax, daily_product_balance.amount_inc_tax,
+               daily_product_balance.quantity, daily_product_balance.transaction_count
+        FROM daily_product_balance JOIN products USING (product_id)
+        """,
+    ),
+    # 8. Amounts stored as integer cents, so that the sums are exact integer sums
+    (
+        "DROP VIEW IF EXISTS product_transactions",
+        "DROP VIEW IF EXISTS daily_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_insert_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_delete_balance",
+        "DROP TRIGGER IF EXISTS trg_transactions_update_balance",
+        "DROP INDEX IF EXISTS idx_transactions_product_date",
+        "DROP TABLE IF EXISTS daily_product_balance",
+        "ALTER TABLE transactions ADD COLUMN amount_excl_tax_cents INTEGER",
+        "ALTER TABLE transactions ADD COLUMN amount_inc_tax_cents INTEGER",
+        """
+        UPDATE transactions SET
+            amount_excl_tax_cents = CAST(ROUND(amount_excl_tax * 100) AS INTEGER),
+            amount_inc_tax_cents = CAST(ROUND(amount_inc_tax * 100) AS INTEGER)
+        """,
+        "ALTER TABLE transactions DROP COLUMN amount_excl_tax",
+        "ALTER TABLE transactions DROP COLUMN amount_inc_tax",
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_product_date
+        ON transactions (product_id, transaction_date, category, amount_inc_tax_cents)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_product_balance (
+            product_id INTEGER NOT NULL,
+            transaction_date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount_excl_tax_cents INTEGER NOT NULL,
+            amount_inc_tax_cents INTEGER NOT NULL,
+            quantity BIGINT NOT NULL,
+            transaction_count BIGINT NOT NULL,
+            PRIMARY KEY (product_id, transaction_date, category)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO daily_product_balance
+        SELECT product_id, IFNULL(transaction_date, ''), IFNULL(category, ''),
+               IFNULL(SUM(amount_excl_tax_cents), 0), IFNULL(SUM(amount_inc_tax_cents), 0), IFNULL(SUM(quantity), 0), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance AFTER INSERT ON transactions
+        BEGIN
+            INSERT OR IGNORE INTO products (name) SELECT IFNULL(NEW.name, '') WHERE NEW.product_id IS NULL;
+            UPDATE transactions
+            SET product_id = (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))
+            WHERE rowid = NEW.rowid AND NEW.product_id IS NULL;
+            INSERT INTO daily_product_balance
+            VALUES (IFNULL(NEW.product_id, (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))),
+                    IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax_cents, 0), IFNULL(NEW.amount_inc_tax_cents, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+                amount_excl_tax_cents = amount_excl_tax_cents + excluded.amount_excl_tax_cents,
+                amount_inc_tax_cents = amount_inc_tax_cents + excluded.amount_inc_tax_cents,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance AFTER DELETE ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax_cents = amount_excl_tax_cents - IFNULL(OLD.amount_excl_tax_cents, 0),
+                amount_inc_tax_cents = amount_inc_tax_cents - IFNULL(OLD.amount_inc_tax_cents, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+        AFTER UPDATE OF transaction_date, name, category, quantity, amount_excl_tax_cents, amount_inc_tax_cents ON transactions
+        BEGIN
+            UPDATE daily_product_balance SET
+                amount_excl_tax_cents = amount_excl_tax_cents - IFNULL(OLD.amount_excl_tax_cents, 0),
+                amount_inc_tax_cents = amount_inc_tax_cents - IFNULL(OLD.amount_inc_tax_cents, 0),
+                quantity = quantity - IFNULL(OLD.quantity, 0),
+                transaction_count = transaction_count - 1
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '');
+            DELETE FROM daily_product_balance
+            WHERE product_id = OLD.product_id
+              AND transaction_date = IFNULL(OLD.transaction_date, '')
+              AND category = IFNULL(OLD.category, '')
+              AND transaction_count = 0;
+            INSERT OR IGNORE INTO products (name) VALUES (IFNULL(NEW.name, ''));
+            UPDATE transactions
+            SET product_id = (SELECT product_id FROM products WHERE name = IFNULL(NEW.name, ''))
+            WHERE rowid = NEW.rowid;
+            INSERT INTO daily_product_balance
+            VALUES ((SELECT product_id FROM products WHERE name = IFNULL(NEW.name, '')),
+                    IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                    IFNULL(NEW.amount_excl_tax_cents, 0), IFNULL(NEW.amount_inc_tax_cents, 0), IFNULL(NEW.quantity, 0), 1)
+            ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+                amount_excl_tax_cents = amount_excl_tax_cents + excluded.amount_excl_tax_cents,
+                amount_inc_tax_cents = amount_inc_tax_cents + excluded.amount_inc_tax_cents,
+                quantity = quantity + excluded.quantity,
+                transaction_count = transaction_count + 1;
+        END
+        """,
+        """
+        CREATE VIEW IF NOT EXISTS product_transactions AS
+        SELECT products.name AS name, transactions.transaction_date, transactions.category,
+               transactions.quantity, transactions.amount_excl_tax_cents, transactions.amount_inc_tax_cents
+        FROM transactions JOIN products USING (product_id)
+        """,
+        """
+        CREATE VIEW IF NOT EXISTS daily_balance AS
+        SELECT products.name AS name, daily_product_balance.transaction_date, daily_product_balance.category,
+               daily_product_balance.amount_excl_tax_cents, daily_product_balance.amount_inc_tax_cents,
+               daily_product_balance.quantity, daily_product_balance.transaction_count
+        FROM daily_product_balance JOIN products USING (product_id)
+        """,
+    ),
+    # 9. Version of the data of each date and product, bumped by bulk_import, to invalidate the cached results
+    (
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version BIGINT NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 10. Ids present several times in a file loaded by the tailing mode, whose later copies are dropped as well
+    (
+        """
+        CREATE TABLE IF NOT EXISTS tail_dropped_ids (
+            file_name TEXT NOT NULL,
+            id TEXT NOT NULL,
+            PRIMARY KEY (file_name, id)
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 11. Size and modification time of each file name of the manifest, so that files with the same content each
+    #     keep their own, processed_files keeping one row by content
+    (
+        """
+        CREATE TABLE IF NOT EXISTS processed_file_stats (
+            file_name TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL REFERENCES processed_files (sha256),
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO processed_file_stats SELECT file_name, sha256, size, mtime_ns FROM processed_files",
+        "DROP INDEX IF EXISTS idx_processed_files_stat",
+    ),
+    # 12. File the rows were loaded from by the tailing mode, whose copies of an id are looked for in the same file only
+    (
+        """
+        CREATE TABLE IF NOT EXISTS source_files (
+            file_id INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL UNIQUE
+        )
+        """,
+        "ALTER TABLE transactions ADD COLUMN source_file_id INTEGER REFERENCES source_files (file_id)",
+    ),
+]
+
+# Compaction of the transactions table, applied on demand by ESretail.drop_name_column (python -m src.retail
+# --drop-name-column) rather than by migrate, since SQL readers outside of ESretail may read transactions.name.
+# The name of the product is then only stored once, in products: the rows keep their integer product_id and the
+# product_transactions view gives the name back. The triggers of the summary are recreated on the product_id.
+DROP_NAME_COLUMN_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS trg_transactions_insert_balance",
+    "DROP TRIGGER IF EXISTS trg_transactions_update_balance",
+    "ALTER TABLE transactions DROP COLUMN name",
+    # The rows are inserted with the product_id of their name, see INSERT_TRANSACTIONS_NO_NAME_QUERY
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO daily_product_balance
+        VALUES (NEW.product_id, IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                IFNULL(NEW.amount_excl_tax_cents, 0), IFNULL(NEW.amount_inc_tax_cents, 0), IFNULL(NEW.quantity, 0), 1)
+        ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+            amount_excl_tax_cents = amount_excl_tax_cents + excluded.amount_excl_tax_cents,
+            amount_inc_tax_cents = amount_inc_tax_cents + excluded.amount_inc_tax_cents,
+            quantity = quantity + excluded.quantity,
+            transaction_count = transaction_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+    AFTER UPDATE OF transaction_date, product_id, category, quantity, amount_excl_tax_cents, amount_inc_tax_cents ON transactions
+    BEGIN
+        UPDATE daily_product_balance SET
+            amount_excl_tax_cents = amount_excl_tax_cents - IFNULL(OLD.amount_excl_tax_cents, 0),
+            amount_inc_tax_cents = amount_inc_tax_cents - IFNULL(OLD.amount_inc_tax_cents, 0),
+            quantity = quantity - IFNULL(OLD.quantity, 0),
+            transaction_count = transaction_count - 1
+        WHERE product_id = OLD.product_id
+          AND transaction_date = IFNULL(OLD.transaction_date, '')
+          AND category = IFNULL(OLD.category, '');
+        DELETE FROM daily_product_balance
+        WHERE product_id = OLD.product_id
+          AND transaction_date = IFNULL(OLD.transaction_date, '')
+          AND category = IFNULL(OLD.category, '')
+          AND transaction_count = 0;
+        INSERT INTO daily_product_balance
+        VALUES (NEW.product_id, IFNULL(NEW.transaction_date, ''), IFNULL(NEW.category, ''),
+                IFNULL(NEW.amount_excl_tax_cents, 0), IFNULL(NEW.amount_inc_tax_cents, 0), IFNULL(NEW.quantity, 0), 1)
+        ON CONFLICT (product_id, transaction_date, category) DO UPDATE SET
+            amount_excl_tax_cents = amount_excl_tax_cents + excluded.amount_excl_tax_cents,
+            amount_inc_tax_cents = amount_inc_tax_cents + excluded.amount_inc_tax_cents,
+            quantity = quantity + excluded.quantity,
+            transaction_count = transaction_count + 1;
+    END
+    """,
+)
+
+# Schema version from which the queries read the daily_product_balance summary and the amounts in cents
+SUMMARY_SCHEMA_VERSION = 8
+
+# Analytical queries, each one is answered from one of the indexes created by MIGRATIONS.
+# The amounts are summed as integer cents and only the result is divided by 100.
+COUNT_BY_DATE_QUERY = "SELECT COUNT(*) FROM transactions WHERE transaction_date = ?"
+
+BALANCE_BY_DATE_TEMPLATE = """
+SELECT transaction_date,
+       SUM(CASE 
+               WHEN category = 'SELL' THEN amount_inc_tax_cents
+               WHEN category = 'BUY' THEN -amount_inc_tax_cents
+               ELSE 0
+           END) / 100.0 AS balance
+FROM {table}
+WHERE name = ?
+GROUP BY transaction_date
+ORDER BY transaction_date;
+"""
+
+# Balance of the dates in [start, end] and its running total, shifted by the balance in cents before start (last parameter)
+CUMULATED_BALANCE_TEMPLATE = """
+WITH daily AS (
+    SELECT transaction_date,
+           SUM(CASE 
+                   WHEN category = 'SELL' THEN amount_inc_tax_cents
+                   WHEN category = 'BUY' THEN -amount_inc_tax_cents
+                   ELSE 0
+               END) AS balance
+    FROM {table}
+    WHERE name = ? AND transaction_date >= ? AND transaction_date <= ?
+    GROUP BY transaction_date
+)
+SELECT transaction_date,
+       balance / 100.0 AS balance,
+       (? + SUM(balance) OVER (ORDER BY transaction_date)) / 100.0 AS cumulated_balance
+FROM daily
+ORDER BY transaction_date;
+"""
+
+PREFIX_BALANCE_TEMPLATE = """
+SELECT IFNULL(SUM(CASE 
+                      WHEN category = 'SELL' THEN amount_inc_tax_cents
+                      WHEN category = 'BUY' THEN -amount_inc_tax_cents
+                      ELSE 0
+                  END), 0)
+FROM {table}
+WHERE name = ? AND transaction_date < ?
+"""
+
+# Balance by product and date of a list of products (a JSON array bound to {filter}) or of all products
+BALANCE_BY_PRODUCT_DATE_TEMPLATE = """
+SELECT name,
+       transaction_date,
+       SUM(CASE 
+               WHEN category = 'SELL' THEN amount_inc_tax_cents
+               WHEN category = 'BUY' THEN -amount_inc_tax_cents
+               ELSE 0
+           END) / 100.0 AS balance
+FROM {table}
+{filter}
+GROUP BY name, transaction_date
+ORDER BY name, transaction_date;
+"""
+
+PRODUCT_FILTER = "WHERE name IN (SELECT value FROM json_each(?))"
+
+# The balance questions answered from the daily_product_balance summary, in O(days) instead of O(rows). The daily_balance
+# view joins the products dimension on its integer key: the name is looked up once in products, then the rows of the
+# product_id are read from the primary key of the summary
+SUM_TOTAL_SUMMARY_QUERY = "SELECT SUM(amount_inc_tax_cents) / 100.0 FROM daily_product_balance"
+
+BALANCE_BY_DATE_SUMMARY_QUERY = BALANCE_BY_DATE_TEMPLATE.format(table="daily_balance")
+
+# Transactions of a database not migrated yet, with the amounts of the float columns converted to cents
+LEGACY_TRANSACTIONS = """(
+    SELECT name, transaction_date, category, CAST(ROUND(amount_inc_tax * 100) AS INTEGER) AS amount_inc_tax_cents
+    FROM transactions
+)"""
+
+# PRAGMAs applied to the connection for each profile of ESretail.
+# WAL lets the readers and the loader work at the same time, synchronous=NORMAL only syncs at checkpoints in WAL mode,
+# cache_size is in KiB when negative and mmap_size in bytes.
+# The journal mode is stored in the database file: once an 'ingest' or 'analytics' connection has opened retail.db,
+# it stays in WAL mode for every later connection, 'default' ones included, until journal_mode=DELETE is set again.
+PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "ingest": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65_536,
+        "temp_store": "MEMORY",
+        "mmap_size": 268_435_456,
+    },
+    "analytics": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262_144,
+        "temp_store": "MEMORY",
+        "mmap_size": 1_073_741_824,
+    },
+    "readonly": {
+        "cache_size": -262_144,
+        "temp_store": "MEMORY",
+        "mmap_size": 1_073_741_824,
+        "query_only": "ON",
+    },
+}
+
+# Number of rows bound by each executemany call of bulk_import
+DEFAULT_BATCH_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class CommitPolicy:
+    """
+    Decides when bulk_import commits.
+
+    With the default values a single commit is made once the whole DataFrame is inserted, so that a
+    failure rolls back the whole file. Setting every_rows and/or every_seconds commits periodically
+    instead: a failure then only rolls back the rows inserted since the last commit.
+
+    Attributes:
+        every_rows (int | None): Commit once at least this number of rows has been inserted since the last commit.
+        every_seconds (float | None): Commit once this number of seconds has elapsed since the last commit.
+    """
+    every_rows: int | None = None
+    every_seconds: float | None = None
+
+    def is_due(self, rows: int, seconds: float) -> bool:
+        """
+        Tells whether a commit is due.
+
+        Args:
+            rows (int): The number of rows inserted since the last commit.
+            seconds (float): The number of seconds elapsed since the last commit.
+
+        Returns:
+            bool: True if the pending rows should be committed now.
+        """
+        return (
+            (self.every_rows is not None and rows >= self.every_rows)
+            or (self.every_seconds is not None and seconds >= self.every_seconds)
+        )
+
+
+# Insertion of the rows of bulk_import, bound as tuples of INSERT_COLUMNS. The product_id of a row is looked up
+# by its name (?3), the new products of a batch being inserted beforehand, a missing name being the product ''.
+# The last parameter (?8) is the source file of the rows loaded by the tailing mode, NULL otherwise
+INSERT_COLUMNS = ['id', 'category', 'name', 'quantity', 'amount_excl_tax_cents', 'amount_inc_tax_cents', 'transaction_date']
+INSERT_TRANSACTIONS_QUERY = """
+INSERT INTO transactions (id, category, name, product_id, quantity, amount_excl_tax_cents, amount_inc_tax_cents, transaction_date,
+                          source_file_id)
+VALUES (?1, ?2, ?3, (SELECT product_id FROM products WHERE name = IFNULL(?3, '')), ?4, ?5, ?6, ?7, ?8)
+ON CONFLICT (id) DO NOTHING
+"""
+# Same insertion once the name column is dropped, see DROP_NAME_COLUMN_STATEMENTS
+INSERT_TRANSACTIONS_NO_NAME_QUERY = """
+INSERT INTO transactions (id, category, product_id, quantity, amount_excl_tax_cents, amount_inc_tax_cents, transaction_date,
+                          source_file_id)
+VALUES (?1, ?2, (SELECT product_id FROM products WHERE name = IFNULL(?3, '')), ?4, ?5, ?6, ?7, ?8)
+ON CONFLICT (id) DO NOTHING
+"""
+INSERT_SOURCE_FILE_QUERY = "INSERT OR IGNORE INTO source_files (file_name) VALUES (?)"
+SOURCE_FILE_ID = "(SELECT file_id FROM source_files WHERE file_name = ?)"
+INSERT_PRODUCTS_QUERY = "INSERT OR IGNORE INTO products (name) VALUES (IFNULL(?, ''))"
+
+SAVE_CHECKPOINT_QUERY = """
+INSERT INTO file_checkpoints (file_name, byte_offset, row_count, updated_at)
+VALUES (?, ?, ?, datetime('now'))
+ON CONFLICT (file_name) DO UPDATE SET
+    byte_offset = excluded.byte_offset, row_count = excluded.row_count, updated_at = excluded.updated_at
+"""
+
+# Ids of a JSON array (first parameter) already loaded from a file (second parameter) or dropped from it
+EARLIER_COPIES_QUERY = """
+SELECT id FROM transactions
+WHERE id IN (SELECT value FROM json_each(?1)) AND source_file_id = (SELECT file_id FROM source_files WHERE file_name = ?2)
+UNION
+SELECT id FROM tail_dropped_ids WHERE file_name = ?2 AND id IN (SELECT value FROM json_each(?1))
+"""
+
+# Scopes of the data versions: all the data, the transactions of a date and the transactions of a product
+ALL_SCOPE = "*"
+BUMP_VERSION_QUERY = """
+INSERT INTO data_versions (scope, version) VALUES (?, 1)
+ON CONFLICT (scope) DO UPDATE SET version = version + 1
+"""
+
+
+def date_scope(transaction_date: str) -> str:
+    """
+    Returns the scope of the transactions of a date.
+
+    Args:
+        transaction_date (str): The date of the transactions, e.g. 2022-01-15.
+
+    Returns:
+        str: The scope, such as date:2022-01-15.
+    """
+    return f"date:{transaction_date}"
+
+
+def product_scope(product_name: str) -> str:
+    """
+    Returns the scope of the transactions of a product.
+
+    Args:
+        product_name (str): The name of the product.
+
+    Returns:
+        str: The scope, such as product:Fitbit Charge.
+    """
+    return f"product:{product_name}"
+
+
+def product_list_scopes(arguments: dict) -> list[str]:
+    """
+    Returns the scopes of a query on a list of products.
+
+    Args:
+        arguments (dict): The arguments of the query, with its product_names.
+
+    Returns:
+        list[str]: The scope of each product, or ALL_SCOPE when product_names is None.
+    """
+    if arguments['product_names'] is None:
+        return [ALL_SCOPE]
+    return [product_scope(product_name) for product_name in arguments['product_names']]
+
+
+class QueryCache:
+    """
+    LRU cache of the results of the ESretail query methods, with a size and a time-to-live limit.
+
+    Each result is stored with the versions of the data it was computed from (the scopes of the query and
+    their version in the data_versions table). It is invalidated when one of these versions changes,
+    i.e. when bulk_import inserted transactions of the same date or product.
+
+    Attributes:
+        max_entries (int): The maximum number of results kept, the least recently used is evicted first.
+        ttl_seconds (float | None): The number of seconds a result is kept, None to keep it until it is invalidated.
+        hits (int): The number of results returned from the cache.
+        misses (int): The number of results computed, including the expired and invalidated ones.
+        evictions (int): The number of results evicted to respect max_entries.
+        expirations (int): The number of results dropped after ttl_seconds.
+        invalidations (int): The number of results dropped because their data changed.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float | None = 300.0) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_entries (int): The maximum number of results kept. Default is 256.
+            ttl_seconds (float | None): The number of seconds a result is kept. Default is 300.
+
+        Returns:
+            None
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple, versions: tuple) -> tuple[bool, object]:
+        """
+        Looks up a result.
+
+        Args:
+            key (tuple): The method and its parameters.
+            versions (tuple): The current version of each scope of the query.
+
+        Returns:
+            tuple: A tuple containing:
+                - (bool) found: True if a valid result is cached.
+                - (object) value: The cached result, None if not found.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at, stored_versions = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self.expirations += 1
+                del self._entries[key]
+            elif stored_versions != versions:
+                self.invalidations += 1
+                del self._entries[key]
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return True, value
+        self.misses += 1
+        return False, None
+
+    def put(self, key: tuple, value: object, versions: tuple) -> None:
+        """
+        Stores a result, evicting the least recently used ones beyond max_entries.
+
+        Args:
+            key (tuple): The method and its parameters.
+            value (object): The result.
+            versions (tuple): The version of each scope of the query the result was computed from.
+
+        Returns:
+            None
+        """
+        self._entries[key] = (value, time.monotonic(), versions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops all the results, e.g. after writing to the database without bulk_import.
+
+        Returns:
+            None
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the counters of the cache, for monitoring.
+
+        Returns:
+            dict[str, int]: The number of entries, hits, misses, evictions, expirations and invalidations.
+        """
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+def cached_query(scopes):
+    """
+    Caches the results of an ESretail query method in the QueryCache of the instance, if it has one.
+
+    Args:
+        scopes: A function of the arguments of the method (a dict by parameter name, defaults applied)
+            returning the scopes of the data the result depends on.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(list(bound.arguments.items())[1:])
+            key = (method.__name__, *(tuple(value) if isinstance(value, list) else value for value in arguments.values()))
+            versions = self.data_versions(scopes(arguments))
+
+            found, value = self.cache.get(key, versions)
+            if not found:
+                value = method(self, *args, **kwargs)
+                # The errors (None) are not cached
+                if value is None:
+                    return None
+                self.cache.put(key, value, versions)
+            # The caller may modify the DataFrame, not the cached one
+            return value.copy() if is_dataframe(value) else value
+        return wrapper
+    return decorator
+
+
+def is_dataframe(value: object) -> bool:
+    """
+    Tells whether a value is a pandas DataFrame, without importing pandas.
+
+    Args:
+        value (object): The value.
+
+    Returns:
+        bool: True if the value is a DataFrame.
+    """
+    # A DataFrame can only exist once pandas has been imported
+    pandas = sys.modules.get('pandas')
+    return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+def to_cents(amounts: pd.Series) -> pd.Series:
+    """
+    Converts amounts in currency units to integer cents, rounded to the nearest cent.
+
+    Args:
+        amounts (pd.Series): The amounts, as floats.
+
+    Returns:
+        pd.Series: The amounts in cents (nullable int64), a missing amount staying missing.
+    """
+    return (amounts.astype('float64') * 100).round().astype('Int64')
+
 
 class ESretail:
-    def __init__(self, db_filename: str = 'retail.db') -> None:
+    def __init__(self, db_filename: str = 'retail.db', profile: str = 'default', check_same_thread: bool = True,
+                 cache: QueryCache | None = None) -> None:
         """
         Initializes the ESretail class and establishes a connection to the SQLite database.
 
         Args:
             db_filename (str): The name of the SQLite database file. Default is 'retail.db'.
+            profile (str): The name of the connection profile in PROFILES. Default is 'default'.
+            check_same_thread (bool): If False, the connection may be used by other threads than the one creating it,
+                one thread at a time.
+            cache (QueryCache | None): If set, the results of the query methods are cached in it. The writes other than
+                bulk_import, e.g. a DELETE run by hand, are not seen by the cache, clear it after them.
 
         Returns: 
             None
 
         Raises:
             sqlite3.Error: If there is an error connecting to the SQLite database.
+            ValueError: If the profile is unknown.
         """
         # Path to the SQLite database at the project root
         self.db_path = os.path.join(os.path.dirname(__file__), '..', db_filename)
+        self.cache = cache
+        # Versions of the scopes, reloaded when PRAGMA data_version tells that the database changed
+        self._versions = {}
+        self._data_version = None
 
         try:
             # Connect to the SQLite database
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
             self.cursor = self.conn.cursor()
+            self.use_profile(profile)
             logging.info(f"Successfully connected to the database {self.db_path}.")
         except sqlite3.Error as e:
             logging.error(f"Error connecting to the database: {e}")
             raise
 
-        
+    def use_profile(self, profile: str) -> None:
+        """
+        Applies the PRAGMAs of a connection profile to the connection.
+
+        Args:
+            profile (str): The name of the connection profile in PROFILES.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the profile is unknown.
+            sqlite3.Error: If a PRAGMA cannot be applied.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile}, expected one of {list(PROFILES)}.")
+        # query_only is reset first so that a connection can leave the readonly profile
+        self.conn.execute("PRAGMA query_only = OFF")
+        for pragma, value in PROFILES[profile].items():
+            self.conn.execute(f"PRAGMA {pragma} = {value}")
+        self.profile = profile
+
+    def migrate(self) -> int:
+        """
+        Applies the schema migrations that have not been applied to the database yet.
+
+        Returns:
+            int: The schema version of the database, i.e. the number of migrations applied.
 
-    def bulk_import(self, df: pd.DataFrame, batch_size: int = 20) -> None:
+        Raises:
+            sqlite3.Error: If a migration fails, the database is then left at its previous version.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return version
+
+        # sqlite3 opens no transaction before a CREATE or an ALTER statement, the migrations are run in an explicit
+        # one so that they are applied all at once or not at all. It takes the write lock at once, the version is
+        # read again in case another connection migrated the database meanwhile.
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for statements in MIGRATIONS[version:]:
+                for statement in statements:
+                    self.conn.execute(statement)
+            self.conn.execute(f"PRAGMA user_version = {max(version, len(MIGRATIONS))}")
+        if version >= len(MIGRATIONS):
+            return version
+        logging.info(f"Database {self.db_path} migrated from version {version} to {len(MIGRATIONS)}.")
+        return len(MIGRATIONS)
+
+    def has_table(self, table: str) -> bool:
+        """
+        Tells whether the database has a table.
+
+        Args:
+            table (str): The name of the table.
+
+        Returns:
+            bool: True if the table exists.
+        """
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.conn.execute(query, (table,)).fetchone() is not None
+
+    def has_name_column(self) -> bool:
+        """
+        Tells whether the transactions table still stores the name of the product of each row,
+        see drop_name_column.
+
+        Returns:
+            bool: True if the transactions table has the name column.
+        """
+        return any(row[1] == 'name' for row in self.conn.execute("PRAGMA table_info(transactions)"))
+
+    def drop_name_column(self) -> bool:
+        """
+        Drops the name column of the transactions table, whose rows keep the product_id of the products dimension,
+        and rebuilds the database file to give the freed pages back.
+
+        This compaction is not applied by migrate: SQL readers outside of ESretail may read transactions.name, they
+        should read the product_transactions view instead before it is run, e.g. with python -m src.retail
+        --drop-name-column.
+
+        Returns:
+            bool: True if the column was dropped, False if it had already been.
+
+        Raises:
+            sqlite3.Error: If a statement fails, the column is then kept.
+        """
+        self.migrate()
+        if not self.has_name_column():
+            return False
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for statement in DROP_NAME_COLUMN_STATEMENTS:
+                self.conn.execute(statement)
+        self.conn.execute("VACUUM")
+        logging.info(f"The name column of the transactions of {self.db_path} has been dropped.")
+        return True
+
+    def has_daily_summary(self) -> bool:
+        """
+        Tells whether the database has the daily_product_balance summary keyed on the products dimension
+        and the amounts in cents.
+
+        Returns:
+            bool: True if the database is at least at SUMMARY_SCHEMA_VERSION.
+        """
+        return self.conn.execute("PRAGMA user_version").fetchone()[0] >= SUMMARY_SCHEMA_VERSION
+
+    def data_versions(self, scopes: list[str]) -> tuple:
+        """
+        Returns the current version of some scopes of the data.
+
+        The versions are read again from the data_versions table only when the database changed since
+        the previous call, which PRAGMA data_version tells for the commits of the other connections.
+
+        Args:
+            scopes (list[str]): The scopes, see ALL_SCOPE, date_scope and product_scope.
+
+        Returns:
+            tuple: The pairs (scope, version) of the scopes, the version of a scope never bumped being 0.
+        """
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            if self.has_table('data_versions'):
+                self._versions = dict(self.conn.execute("SELECT scope, version FROM data_versions"))
+            self._data_version = data_version
+        return tuple((scope, self._versions.get(scope, 0)) for scope in scopes)
+
+    def explain_query_plan(self, query: str, params: tuple = ()) -> list[str]:
+        """
+        Returns the plan chosen by SQLite for a query.
+
+        Args:
+            query (str): The SQL query.
+            params (tuple): The parameters of the query.
+
+        Returns:
+            list[str]: The detail of each step of the plan, e.g. 'SEARCH transactions USING COVERING INDEX ...'.
+        """
+        return [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+    def bulk_import(self, df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE, commit_policy: CommitPolicy | None = None,
+                    file_checkpoint: tuple[str, int, int] | None = None) -> int:
         """
         Inserts data into the SQLite database in batches.
 
+        The rows are bound as tuples built batch by batch from the columns of the DataFrame,
+        without creating a dict per row.
+
         Args:
-            df (pd.DataFrame): DataFrame containing the columns id, transaction_date, name, quantity, amount_excl_tax, amount_inc_tax.
-            batch_size (int): The size of the batch for insertions. Default is 20.
+            df (pd.DataFrame): DataFrame containing the columns id, transaction_date, name, quantity and the amounts,
+                either in cents (amount_excl_tax_cents, amount_inc_tax_cents) or in currency units (amount_excl_tax,
+                amount_inc_tax). The name and category columns may be categorical.
+            batch_size (int): The number of rows inserted by each executemany call. Default is DEFAULT_BATCH_SIZE.
+            commit_policy (CommitPolicy | None): When to commit. Default is a single commit for the whole DataFrame.
+            file_checkpoint (tuple[str, int, int] | None): The file name, byte offset and row count of the position
+                reached in the file of the rows (see save_file_checkpoint), stored with the last commit of the rows.
+                The rows are then recorded as loaded from the file, see find_earlier_copies.
 
         Returns:
-            None
+            int: The number of new transactions, the ids already stored being skipped.
 
         Raises:
-            ValueError: If the 'transaction_date' field is missing or None.
-            sqlite3.Error: If there is an error during the insertion process.
+            ValueError: If the 'transaction_date' field is missing or None. Nothing is inserted in this case.
+            KeyError: If another column is missing. Nothing is inserted in this case.
+            sqlite3.Error: If there is an error during the insertion process. The rows inserted since the last commit are rolled back.
         """
         # Log the process
         logging.info("Starting bulk import process")
+        # The unique index on id lets SQLite skip the transactions already stored
+        self.migrate()
+        commit_policy = commit_policy or CommitPolicy()
 
-        list_dict = df.to_dict(orient="records")
-        sql_query = """
-        INSERT OR IGNORE INTO transactions (id, category, name, quantity, amount_excl_tax, amount_inc_tax, transaction_date)
-        VALUES (:id, :category, :name, :quantity, :amount_excl_tax, :amount_inc_tax, :transaction_date)
-        """
+        # Ensure all items have a valid transaction_date before inserting anything
+        if 'transaction_date' not in df.columns or df['transaction_date'].isna().any():
+            raise ValueError("Transaction date is missing or None.")
+
+        if 'amount_inc_tax_cents' not in df.columns:
+            df = df.assign(amount_excl_tax_cents=to_cents(df['amount_excl_tax']),
+                           amount_inc_tax_cents=to_cents(df['amount_inc_tax']))
+        # The rows are bound as tuples of the columns in the order of INSERT_TRANSACTIONS_QUERY
+        columns = [df[column] for column in INSERT_COLUMNS]
+        name_index = INSERT_COLUMNS.index('name')
+        date_index = INSERT_COLUMNS.index('transaction_date')
+        insert_query = INSERT_TRANSACTIONS_QUERY if self.has_name_column() else INSERT_TRANSACTIONS_NO_NAME_QUERY
         with self.conn:
             try:
-                self.cursor.execute("SELECT id FROM transactions")
-                existing_ids = set(row[0] for row in self.cursor.fetchall())  # Extract all existing IDs
-                filtered_metadata = [item for item in list_dict if item['id'] not in existing_ids]
-
-                for i in range(0, len(filtered_metadata), batch_size):
-                    batch_dict = filtered_metadata[i:i + batch_size]  # Extract a batch
-
-                    # Ensure all items have a valid transaction_date
-                    for record in batch_dict:
-                        if 'transaction_date' not in record or record.get('transaction_date') is None:
-                            raise ValueError("Transaction date is missing or None.")
+                source_file_id = None
+                if file_checkpoint is not None:
+                    self.cursor.execute(INSERT_SOURCE_FILE_QUERY, (file_checkpoint[0],))
+                    source_file_id = self.conn.execute(f"SELECT {SOURCE_FILE_ID}", (file_checkpoint[0],)).fetchone()[0]
+                inserted = 0
+                pending_rows = 0
+                last_commit = time.monotonic()
+                for i in range(0, len(df), batch_size):
+                    # The values of a batch as Python objects, a missing value (NaN, pd.NA) being None, i.e. NULL
+                    batch = [column.iloc[i:i + batch_size].to_numpy(dtype=object, na_value=None) for column in columns]
 
                     # Batch insertions
-                    self.cursor.executemany(sql_query, batch_dict)
-                    self.conn.commit()  # Commit transaction for each batch                
+                    # Each product of the batch once, the batch repeating the same names many times
+                    try:
+                        names = dict.fromkeys(batch[name_index])
+                    except TypeError:
+                        # A value that SQLite cannot bind either, the insertion raises sqlite3.Error
+                        names = batch[name_index]
+                    self.cursor.executemany(INSERT_PRODUCTS_QUERY, ((name,) for name in names))
+                    self.cursor.executemany(insert_query, zip(*batch, itertools.repeat(source_file_id)))
+                    batch_inserted = self.cursor.rowcount
+                    inserted += batch_inserted
+                    if batch_inserted > 0:
+                        # The cached results of these dates and products are invalidated with the commit of the rows
+                        scopes = {ALL_SCOPE}
+                        scopes.update(date_scope(transaction_date) for transaction_date in set(batch[date_index]))
+                        scopes.update(product_scope('' if name is None else name) for name in set(batch[name_index]))
+                        self.cursor.executemany(BUMP_VERSION_QUERY, [(scope,) for scope in scopes])
+                        # PRAGMA data_version does not change with the commits of this connection
+                        self._data_version = None
+                    pending_rows += len(batch[0])
 
-                logging.info("Bulk import completed successfully.")
+                    if commit_policy.is_due(pending_rows, time.monotonic() - last_commit):
+                        self.conn.commit()
+                        pending_rows = 0
+                        last_commit = time.monotonic()
+
+                if file_checkpoint is not None:
+                    self.cursor.execute(SAVE_CHECKPOINT_QUERY, file_checkpoint)
+                logging.info(f"Bulk import completed successfully, {inserted} new transaction(s).")
+                return inserted
             except sqlite3.Error as e:
                 # Log the error in case of failure
                 logging.error(f"An error occurred during bulk import: {e}")
-                self.conn.rollback()  # Rollback changes if error
+                self.conn.rollback()  # Rollback the changes since the last commit
                 raise
 
+    def is_file_processed(self, sha256: str | None = None, file_name: str | None = None, size: int | None = None,
+                          mtime_ns: int | None = None) -> bool:
+        """
+        Tells whether a file is in the manifest of the processed files, either by its content hash
+        or, without having to hash it, by its name, size and modification time.
+
+        Args:
+            sha256 (str | None): The SHA-256 of the content of the file.
+            file_name (str | None): The name of the file.
+            size (int | None): The size of the file in bytes.
+            mtime_ns (int | None): The modification time of the file in nanoseconds.
+
+        Returns:
+            bool: True if the file has already been processed.
+        """
+        if sha256 is not None:
+            table = 'processed_files'
+            query = "SELECT 1 FROM processed_files WHERE sha256 = ?"
+            params = (sha256,)
+        else:
+            table = 'processed_file_stats'
+            query = "SELECT 1 FROM processed_file_stats WHERE file_name = ? AND size = ? AND mtime_ns = ?"
+            params = (file_name, size, mtime_ns)
+        if not self.has_table(table):
+            return False
+        return self.conn.execute(query, params).fetchone() is not None
+
+    def record_processed_file(self, sha256: str, file_name: str, size: int, mtime_ns: int) -> None:
+        """
+        Adds a file to the manifest of the processed files, or updates the size and modification time
+        stored for its name. A content already in the manifest keeps the name it was first processed under.
+
+        Args:
+            sha256 (str): The SHA-256 of the content of the file.
+            file_name (str): The name of the file.
+            size (int): The size of the file in bytes.
+            mtime_ns (int): The modification time of the file in nanoseconds.
+
+        Returns:
+            None
+        """
+        self.migrate()
+        query = """
+        INSERT INTO processed_files (sha256, file_name, size, mtime_ns, processed_at)
+        VALUES (?, ?, ?, ?, datetime('now'))
+        ON CONFLICT (sha256) DO NOTHING
+        """
+        stats_query = """
+        INSERT INTO processed_file_stats (file_name, sha256, size, mtime_ns) VALUES (?, ?, ?, ?)
+        ON CONFLICT (file_name) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size, mtime_ns = excluded.mtime_ns
+        """
+        with self.conn:
+            self.conn.execute(query, (sha256, file_name, size, mtime_ns))
+            self.conn.execute(stats_query, (file_name, sha256, size, mtime_ns))
+
+    def get_file_checkpoint(self, file_name: str) -> tuple[int, int]:
+        """
+        Returns the position reached in a file by the tailing mode.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            tuple: A tuple containing:
+                - (int) byte_offset: The offset of the first byte not loaded yet, 0 if the file was never loaded.
+                - (int) row_count: The number of rows loaded from the file.
+        """
+        if not self.has_table('file_checkpoints'):
+            return 0, 0
+        query = "SELECT byte_offset, row_count FROM file_checkpoints WHERE file_name = ?"
+        row = self.conn.execute(query, (file_name,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def save_file_checkpoint(self, file_name: str, byte_offset: int, row_count: int) -> None:
+        """
+        Stores the position reached in a file by the tailing mode.
+
+        Args:
+            file_name (str): The name of the file.
+            byte_offset (int): The offset of the first byte not loaded yet.
+            row_count (int): The number of rows loaded from the file.
+
+        Returns:
+            None
+        """
+        self.migrate()
+        with self.conn:
+            self.conn.execute(SAVE_CHECKPOINT_QUERY, (file_name, byte_offset, row_count))
+
+    def find_earlier_copies(self, file_name: str, ids: list[str]) -> set[str]:
+        """
+        Returns the ids already met in a file by the tailing mode: loaded from the file,
+        or dropped from it as present several times in it. The rows loaded from other files are not copies.
+
+        Args:
+            file_name (str): The name of the file.
+            ids (list[str]): The ids to look up.
+
+        Returns:
+            set[str]: The ids of ids already met in the file.
+        """
+        self.migrate()
+        rows = self.conn.execute(EARLIER_COPIES_QUERY, (json.dumps(ids), file_name))
+        return {row[0] for row in rows}
+
+    def drop_copies(self, file_name: str, transaction_date: str, ids: list[str]) -> int:
+        """
+        Deletes the transactions with these ids loaded from the file by the tailing mode, and records the ids
+        as dropped from the file, so that their later copies are dropped as well.
+
+        Args:
+            file_name (str): The name of the file.
+            transaction_date (str): The date of the transactions of the file in the format 'YYYY-MM-DD', whose
+                cached results are invalidated.
+            ids (list[str]): The ids present several times in the file.
+
+        Returns:
+            int: The number of transactions deleted.
+        """
+        self.migrate()
+        params = (json.dumps(ids), file_name)
+        where = f"WHERE id IN (SELECT value FROM json_each(?)) AND source_file_id = {SOURCE_FILE_ID}"
+        with self.conn:
+            product_names = [row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT products.name FROM transactions JOIN products USING (product_id) {where}", params)]
+            deleted = self.conn.execute(f"DELETE FROM transactions {where}", params).rowcount
+            self.conn.executemany("INSERT OR IGNORE INTO tail_dropped_ids (file_name, id) VALUES (?, ?)",
+                                  [(file_name, id) for id in ids])
+            if deleted:
+                scopes = [ALL_SCOPE, date_scope(transaction_date)] + [product_scope(name) for name in product_names]
+                self.conn.executemany(BUMP_VERSION_QUERY, [(scope,) for scope in scopes])
+                self._data_version = None
+        return deleted
+
+    def forget_dropped_ids(self, file_name: str) -> None:
+        """
+        Forgets the ids dropped from a file, which the tailing mode reads again from its beginning.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            None
+        """
+        self.migrate()
+        with self.conn:
+            self.conn.execute("DELETE FROM tail_dropped_ids WHERE file_name = ?", (file_name,))
+
+    @cached_query(lambda arguments: [date_scope(arguments['transaction_date'])])
     def count_transactions_by_date(self, transaction_date:str):
         """
         Counts the number of rows with a specific transaction_date.
@@ -90,7 +1341,7 @@ class ESretail:
         :param transaction_date: The date to search for in the format 'YYYY-MM-DD'.
         :return: The count of matching rows.
         """
-        query = "SELECT COUNT(*) FROM transactions WHERE transaction_date = ?"
+        query = COUNT_BY_DATE_QUERY
         
         try:
             with self.conn:
@@ -102,6 +1353,7 @@ class ESretail:
         except sqlite3.Error as e:
             logging.error(f"Error executing query: {e}")
             return None
+    @cached_query(lambda arguments: [ALL_SCOPE])
     def count_total_id(self):
         """
         Counts the number of rows.
@@ -121,13 +1373,18 @@ class ESretail:
             logging.error(f"Error executing query: {e}")
             return None
     
+    @cached_query(lambda arguments: [ALL_SCOPE])
     def sum_total_transaction(self):
         """
         Returns the sum of the values amount_inc_tax column.
+        Reads the daily_product_balance summary when the database has it.
         
         :return: The sum of the values in the column, or None if an error occurs.
         """
-        query = f"SELECT SUM(amount_inc_tax) FROM transactions"
+        if self.has_daily_summary():
+            query = SUM_TOTAL_SUMMARY_QUERY
+        else:
+            query = f"SELECT SUM(amount_inc_tax_cents) / 100.0 FROM {LEGACY_TRANSACTIONS}"
         
         try:
             with self.conn:
@@ -141,25 +1398,21 @@ class ESretail:
             logging.error(f"Error executing query: {e}")
             return None
     
+    @cached_query(lambda arguments: [product_scope(arguments['product_name'])])
     def get_balance_by_date_sql(self, product_name:str="Amazon Echo Dot"):
         """
         Calculates the balance (SELL - BUY) by date for a specific product using SQL query.
+        Reads the daily_product_balance summary when the database has it.
         
         :param product_name: The name of the product to filter on, default is "Amazon Echo Dot".
         :return: A DataFrame with the balance (SELL - BUY) by date.
         """
-        query = """
-        SELECT transaction_date,
-               SUM(CASE 
-                       WHEN category = 'SELL' THEN amount_inc_tax
-                       WHEN category = 'BUY' THEN -amount_inc_tax
-                       ELSE 0
-                   END) AS balance
-        FROM transactions
-        WHERE name = ?
-        GROUP BY transaction_date
-        ORDER BY transaction_date;
-        """
+        import pandas as pd
+
+        if self.has_daily_summary():
+            query = BALANCE_BY_DATE_SUMMARY_QUERY
+        else:
+            query = BALANCE_BY_DATE_TEMPLATE.format(table=LEGACY_TRANSACTIONS)
         
         try:
             with self.conn:
@@ -171,40 +1424,108 @@ class ESretail:
             logging.error(f"Error executing query: {e}")
             return None
     
-    def get_cumulated_balance_by_date(self, product_name="Amazon Echo Dot"):
+    @cached_query(lambda arguments: [product_scope(arguments['product_name'])])
+    def get_cumulated_balance_by_date(self, product_name="Amazon Echo Dot", start_date: str | None = None, end_date: str | None = None):
         """
         Calculates the cumulated balance (SELL - BUY) by date for a specific product.
+        Reads the daily_product_balance summary when the database has it.
+
+        The running total is computed by a SQL window function over the requested dates only,
+        the balance of the dates before start_date is added to it by a single aggregate.
         
         :param product_name: The name of the product to filter on, default is "Amazon Echo Dot".
+        :param start_date: The first date returned in the format 'YYYY-MM-DD', default is the first date of the history.
+        :param end_date: The last date returned in the format 'YYYY-MM-DD', default is the last date of the history.
         :return: A DataFrame with the cumulated balance by date.
         """
-        query = """
-        SELECT transaction_date,
-               SUM(CASE 
-                       WHEN category = 'SELL' THEN amount_inc_tax
-                       WHEN category = 'BUY' THEN -amount_inc_tax
-                       ELSE 0
-                   END) AS balance
-        FROM transactions
-        WHERE name = ?
-        GROUP BY transaction_date
-        ORDER BY transaction_date;
-        """
+        import pandas as pd
+
+        table = "daily_balance" if self.has_daily_summary() else LEGACY_TRANSACTIONS
         
         try:
             with self.conn:
-                # Execute the SQL query and load the result into a pandas DataFrame
-                balance_by_date = pd.read_sql_query(query, self.conn, params=(product_name,))
+                prefix_balance = 0
+                if start_date is not None:
+                    self.cursor.execute(PREFIX_BALANCE_TEMPLATE.format(table=table), (product_name, start_date))
+                    prefix_balance = self.cursor.fetchone()[0]
+
+                params = (product_name, start_date or "", end_date or "9999-12-31", prefix_balance)
+                balance_by_date = pd.read_sql_query(CUMULATED_BALANCE_TEMPLATE.format(table=table), self.conn, params=params)
                 
                 if balance_by_date.empty:
                     logging.info(f"No data found for product: {product_name}")
                     return None
 
-                # Calculate the cumulated balance using pandas cumsum
-                balance_by_date['cumulated_balance'] = balance_by_date['balance'].cumsum()
-
                 logging.info(f"Cumulated balance by date calculated for {product_name}.")
                 return balance_by_date
         except sqlite3.Error as e:
             logging.error(f"Error executing query: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @cached_query(product_list_scopes)
+    def get_balance_by_date_batch(self, product_names: list[str] | None = None, pivot: bool = False):
+        """
+        Calculates the balance (SELL - BUY) by date of several products with a single grouped query.
+        Reads the daily_product_balance summary when the database has it.
+
+        :param product_names: The names of the products, default is all the products.
+        :param pivot: If True, returns one column per product indexed by date, the dates without transactions having a balance of 0.
+        :return: A DataFrame with the columns name, transaction_date and balance, or the pivoted DataFrame.
+        """
+        import pandas as pd
+
+        table = "daily_balance" if self.has_daily_summary() else LEGACY_TRANSACTIONS
+        if product_names is None:
+            query = BALANCE_BY_PRODUCT_DATE_TEMPLATE.format(table=table, filter="")
+            params = ()
+        else:
+            query = BALANCE_BY_PRODUCT_DATE_TEMPLATE.format(table=table, filter=PRODUCT_FILTER)
+            params = (json.dumps(list(product_names)),)
+
+        try:
+            with self.conn:
+                balance_by_date = pd.read_sql_query(query, self.conn, params=params)
+                logging.info(f"Balance by date calculated for {balance_by_date['name'].nunique()} product(s) using SQL.")
+        except sqlite3.Error as e:
+            logging.error(f"Error executing query: {e}")
+            return None
+
+        if pivot:
+            return balance_by_date.pivot(index='transaction_date', columns='name', values='balance').fillna(0)
+        return balance_by_date
+
+    @cached_query(product_list_scopes)
+    def get_cumulated_balance_by_date_batch(self, product_names: list[str] | None = None, pivot: bool = False):
+        """
+        Calculates the cumulated balance (SELL - BUY) by date of several products with a single grouped query,
+        the running totals being computed by a groupby on the product.
+
+        :param product_names: The names of the products, default is all the products.
+        :param pivot: If True, returns one column per product indexed by date, a date without transactions keeping the previous cumulated balance.
+        :return: A DataFrame with the columns name, transaction_date, balance and cumulated_balance, or the pivoted DataFrame.
+        """
+        balance_by_date = self.get_balance_by_date_batch(product_names)
+        if balance_by_date is None:
+            return None
+
+        balance_by_date['cumulated_balance'] = balance_by_date.groupby('name')['balance'].cumsum()
+        if pivot:
+            cumulated = balance_by_date.pivot(index='transaction_date', columns='name', values='cumulated_balance')
+            return cumulated.ffill().fillna(0)
+        return balance_by_date
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Applies the schema migrations to a retail database.")
+    parser.add_argument("db_filename", nargs="?", default="retail.db", help="Database file, relative to the project root.")
+    parser.add_argument("--drop-name-column", action="store_true",
+                        help="Also drops transactions.name, read the product_transactions view instead.")
+    args = parser.parse_args()
+
+    retail = ESretail(args.db_filename)
+    try:
+        retail.migrate()
+        if args.drop_name_column:
+            retail.drop_name_column()
+    finally:
+        retail.conn.close()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TEST_CSV = os.path.join(os.path.dirname(__file__), "retail_15_01_2022.csv")
+
+# Cumulated import time of src.cli, in microseconds, about 60 ms when measured
+STARTUP_BUDGET_US = 250_000
+
+
+def import_times(*args: str, env: dict[str, str] | None = None) -> tuple[dict[str, int], subprocess.CompletedProcess]:
+    """
+    Runs python -X importtime with the arguments and returns the cumulated import time of each module, in microseconds.
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=PROJECT_ROOT, capture_output=True,
+                             text=True, env={**os.environ, **(env or {})})
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times, process
+
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_folder = os.path.join(self.tmp_dir.name, "data")
+        os.makedirs(self.data_folder)
+        shutil.copy(TEST_CSV, self.data_folder)
+        self.metrics_env = {"RETAIL_METRICS_DIR": os.path.join(self.tmp_dir.name, "metrics")}
+        self.cli_args = ["-m", "src.cli", "--db", os.path.join(self.tmp_dir.name, "retail.db"),
+                         "--data-folder", self.data_folder, "--datalake-folder", os.path.join(self.tmp_dir.name, "datalake")]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_startup_budget(self):
+        """Test case where the CLI is imported, neither pandas nor Prefect are and the import fits the budget."""
+        times, process = import_times("-c", "import src.cli")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertNotIn("pandas", times)
+        self.assertNotIn("numpy", times)
+        self.assertNotIn("prefect", times)
+        self.assertLess(times["src.cli"], STARTUP_BUDGET_US)
+
+    def test_run_without_prefect(self):
+        """Test case where the CLI loads a file then finds nothing new, pandas being imported by the first run only."""
+        times, process = import_times(*self.cli_args, env=self.metrics_env)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn("pandas", times)
+        self.assertNotIn("prefect", times)
+        with sqlite3.connect(os.path.join(self.tmp_dir.name, "retail.db")) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0], 10)
+        self.assertEqual(len(os.listdir(self.metrics_env["RETAIL_METRICS_DIR"])), 1)
+
+        times, process = import_times(*self.cli_args, env=self.metrics_env)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn("No CSV file to process", process.stderr)
+        self.assertNotIn("pandas", times)
+
+    def test_failed_file_skipped(self):
+        """Test case where the first file has unknown columns, it is skipped and left pending, the next one is loaded."""
+        with open(os.path.join(self.data_folder, "retail_14_01_2022.csv"), "w") as csv_file:
+            csv_file.write("a,b\n1,2\n")
+        process = subprocess.run([sys.executable, *self.cli_args], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                 env={**os.environ, **self.metrics_env})
+        self.assertEqual(process.returncode, 1, process.stderr)
+        self.assertIn("The file: retail_14_01_2022.csv could not be processed", process.stderr)
+        with sqlite3.connect(os.path.join(self.tmp_dir.name, "retail.db")) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0], 10)
+            processed = [row[0] for row in conn.execute("SELECT file_name FROM processed_files")]
+        self.assertEqual(processed, ["retail_15_01_2022.csv"])
+
+    def test_dry_run(self):
+        """Test case with --dry-run, the pending file is listed and nothing is loaded."""
+        times, process = import_times(*self.cli_args, "--dry-run")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertIn("retail_15_01_2022.csv would be processed", process.stderr)
+        self.assertNotIn("pandas", times)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "datalake")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,13 @@ import pandas as pd
 import sqlite3
 import os
 from src.retail import ESretail
-from src.etl_pipeline import *
+from src import datalake
+from src.datalake import find_csv_files, mark_processed, select_pending_files
+from src.etl import transforme_transactions, load_data, iter_transactions, tail_transactions
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 class TransactionTest(unittest.TestCase):
 
@@ -29,6 +34,9 @@ class TransactionTest(unittest.TestCase):
         )
         ''')
         self.retail.cursor.execute('DELETE FROM transactions')
+        for table in ('processed_files', 'processed_file_stats', 'file_checkpoints'):
+            if self.retail.has_table(table):
+                self.retail.cursor.execute(f'DELETE FROM {table}')
         self.retail.conn.commit()
 
     def tearDown(self):
@@ -42,4 +50,149 @@ class TransactionTest(unittest.TestCase):
         df = transforme_transactions("tests", "retail_15_01_2022.csv")
         load_data(df, self.test_db_path)
         self.assertEqual(self.retail.count_total_id(), 10)
-            
+
+
+    def test_etl_streaming(self):
+        with tempfile.TemporaryDirectory() as incoming_file_path:
+            shutil.copy(os.path.join("tests", "retail_15_01_2022.csv"), incoming_file_path)
+            chunks = list(iter_transactions(incoming_file_path, "retail_15_01_2022.csv", chunk_size=3))
+            parquet_df = pd.read_parquet(os.path.join(incoming_file_path, "retail_data_15_01_2022.parquet"))
+
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(parquet_df), 10)
+        streamed_df = pd.concat(chunks)
+        expected_df = transforme_transactions("tests", "retail_15_01_2022.csv")
+        self.assertEqual(sorted(streamed_df['id']), sorted(expected_df['id']))
+        self.assertTrue((streamed_df['transaction_date'] == '2022-01-15').all())
+
+        for chunk_df in chunks:
+            load_data(chunk_df, self.test_db_path)
+        self.assertEqual(self.retail.count_total_id(), 10)
+
+
+    def test_select_pending_files(self):
+        with tempfile.TemporaryDirectory() as data_path:
+            for csv_file_name in ["retail_15_01_2022.csv", "retail_16_01_2022.csv"]:
+                shutil.copy(os.path.join("tests", "retail_15_01_2022.csv"), os.path.join(data_path, csv_file_name))
+
+            pending_files = select_pending_files(data_path, find_csv_files(data_path), self.retail)
+            self.assertEqual(list(pending_files), ["retail_15_01_2022.csv", "retail_16_01_2022.csv"])
+            self.assertEqual(pending_files["retail_15_01_2022.csv"].sha256, pending_files["retail_16_01_2022.csv"].sha256)
+
+            mark_processed(self.retail, "retail_15_01_2022.csv", pending_files["retail_15_01_2022.csv"])
+            # Same content under another name
+            self.assertEqual(select_pending_files(data_path, find_csv_files(data_path), self.retail), {})
+            # Each name keeps its size and modification time, neither file is hashed again
+            for csv_file_name, fingerprint in pending_files.items():
+                self.assertTrue(self.retail.is_file_processed(
+                    file_name=csv_file_name, size=fingerprint.size, mtime_ns=fingerprint.mtime_ns))
+            with mock.patch('src.datalake.file_sha256') as file_sha256:
+                self.assertEqual(select_pending_files(data_path, find_csv_files(data_path), self.retail), {})
+            file_sha256.assert_not_called()
+
+            with open(os.path.join(data_path, "retail_16_01_2022.csv"), "a") as csv_file:
+                csv_file.write("9e8e3262-7ed9-4148-9092-c90cdab37da2,BUY,Ray-Ban Sunglasses,4,439.96,527.95\n")
+            pending_files = select_pending_files(data_path, find_csv_files(data_path), self.retail)
+            self.assertEqual(list(pending_files), ["retail_16_01_2022.csv"])
+
+
+    def test_etl_tail(self):
+        with open(os.path.join("tests", "retail_15_01_2022.csv"), "rb") as csv_file:
+            lines = csv_file.readlines()
+        with tempfile.TemporaryDirectory() as incoming_file_path:
+            csv_path = os.path.join(incoming_file_path, "retail_15_01_2022.csv")
+            with open(csv_path, "wb") as csv_file:
+                csv_file.write(b"".join(lines[:4]) + lines[4][:10])
+            self.assertEqual(tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path), 3)
+            self.assertEqual(self.retail.count_total_id(), 3)
+            self.assertEqual(tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path), 0)
+
+            with open(csv_path, "ab") as csv_file:
+                csv_file.write(lines[4][10:] + b"".join(lines[5:]))
+            self.assertEqual(tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path), 7)
+            self.assertEqual(self.retail.count_total_id(), 10)
+            self.assertEqual(self.retail.get_file_checkpoint("retail_15_01_2022.csv"), (os.path.getsize(csv_path), 10))
+            parquet_df = pd.read_parquet(os.path.join(incoming_file_path, "retail_data_15_01_2022.parquet"))
+            self.assertEqual(len(parquet_df), 10)
+
+
+    def test_etl_tail_duplicates_across_appends(self):
+        with open(os.path.join("tests", "retail_15_01_2022.csv"), "rb") as csv_file:
+            lines = csv_file.readlines()
+        with tempfile.TemporaryDirectory() as incoming_file_path:
+            csv_path = os.path.join(incoming_file_path, "retail_15_01_2022.csv")
+            with open(csv_path, "wb") as csv_file:
+                csv_file.write(b"".join(lines[:4]))
+            self.assertEqual(tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path), 3)
+            self.assertEqual(self.retail.count_total_id(), 3)
+
+            # A later upload repeats the id of the first row: both copies are dropped, as well as a third one
+            for appended in [lines[1] + lines[4], lines[1]]:
+                with open(csv_path, "ab") as csv_file:
+                    csv_file.write(appended)
+                tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path)
+            first_id = lines[1].split(b",")[0].decode()
+            ids = [row[0] for row in self.retail.cursor.execute("SELECT id FROM transactions")]
+            self.assertNotIn(first_id, ids)
+            self.assertEqual(len(ids), 3)
+
+            # The file read again from its beginning gives the same rows
+            self.retail.save_file_checkpoint("retail_15_01_2022.csv", 0, 0)
+            tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path)
+            self.assertEqual(sorted(row[0] for row in self.retail.cursor.execute("SELECT id FROM transactions")), sorted(ids))
+
+    def test_etl_tail_id_of_another_file(self):
+        """Test case where a second file of the date repeats an id of the first one, in its first read or in an append."""
+        with open(os.path.join("tests", "retail_15_01_2022.csv"), "rb") as csv_file:
+            lines = csv_file.readlines()
+        loaded_rows = []
+        for second_reads in ([lines[4] + lines[1]], [lines[4], lines[1]]):
+            with tempfile.TemporaryDirectory() as incoming_file_path:
+                db_path = os.path.join(incoming_file_path, "retail.db")
+                with open(os.path.join(incoming_file_path, "retail_15_01_2022.csv"), "wb") as csv_file:
+                    csv_file.write(b"".join(lines[:4]))
+                tail_transactions(incoming_file_path, "retail_15_01_2022.csv", db_path)
+
+                with open(os.path.join(incoming_file_path, "retail_15_01_2022_b.csv"), "wb") as csv_file:
+                    csv_file.write(lines[0])
+                for appended in second_reads:
+                    with open(os.path.join(incoming_file_path, "retail_15_01_2022_b.csv"), "ab") as csv_file:
+                        csv_file.write(appended)
+                    tail_transactions(incoming_file_path, "retail_15_01_2022_b.csv", db_path)
+                with sqlite3.connect(db_path) as conn:
+                    loaded_rows.append(sorted(conn.execute("SELECT id, amount_inc_tax_cents FROM transactions")))
+        # The copy of the first file is kept in both cases, the copy of the second file being ignored
+        self.assertEqual(loaded_rows[0], loaded_rows[1])
+        self.assertEqual(len(loaded_rows[0]), 4)
+        self.assertIn(lines[1].split(b",")[0].decode(), [row[0] for row in loaded_rows[0]])
+
+
+    def test_etl_no_valid_line(self):
+        """Test case where the file only has its header, or only bad lines, in each mode."""
+        with open(os.path.join("tests", "retail_15_01_2022.csv"), "rb") as csv_file:
+            header = csv_file.readline()
+        bad_lines = b"94ca3d4f-9f3e-4bbd-9b5b-2b1f0b9e2c2a,SELL,Fitbit Charge,ERROR,399.95,479.94\n"
+        for content in [header, header + bad_lines]:
+            with tempfile.TemporaryDirectory() as incoming_file_path:
+                with open(os.path.join(incoming_file_path, "retail_15_01_2022.csv"), "wb") as csv_file:
+                    csv_file.write(content)
+                self.assertTrue(transforme_transactions(incoming_file_path, "retail_15_01_2022.csv").empty)
+                os.remove(os.path.join(incoming_file_path, "retail_data_15_01_2022.parquet"))
+                chunks = list(iter_transactions(incoming_file_path, "retail_15_01_2022.csv"))
+                self.assertTrue(all(chunk_df.empty for chunk_df in chunks))
+                self.assertEqual(tail_transactions(incoming_file_path, "retail_15_01_2022.csv", self.test_db_path),
+                                 content.count(b"\n") - 1)
+                self.assertEqual(self.retail.count_total_id(), 0)
+
+
+    def test_select_appended_files(self):
+        with tempfile.TemporaryDirectory() as data_path:
+            for csv_file_name in ["retail_15_01_2022.csv", "retail_16_01_2022.csv"]:
+                shutil.copy(os.path.join("tests", "retail_15_01_2022.csv"), os.path.join(data_path, csv_file_name))
+            self.assertEqual(datalake.select_appended_files(data_path, find_csv_files(data_path), self.retail),
+                             ["retail_15_01_2022.csv", "retail_16_01_2022.csv"])
+
+            csv_size = os.path.getsize(os.path.join(data_path, "retail_15_01_2022.csv"))
+            self.retail.save_file_checkpoint("retail_15_01_2022.csv", csv_size, 10)
+            self.assertEqual(datalake.select_appended_files(data_path, find_csv_files(data_path), self.retail),
+                             ["retail_16_01_2022.csv"])
@@ -0,0 +1,92 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from src import metrics
+from src.etl import transforme_transactions, load_data
+
+TEST_CSV = os.path.join(os.path.dirname(__file__), "retail_15_01_2022.csv")
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_stage_outside_of_run(self):
+        """Test case where a stage runs outside of a run, its measures are dropped."""
+        with metrics.stage('validate', 'retail_15_01_2022.csv') as stage_metrics:
+            stage_metrics.rows_in = 10
+        self.assertEqual(stage_metrics.rows_in, 10)
+        self.assertIsNone(metrics._active_run)
+
+    def test_stages_summed_by_file(self):
+        """Test case with a stage called for each chunk of two files, the calls of a file are summed."""
+        with metrics.collect_run() as run:
+            for file_name, rows in [("a.csv", 10), ("a.csv", 5), ("b.csv", 7)]:
+                with metrics.stage('validate', file_name) as stage_metrics:
+                    stage_metrics.rows_in = rows
+                    stage_metrics.bad_lines = 1
+        validate_a, validate_b = run.stages
+        self.assertEqual((validate_a.file_name, validate_a.calls, validate_a.rows_in, validate_a.bad_lines), ("a.csv", 2, 15, 2))
+        self.assertEqual((validate_b.file_name, validate_b.calls, validate_b.rows_in), ("b.csv", 1, 7))
+        self.assertGreater(validate_a.peak_rss_bytes, 0)
+        self.assertIsNone(metrics._active_run)
+
+    def test_pipeline_stages(self):
+        """Test case where a file is transformed and loaded, each stage reports its rows and bytes in the JSON file."""
+        with tempfile.TemporaryDirectory() as folder:
+            shutil.copy(TEST_CSV, folder)
+            with metrics.collect_run() as run:
+                unique_df = transforme_transactions(folder, "retail_15_01_2022.csv")
+                load_data(unique_df, os.path.join(folder, "retail.db"), file_name="retail_15_01_2022.csv")
+            metrics_path = run.write_json(folder)
+            with open(metrics_path) as metrics_file:
+                stages = {stage['stage']: stage for stage in json.load(metrics_file)['stages']}
+
+        self.assertEqual(list(stages), ['read_csv', 'validate', 'deduplicate', 'write_parquet', 'load'])
+        self.assertEqual(stages['read_csv']['bytes_read'], os.path.getsize(TEST_CSV))
+        self.assertEqual(stages['validate']['rows_in'], 10)
+        self.assertEqual(stages['validate']['rows_out'] + stages['validate']['bad_lines'], 10)
+        self.assertEqual(stages['deduplicate']['rows_out'], len(unique_df))
+        self.assertGreater(stages['write_parquet']['bytes_written'], 0)
+        self.assertEqual(stages['load']['rows_out'], len(unique_df))
+        self.assertGreater(stages['load']['rows_per_second'], 0)
+
+    def test_profiling(self):
+        """Test case where RETAIL_PROFILER selects the profiler, its report is written next to the metrics file."""
+        with tempfile.TemporaryDirectory() as folder:
+            for profiler, extension in [("cprofile", ".prof"), ("tracemalloc", ".txt")]:
+                with mock.patch.dict(os.environ, {metrics.PROFILER_ENV: profiler, metrics.METRICS_DIR_ENV: folder}):
+                    with metrics.collect_run() as run, metrics.profiling(run):
+                        sorted(str(i) for i in range(10_000))
+                self.assertTrue(run.extra['profile'].endswith(extension))
+                self.assertTrue(os.path.exists(run.extra['profile']))
+            self.assertGreater(run.extra['tracemalloc_peak_bytes'], 0)
+
+            with metrics.collect_run() as run, metrics.profiling(run, folder):
+                pass
+            self.assertNotIn('profile', run.extra)
+
+    def test_profiling_worker_threads(self):
+        """Test case where a stage runs in a worker thread, as with the task runner, its functions are in the statistics."""
+        def sort_in_worker():
+            return sorted(str(i) for i in range(10_000))
+
+        def validate_in_worker():
+            with metrics.stage('validate', 'retail_15_01_2022.csv'):
+                sort_in_worker()
+
+        with tempfile.TemporaryDirectory() as folder:
+            with mock.patch.dict(os.environ, {metrics.PROFILER_ENV: "cprofile", metrics.METRICS_DIR_ENV: folder}):
+                with metrics.collect_run() as run, metrics.profiling(run):
+                    with ThreadPoolExecutor(max_workers=2) as executor:
+                        executor.submit(validate_in_worker).result()
+            functions = {function_name for _, _, function_name in pstats.Stats(run.extra['profile']).stats}
+        self.assertIn('sort_in_worker', functions)
+        self.assertIsNone(metrics._thread_profiles)
+
+
+if __name__ == '__main__':
+    unittest.main()
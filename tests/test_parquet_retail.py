@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.parquet_retail import PQretail
+
+
+class ParquetRetailTest(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a datalake with the Parquet files of three days.
+
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.datalake_path = self.tmp_dir.name
+        days = {
+            ('2001', '01', '01'): {
+                'id': ["94ca3d4f", "9a348783", "9e8e3262", "9e8e3262"],
+                'category': ["SELL", "BUY", "SELL", "SELL"],
+                'description': ["Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge", "Fitbit Charge"],
+                'quantity': [10, 5, 3, 3],
+                'amount_excl_tax_cents': [10000, 5000, 3000, 3000],
+                'amount_inc_tax_cents': [12000, 6000, 3600, 3600]},
+            ('2001', '01', '02'): {
+                'id': ["aad54a55", "94ca3d4f"],
+                'category': ["SELL", "SELL"],
+                'description': ["Amazon Echo Dot", "Amazon Echo Dot"],
+                'quantity': [1, 10],
+                'amount_excl_tax_cents': [1000, 10000],
+                'amount_inc_tax_cents': [1200, 12000]},
+            ('2001', '02', '01'): {
+                'id': ["ac82915d"],
+                'category': ["BUY"],
+                'description': ["Amazon Echo Dot"],
+                'quantity': [2],
+                'amount_excl_tax_cents': [2000],
+                'amount_inc_tax_cents': [2400]},
+        }
+        for (year, month, day), data in days.items():
+            folder = os.path.join(self.datalake_path, year, month, day)
+            os.makedirs(folder)
+            pd.DataFrame(data).to_parquet(os.path.join(folder, f"retail_data_{day}_{month}_{year}.parquet"), index=False)
+        self.retail = PQretail(self.datalake_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_partitions_pruned_by_date(self):
+        partitions = self.retail.partitions('2001-01-02', '2001-01-31')
+        self.assertEqual([transaction_date for transaction_date, _ in partitions], ['2001-01-02'])
+        self.assertEqual(len(self.retail.partitions()), 3)
+
+    def test_count_transactions_by_date(self):
+        self.assertEqual(self.retail.count_transactions_by_date('2001-01-01'), 2)
+        # The copy of 94ca3d4f loaded on 2001-01-01 is outside of the partition read
+        self.assertEqual(self.retail.count_transactions_by_date('2001-01-02'), 2)
+        self.assertEqual(self.retail.count_transactions_by_date('2000-01-01'), 0)
+
+    def test_count_transactions_by_date_no_deduplication(self):
+        retail = PQretail(self.datalake_path, deduplicate=False)
+        self.assertEqual(retail.count_transactions_by_date('2001-01-01'), 4)
+
+    def test_sum_total_transaction(self):
+        self.assertEqual(self.retail.sum_total_transaction(), 216.00)
+        self.assertEqual(self.retail.sum_total_transaction('2001-02-01'), 24.00)
+        self.assertEqual(PQretail(os.path.join(self.datalake_path, 'missing')).sum_total_transaction(), 0)
+
+    def test_get_balance_by_date(self):
+        result = self.retail.get_balance_by_date("Amazon Echo Dot")
+        self.assertEqual(list(result['transaction_date']), ['2001-01-01', '2001-01-02', '2001-02-01'])
+        self.assertEqual(list(result['balance']), [60.00, 12.00, -24.00])
+        self.assertTrue(self.retail.get_balance_by_date("Ray-Ban").empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+import pandas as pd
+from src.retail import ESretail
+from src.query_service import AsyncESretail
+
+
+class AsyncQueryServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """
+        Creates a database file with the transactions of two days.
+
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'retail.db')
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55"],
+            'transaction_date': ['2001-01-01', '2001-01-01', '2001-01-02', '2001-01-02'],
+            'category': ["SELL", "BUY", "SELL", "SELL"],
+            'name': ["Amazon Echo Dot", "Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge"],
+            'quantity': [10, 5, 3, 1],
+            'amount_excl_tax': [100.00, 50.00, 30.00, 10.00],
+            'amount_inc_tax': [120.00, 60.00, 36.00, 12.00]
+        }
+        retail = ESretail(self.db_path)
+        retail.bulk_import(pd.DataFrame(data))
+        retail.conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_queries(self):
+        async with AsyncESretail(self.db_path, pool_size=2) as service:
+            self.assertEqual(await service.count_transactions_by_date('2001-01-01'), 2)
+            self.assertEqual(await service.sum_total_transaction(), 228.00)
+            balance = await service.get_balance_by_date_sql("Amazon Echo Dot")
+            self.assertEqual(list(balance['balance']), [60.00, 36.00])
+            cumulated = await service.get_cumulated_balance_by_date("Amazon Echo Dot")
+            self.assertEqual(list(cumulated['cumulated_balance']), [60.00, 96.00])
+
+    async def test_identical_calls_coalesced(self):
+        async with AsyncESretail(self.db_path, pool_size=2) as service:
+            results = await asyncio.gather(*[service.get_balance_by_date_sql("Amazon Echo Dot") for _ in range(50)])
+            self.assertEqual(service.queries_run, 1)
+            self.assertEqual(service.queries_coalesced, 49)
+            self.assertTrue(all(result.equals(results[0]) for result in results))
+            self.assertIsNot(results[0], results[1])
+
+            await asyncio.gather(service.sum_total_transaction(), service.count_transactions_by_date('2001-01-02'))
+            self.assertEqual(service.queries_run, 3)
+
+    async def test_concurrent_callers_without_coalescing(self):
+        async with AsyncESretail(self.db_path, pool_size=3, coalesce=False) as service:
+            counts = await asyncio.gather(*[service.count_transactions_by_date('2001-01-02') for _ in range(120)])
+            self.assertEqual(counts, [2] * 120)
+            self.assertEqual(service.queries_run, 120)
+
+    async def test_connections_read_only(self):
+        async with AsyncESretail(self.db_path, pool_size=1) as service:
+            retail = await service._get_pool().get()
+            self.assertRaises(sqlite3.OperationalError, retail.conn.execute, 'DELETE FROM transactions')
+            service._get_pool().put_nowait(retail)
+
+    def test_pool_size(self):
+        self.assertRaises(ValueError, AsyncESretail, self.db_path, pool_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
 import pytest
 import pandas as pd
+import numpy as np
 import sqlite3
 import os
-from src.retail import ESretail
-from src.etl_pipeline import transforme_transactions
+import tempfile
+from unittest import mock
+from src.retail import ESretail, CommitPolicy, QueryCache, MIGRATIONS
+from src.etl import transforme_transactions
 import unittest
 
 class TransactionTest(unittest.TestCase):
@@ -87,6 +90,333 @@ class TransactionTest(unittest.TestCase):
 
 
 
+    def test_bulk_rollback_whole_file(self):
+        new_retail = self.retail
+        data_invalid = {
+            'id': ["94ca3d4f","9a348783","9e8e3262"],
+            'transaction_date': ['2001-01-01','2001-01-01','2001-01-01'],
+            'category' : ["SELL","BUY","BUY"],
+            'name': ["Fitbit Charge","Apple iPhone",["Ray-Ban"]],
+            'quantity': [4, 5, 5],
+            'amount_excl_tax': [399.95,449.95,799.95],
+            'amount_inc_tax': [479.94,539.94,959.94]}
+        df = pd.DataFrame(data_invalid)
+        self.assertRaises(sqlite3.Error, new_retail.bulk_import, df, batch_size=2)
+        self.assertEqual(new_retail.count_total_id(), 0)
+
+
+    def test_bulk_commit_every_rows(self):
+        new_retail = self.retail
+        data_invalid = {
+            'id': ["94ca3d4f","9a348783","9e8e3262"],
+            'transaction_date': ['2001-01-01','2001-01-01','2001-01-01'],
+            'category' : ["SELL","BUY","BUY"],
+            'name': ["Fitbit Charge","Apple iPhone",["Ray-Ban"]],
+            'quantity': [4, 5, 5],
+            'amount_excl_tax': [399.95,449.95,799.95],
+            'amount_inc_tax': [479.94,539.94,959.94]}
+        df = pd.DataFrame(data_invalid)
+        self.assertRaises(sqlite3.Error, new_retail.bulk_import, df, batch_size=2, commit_policy=CommitPolicy(every_rows=2))
+        self.assertEqual(new_retail.count_total_id(), 2)
+
+
+    def test_bulk_missing_date(self):
+        new_retail = self.retail
+        data_invalid = {
+            'id': ["94ca3d4f","9a348783"],
+            'transaction_date': ['2001-01-01', None],
+            'category' : ["SELL","BUY"],
+            'name': ["Fitbit Charge","Apple iPhone"],
+            'quantity': [4, 5],
+            'amount_excl_tax': [399.95,449.95],
+            'amount_inc_tax': [479.94,539.94]}
+        df = pd.DataFrame(data_invalid)
+        self.assertRaises(ValueError, new_retail.bulk_import, df, batch_size=1, commit_policy=CommitPolicy(every_rows=1))
+        self.assertEqual(new_retail.count_total_id(), 0)
+
+
+    def test_bulk_missing_values(self):
+        """Test case with categorical columns and missing values, they are stored as NULL, a missing name being the product ''."""
+        new_retail = self.retail
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262"],
+            'transaction_date': ['2001-01-01', '2001-01-01', '2001-01-02'],
+            'category': pd.Categorical(["SELL", None, "BUY"]),
+            'name': pd.Categorical(["Fitbit Charge", None, "Fitbit Charge"]),
+            'quantity': [4, 5, 5],
+            'amount_excl_tax_cents': pd.array([39995, None, 79995], dtype='Int64'),
+            'amount_inc_tax_cents': pd.array([47994, None, 95994], dtype='Int64')}
+        self.assertEqual(new_retail.bulk_import(pd.DataFrame(data), batch_size=2), 3)
+        rows = new_retail.conn.execute('''
+            SELECT t.category, p.name, t.quantity, t.amount_inc_tax_cents
+            FROM transactions t JOIN products p USING (product_id) ORDER BY t.id''').fetchall()
+        self.assertEqual(rows, [("SELL", "Fitbit Charge", 4, 47994), (None, "", 5, None), ("BUY", "Fitbit Charge", 5, 95994)])
+
+        data['transaction_date'] = ['2001-01-03', np.nan, '2001-01-03']
+        data['id'] = ["a1", "a2", "a3"]
+        self.assertRaises(ValueError, new_retail.bulk_import, pd.DataFrame(data))
+        self.assertEqual(new_retail.count_total_id(), 3)
+
+
+################    TEST MIGRATIONS    #################
+    def test_migrate_adds_unique_id_index(self):
+        with tempfile.TemporaryDirectory() as folder:
+            old_retail = ESretail(os.path.join(folder, 'old_retail.db'))
+            old_retail.cursor.execute('''
+            CREATE TABLE transactions (
+                id TEXT, transaction_date TEXT, category TEXT, name TEXT,
+                quantity BIGINT, amount_excl_tax FLOAT, amount_inc_tax FLOAT
+            )
+            ''')
+            old_retail.cursor.executemany(
+                "INSERT INTO transactions VALUES (?, '2001-01-01', 'SELL', 'Fitbit Charge', 4, 399.95, 479.94)",
+                [("94ca3d4f",), ("94ca3d4f",), ("9a348783",)])
+            old_retail.conn.commit()
+
+            self.assertEqual(old_retail.migrate(), len(MIGRATIONS))
+            self.assertEqual(old_retail.count_total_id(), 2)
+            self.assertEqual(old_retail.sum_total_transaction(), 959.88)
+            indexes = [row[1] for row in old_retail.cursor.execute("PRAGMA index_list(transactions)")]
+            self.assertIn("idx_transactions_id", indexes)
+            columns = [row[1] for row in old_retail.cursor.execute("PRAGMA table_info(transactions)")]
+            self.assertIn("name", columns)
+            self.assertEqual(old_retail.get_balance_by_date_sql("Fitbit Charge")['balance'].tolist(), [959.88])
+            self.assertEqual(old_retail.migrate(), len(MIGRATIONS))
+            old_retail.conn.close()
+
+
+    def test_migrate_failure_rolls_back(self):
+        with tempfile.TemporaryDirectory() as folder:
+            retail = ESretail(os.path.join(folder, 'retail.db'))
+            with mock.patch('src.retail.MIGRATIONS', MIGRATIONS[:6]):
+                self.assertEqual(retail.migrate(), 6)
+            # Migration 7 fails after creating the products table
+            failing_migrations = MIGRATIONS[:6] + [MIGRATIONS[6] + ("SELECT no_such_column FROM transactions",)] + MIGRATIONS[7:]
+            with mock.patch('src.retail.MIGRATIONS', failing_migrations):
+                self.assertRaises(sqlite3.OperationalError, retail.migrate)
+            self.assertEqual(retail.cursor.execute("PRAGMA user_version").fetchone()[0], 6)
+            self.assertFalse(retail.has_table('products'))
+            self.assertEqual(retail.migrate(), len(MIGRATIONS))
+            retail.conn.close()
+
+    def test_drop_name_column(self):
+        """Test case where the name column is dropped on demand, the loads and the summary go on through product_id."""
+        data = {
+            'id': ["94ca3d4f", "9a348783"],
+            'transaction_date': ['2001-01-01', '2001-01-01'],
+            'category': ["SELL", "SELL"],
+            'name': ["Fitbit Charge", "Apple iPhone"],
+            'quantity': [4, 5],
+            'amount_excl_tax': [399.95, 449.95],
+            'amount_inc_tax': [479.94, 539.94]}
+        with tempfile.TemporaryDirectory() as folder:
+            retail = ESretail(os.path.join(folder, 'retail.db'))
+            retail.bulk_import(pd.DataFrame(data).head(1))
+            self.assertTrue(retail.has_name_column())
+            self.assertTrue(retail.drop_name_column())
+            self.assertFalse(retail.has_name_column())
+            self.assertFalse(retail.drop_name_column())
+
+            retail.bulk_import(pd.DataFrame(data))
+            self.assertEqual(retail.get_balance_by_date_sql("Apple iPhone")['balance'].tolist(), [539.94])
+            retail.cursor.execute('''
+                UPDATE transactions SET product_id = (SELECT product_id FROM products WHERE name = 'Apple iPhone')
+                WHERE id = '94ca3d4f'
+            ''')
+            retail.conn.commit()
+            self.assertEqual(retail.get_balance_by_date_sql("Apple iPhone")['balance'].tolist(), [1019.88])
+            self.assertTrue(retail.get_balance_by_date_sql("Fitbit Charge").empty)
+            retail.conn.close()
+
+
+################    TEST PROFILES    #################
+    def test_profile_ingest(self):
+        with tempfile.TemporaryDirectory() as folder:
+            new_retail = ESretail(os.path.join(folder, 'retail.db'), profile='ingest')
+            self.assertEqual(new_retail.cursor.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(new_retail.cursor.execute("PRAGMA temp_store").fetchone()[0], 2)
+            new_retail.conn.close()
+
+
+    def test_profile_readonly(self):
+        new_retail = ESretail('tests/retail_test.db', profile='readonly')
+        self.assertEqual(new_retail.count_total_id(), 0)
+        self.assertRaises(sqlite3.OperationalError, new_retail.cursor.execute, 'DELETE FROM transactions')
+        new_retail.use_profile('default')
+        new_retail.cursor.execute('DELETE FROM transactions')
+        new_retail.conn.close()
+
+
+    def test_profile_unknown(self):
+        self.assertRaises(ValueError, self.retail.use_profile, 'fast')
+
+
+################    TEST QUERY PLANS    #################
+    def queries_run(self, retail, call):
+        """Returns the SELECT statements run by a query method, with their parameters inlined."""
+        statements = []
+        retail.conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            retail.conn.set_trace_callback(None)
+        return [statement for statement in statements if statement.lstrip().startswith(("SELECT", "WITH"))]
+
+
+    def assertUsesIndex(self, query, params=(), sorts_result=False):
+        plan = self.retail.explain_query_plan(query, params)
+        for table in ("transactions", "daily_product_balance"):
+            self.assertFalse(any(step.startswith(f"SCAN {table}") for step in plan), plan)
+        self.assertTrue(any("USING COVERING INDEX" in step or "USING PRIMARY KEY" in step for step in plan), plan)
+        # Only the few rows of an intermediate result may be sorted
+        self.assertEqual(any("TEMP B-TREE" in step for step in plan), sorts_result, plan)
+
+
+    def test_count_transactions_by_date_uses_index(self):
+        self.retail.migrate()
+        query, = self.queries_run(self.retail, lambda: self.retail.count_transactions_by_date('2001-01-01'))
+        self.assertUsesIndex(query)
+
+
+    def test_get_balance_by_date_sql_uses_index(self):
+        self.retail.migrate()
+        query, = self.queries_run(self.retail, lambda: self.retail.get_balance_by_date_sql("Amazon Echo Dot"))
+        self.assertIn("daily_balance", query)
+        self.assertUsesIndex(query)
+
+
+    def test_get_cumulated_balance_by_date_uses_index(self):
+        self.retail.migrate()
+        prefix_query, cumulated_query = self.queries_run(
+            self.retail, lambda: self.retail.get_cumulated_balance_by_date("Amazon Echo Dot", "2001-01-01", "2001-12-31"))
+        self.assertUsesIndex(prefix_query)
+        self.assertUsesIndex(cumulated_query, sorts_result=True)
+
+
+    def test_legacy_queries_scan_once(self):
+        """Test case with a database not migrated yet, the converted amounts are read in a single scan of the table."""
+        with tempfile.TemporaryDirectory() as folder:
+            legacy_retail = ESretail(os.path.join(folder, 'legacy_retail.db'))
+            legacy_retail.cursor.execute('''
+            CREATE TABLE transactions (
+                id TEXT, transaction_date TEXT, category TEXT, name TEXT,
+                quantity BIGINT, amount_excl_tax FLOAT, amount_inc_tax FLOAT
+            )
+            ''')
+            calls = [
+                lambda: legacy_retail.sum_total_transaction(),
+                lambda: legacy_retail.get_balance_by_date_sql("Amazon Echo Dot"),
+                lambda: legacy_retail.get_cumulated_balance_by_date("Amazon Echo Dot", "2001-01-01", "2001-12-31"),
+            ]
+            for call in calls:
+                queries = self.queries_run(legacy_retail, call)
+                self.assertTrue(queries)
+                for query in queries:
+                    plan = legacy_retail.explain_query_plan(query)
+                    # The subquery of LEGACY_TRANSACTIONS is read as the table is scanned rather than materialized
+                    self.assertEqual(plan.count("SCAN transactions"), 1, plan)
+                    self.assertFalse(any("MATERIALIZE" in step for step in plan), plan)
+            legacy_retail.conn.close()
+
+
+################    TEST QUERY CACHE    #################
+    def make_transactions(self, ids, transaction_date, name):
+        return pd.DataFrame({
+            'id': ids,
+            'transaction_date': [transaction_date] * len(ids),
+            'category': ["SELL"] * len(ids),
+            'name': [name] * len(ids),
+            'quantity': [1] * len(ids),
+            'amount_excl_tax': [10.00] * len(ids),
+            'amount_inc_tax': [12.00] * len(ids)})
+
+
+    def test_cache_invalidated_by_scope(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = QueryCache()
+            new_retail = ESretail(os.path.join(folder, 'retail.db'), cache=cache)
+            new_retail.bulk_import(self.make_transactions(["94ca3d4f"], '2001-01-01', "Amazon Echo Dot"))
+            new_retail.bulk_import(self.make_transactions(["9a348783"], '2001-01-02', "Fitbit Charge"))
+            for _ in range(2):
+                self.assertEqual(new_retail.sum_total_transaction(), 24.00)
+                self.assertEqual(list(new_retail.get_balance_by_date_sql("Fitbit Charge")['balance']), [12.00])
+                self.assertEqual(new_retail.count_transactions_by_date('2001-01-02'), 1)
+            self.assertEqual((cache.misses, cache.hits), (3, 3))
+
+            new_retail.bulk_import(self.make_transactions(["9e8e3262"], '2001-01-01', "Amazon Echo Dot"))
+            self.assertEqual(new_retail.sum_total_transaction(), 36.00)
+            self.assertEqual(list(new_retail.get_balance_by_date_sql("Fitbit Charge")['balance']), [12.00])
+            self.assertEqual(new_retail.count_transactions_by_date('2001-01-02'), 1)
+            self.assertEqual(cache.stats(), {'entries': 3, 'hits': 5, 'misses': 4, 'evictions': 0, 'expirations': 0, 'invalidations': 1})
+
+            # A file already loaded inserts nothing and keeps the cached results
+            new_retail.bulk_import(self.make_transactions(["9e8e3262"], '2001-01-01', "Amazon Echo Dot"))
+            self.assertEqual(new_retail.sum_total_transaction(), 36.00)
+            self.assertEqual(cache.invalidations, 1)
+            new_retail.conn.close()
+
+
+    def test_cache_sees_other_connections(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_path = os.path.join(folder, 'retail.db')
+            loader = ESretail(db_path)
+            loader.bulk_import(self.make_transactions(["94ca3d4f"], '2001-01-01', "Amazon Echo Dot"))
+            reader = ESretail(db_path, profile='readonly', cache=QueryCache())
+            self.assertEqual(reader.get_balance_by_date_sql("Amazon Echo Dot").loc[0, 'balance'], 12.00)
+            loader.bulk_import(self.make_transactions(["9a348783"], '2001-01-01', "Amazon Echo Dot"))
+            self.assertEqual(reader.get_balance_by_date_sql("Amazon Echo Dot").loc[0, 'balance'], 24.00)
+            self.assertEqual(reader.cache.invalidations, 1)
+            loader.conn.close()
+            reader.conn.close()
+
+
+    def test_cache_limits(self):
+        with tempfile.TemporaryDirectory() as folder:
+            new_retail = ESretail(os.path.join(folder, 'retail.db'), cache=QueryCache(max_entries=1))
+            new_retail.bulk_import(self.make_transactions(["94ca3d4f"], '2001-01-01', "Amazon Echo Dot"))
+            new_retail.count_transactions_by_date('2001-01-01')
+            new_retail.count_transactions_by_date('2001-01-02')
+            new_retail.count_transactions_by_date('2001-01-01')
+            self.assertEqual((new_retail.cache.hits, new_retail.cache.evictions), (0, 2))
+
+            new_retail.cache = QueryCache(ttl_seconds=0)
+            new_retail.count_total_id()
+            new_retail.count_total_id()
+            self.assertEqual((new_retail.cache.hits, new_retail.cache.expirations), (0, 1))
+            new_retail.conn.close()
+
+
+################    TEST DAILY SUMMARY    #################
+    def test_daily_summary_follows_transactions(self):
+        new_retail = self.retail
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55"],
+            'transaction_date': ['2001-01-01', '2001-02-01', '2001-01-01', '2001-01-01'],
+            'category': ["SELL", "BUY", "SELL", "BUY"],
+            'name': ["Amazon Echo Dot", "Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge"],
+            'quantity': [10, 5, 3, 1],
+            'amount_excl_tax': [100.00, 50.00, 30.00, 10.00],
+            'amount_inc_tax': [120.00, 60.00, 36.00, 12.00]
+        }
+        new_retail.bulk_import(pd.DataFrame(data))
+        new_retail.bulk_import(pd.DataFrame(data).head(2))
+        self.assertTrue(new_retail.has_daily_summary())
+        summary = pd.read_sql_query(
+            "SELECT * FROM daily_balance ORDER BY name, transaction_date, category", new_retail.conn)
+        self.assertEqual(len(summary), 3)
+        self.assertEqual(summary.loc[0, 'amount_inc_tax_cents'], 15600)
+        self.assertEqual(summary.loc[0, 'quantity'], 13)
+        self.assertEqual(summary.loc[0, 'transaction_count'], 2)
+
+        new_retail.cursor.execute("DELETE FROM transactions WHERE id = '9e8e3262'")
+        new_retail.cursor.execute("UPDATE transactions SET name = 'Apple iPhone' WHERE id = 'aad54a55'")
+        new_retail.conn.commit()
+        result = new_retail.get_balance_by_date_sql("Amazon Echo Dot")
+        self.assertEqual(result.loc[0, 'balance'], 120.00)
+        self.assertEqual(new_retail.get_balance_by_date_sql("Fitbit Charge").empty, True)
+        self.assertEqual(new_retail.sum_total_transaction(), 192.00)
+
+
 ################    TEST count transaction by date    #################
     def test_count_transactions_by_date_no_data(self):
         new_retail = self.retail
@@ -181,6 +511,23 @@ class TransactionTest(unittest.TestCase):
         self.assertEqual(new_retail.sum_total_transaction(), 539.94)
 
 
+    def test_sum_total_transaction_exact(self):
+        new_retail = self.retail
+        data = {
+            'id': [f"94ca3d{i:02d}" for i in range(10)],
+            'transaction_date': ['2001-01-01'] * 10,
+            'category': ["SELL"] * 10,
+            'name': ["Fitbit Charge"] * 10,
+            'quantity': [1] * 10,
+            'amount_excl_tax': [0.08] * 10,
+            'amount_inc_tax': [0.10] * 10
+        }
+        new_retail.bulk_import(pd.DataFrame(data))
+        self.assertEqual(new_retail.sum_total_transaction(), 1.00)
+        stored = new_retail.cursor.execute("SELECT DISTINCT amount_inc_tax_cents FROM transactions").fetchall()
+        self.assertEqual(stored, [(10,)])
+
+
     def test_sum_total_transaction_multiple_entries(self):
         new_retail = self.retail
         data = {
@@ -323,6 +670,28 @@ class TransactionTest(unittest.TestCase):
         self.assertEqual(result.loc[1, 'cumulated_balance'], 96.00)
 
 
+    def test_get_cumulated_balance_by_date_range(self):
+        new_retail = self.retail
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55"],
+            'transaction_date': ['2001-01-01', '2001-02-01', '2001-03-01', '2001-04-01'],
+            'category': ["SELL", "BUY", "SELL", "SELL"],
+            'name': ["Amazon Echo Dot", "Amazon Echo Dot", "Amazon Echo Dot", "Amazon Echo Dot"],
+            'quantity': [10, 5, 3, 1],
+            'amount_excl_tax': [100.00, 50.00, 30.00, 10.00],
+            'amount_inc_tax': [120.00, 60.00, 36.00, 12.00]
+        }
+        df = pd.DataFrame(data)
+        new_retail.bulk_import(df)
+        result = new_retail.get_cumulated_balance_by_date("Amazon Echo Dot", start_date='2001-02-01', end_date='2001-03-01')
+        self.assertEqual(list(result['transaction_date']), ['2001-02-01', '2001-03-01'])
+        self.assertEqual(list(result['balance']), [-60.00, 36.00])
+        self.assertEqual(list(result['cumulated_balance']), [60.00, 96.00])
+        result = new_retail.get_cumulated_balance_by_date("Amazon Echo Dot", start_date='2001-04-01')
+        self.assertEqual(list(result['cumulated_balance']), [108.00])
+        self.assertIsNone(new_retail.get_cumulated_balance_by_date("Amazon Echo Dot", start_date='2002-01-01'))
+
+
     def test_get_cumulated_balance_by_date_no_matching_product(self):
         new_retail = self.retail
         data = {
@@ -359,6 +728,49 @@ class TransactionTest(unittest.TestCase):
         self.assertEqual(len(result), 1)
 
 
+################    TEST balance batch    #################
+    def test_get_balance_by_date_batch(self):
+        new_retail = self.retail
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55"],
+            'transaction_date': ['2001-01-01', '2001-02-01', '2001-01-01', '2001-03-01'],
+            'category': ["SELL", "BUY", "SELL", "BUY"],
+            'name': ["Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge", "Ray-Ban"],
+            'quantity': [10, 5, 3, 1],
+            'amount_excl_tax': [100.00, 50.00, 30.00, 10.00],
+            'amount_inc_tax': [120.00, 60.00, 36.00, 12.00]
+        }
+        new_retail.bulk_import(pd.DataFrame(data))
+        result = new_retail.get_balance_by_date_batch(["Amazon Echo Dot", "Fitbit Charge", "Unknown"])
+        self.assertEqual(list(result['name']), ["Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge"])
+        self.assertEqual(list(result['balance']), [120.00, -60.00, 36.00])
+        self.assertEqual(len(new_retail.get_balance_by_date_batch()), 4)
+        pivoted = new_retail.get_balance_by_date_batch(pivot=True)
+        self.assertEqual(pivoted.loc['2001-03-01', 'Ray-Ban'], -12.00)
+        self.assertEqual(pivoted.loc['2001-03-01', 'Fitbit Charge'], 0)
+
+
+    def test_get_cumulated_balance_by_date_batch(self):
+        new_retail = self.retail
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55"],
+            'transaction_date': ['2001-01-01', '2001-02-01', '2001-01-01', '2001-03-01'],
+            'category': ["SELL", "BUY", "SELL", "BUY"],
+            'name': ["Amazon Echo Dot", "Amazon Echo Dot", "Fitbit Charge", "Fitbit Charge"],
+            'quantity': [10, 5, 3, 1],
+            'amount_excl_tax': [100.00, 50.00, 30.00, 10.00],
+            'amount_inc_tax': [120.00, 60.00, 36.00, 12.00]
+        }
+        new_retail.bulk_import(pd.DataFrame(data))
+        result = new_retail.get_cumulated_balance_by_date_batch()
+        for name in ["Amazon Echo Dot", "Fitbit Charge"]:
+            expected = new_retail.get_cumulated_balance_by_date(name)
+            self.assertEqual(list(result.loc[result['name'] == name, 'cumulated_balance']), list(expected['cumulated_balance']))
+        pivoted = new_retail.get_cumulated_balance_by_date_batch(pivot=True)
+        self.assertEqual(list(pivoted['Amazon Echo Dot']), [120.00, 60.00, 60.00])
+        self.assertEqual(list(pivoted['Fitbit Charge']), [36.00, 36.00, 24.00])
+
+
 
 
 # def test_full_etl_pipeline(test_db):
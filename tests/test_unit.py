@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
 import unittest
-from src.etl_pipeline import read_transaction_file
+import os
+import tempfile
+import uuid
+from src.datalake import find_csv_files, parquet_file_name, copy_to_datalake
+from src.etl import HAS_PYARROW, read_transaction_csv, as_string_category, read_transaction_file, iter_transactions, \
+    shard_byte_ranges, read_transaction_file_parallel, transforme_transactions, id_keys, DuplicateIds
+from benchmarks.synthetic import write_transaction_csv
 
 
 class TransactionTest(unittest.TestCase):
@@ -52,10 +58,10 @@ class TransactionTest(unittest.TestCase):
         df = pd.DataFrame(data_valid)
         res_df, res_badlines = read_transaction_file(df)
         res_types_cols = [str(x) for x in res_df.dtypes]
-        expected_types = ['object', 'object', 'object', 'int64', 'float64', 'float64']
+        expected_types = ['object', 'category', 'category', 'int64', 'Int64', 'Int64']
         self.assertEqual(len(res_df), 5)
         self.assertEqual(res_types_cols, expected_types)
-        self.assertEqual(res_df.loc[res_df['id'] == '94ca3d4f', 'amount_inc_tax'].values[0], float(479.94))
+        self.assertEqual(res_df.loc[res_df['id'] == '94ca3d4f', 'amount_inc_tax_cents'].values[0], 47994)
         self.assertEqual(res_df.loc[res_df['id'] == '9a348783', 'quantity'].values[0], int(5))
         self.assertEqual(len(res_badlines), 0)
         
@@ -70,15 +76,235 @@ class TransactionTest(unittest.TestCase):
         df = pd.DataFrame(data_invalid)
         res_df, res_badlines = read_transaction_file(df)
         res_types_cols = [str(x) for x in res_df.dtypes]
-        expected_types = ['object', 'object', 'object', 'int64', 'float64', 'float64']
+        expected_types = ['object', 'category', 'category', 'int64', 'Int64', 'Int64']
         self.assertEqual(len(res_df), 3)
         self.assertEqual(res_types_cols, expected_types)
-        self.assertEqual(res_df.loc[res_df['id'] == '9e8e3262', 'amount_inc_tax'].values[0], float(959.94))
+        self.assertEqual(res_df.loc[res_df['id'] == '9e8e3262', 'amount_inc_tax_cents'].values[0], 95994)
         self.assertEqual(res_df.loc[res_df['id'] == 'aad54a55', 'quantity'].values[0], int(5))
         self.assertEqual(len(res_badlines), 2)
         self.assertIn("94ca3d4f", res_badlines)
         self.assertIn("ac82915d", res_badlines)
 
+    def test_transform_missing_values(self):
+        """Test case with missing cells. A missing quantity is a bad line, a missing amount is kept as NA."""
+        data_missing = {
+            'id': ["94ca3d4f","9a348783","9e8e3262"],
+            'category' : ["SELL","BUY","BUY"],
+            'description': ["Fitbit Charge","Apple iPhone","Ray-Ban"],
+            'quantity': [4, None, 5],
+            'amount_excl_tax': [399.95,449.95,799.95],
+            'amount_inc_tax': [479.94,539.94,None]}
+        df = pd.DataFrame(data_missing)
+        res_df, res_badlines = read_transaction_file(df)
+        self.assertEqual(len(res_df), 2)
+        self.assertEqual(res_badlines, ["9a348783"])
+        self.assertTrue(pd.isna(res_df.loc[res_df['id'] == '9e8e3262', 'amount_inc_tax_cents'].values[0]))
+        self.assertEqual(list(res_df.index), [0, 1])
+
+    def test_transform_tax_mismatch(self):
+        """Test case where amount_inc_tax is not amount_excl_tax plus 20%. Expected a bad line beyond one cent."""
+        data_tax = {
+            'id': ["94ca3d4f","9a348783","9e8e3262"],
+            'category' : ["SELL","BUY","BUY"],
+            'description': ["Fitbit Charge","Apple iPhone","Ray-Ban"],
+            'quantity': [4, 5, 5],
+            'amount_excl_tax': [399.95,449.95,799.95],
+            'amount_inc_tax': [479.95,449.95,959.94]}
+        df = pd.DataFrame(data_tax)
+        res_df, res_badlines = read_transaction_file(df)
+        self.assertEqual(res_badlines, ["9a348783"])
+        self.assertEqual(list(res_df['amount_excl_tax_cents']), [39995, 79995])
+
+    def test_streaming_duplicates_like_in_memory(self):
+        """Test case where the copies of an id are in different chunks and one copy is a bad line, both modes load the same rows."""
+        data = {
+            'id': ["a", "b", "c", "a", "d", "c", "c"],
+            'category': ["SELL", "BUY", "BUY", "BUY", "SELL", "SELL", "BUY"],
+            'description': ["Fitbit Charge", "Apple iPhone", "Ray-Ban", "Levis Jeans", "Fitbit Charge", "Ray-Ban", "Ray-Ban"],
+            'quantity': [4, 5, 5, "x", 4, 4, 5],
+            'amount_excl_tax': [399.95, 449.95, 799.95, 269.97, 2199.98, 399.95, 799.95],
+            'amount_inc_tax': [479.94, 539.94, 959.94, 323.96, 2639.98, 479.94, 959.94]}
+        with tempfile.TemporaryDirectory() as folder:
+            pd.DataFrame(data).to_csv(os.path.join(folder, "retail_15_01_2022.csv"), index=False)
+            streamed_df = pd.concat(iter_transactions(folder, "retail_15_01_2022.csv", chunk_size=2))
+            unique_df = transforme_transactions(folder, "retail_15_01_2022.csv")
+        self.assertEqual(sorted(streamed_df['id']), ["a", "b", "d"])
+        self.assertEqual(sorted(streamed_df['id']), sorted(unique_df['id']))
+
+    def test_streaming_parquet_categories(self):
+        """Test case where the chunks have different categories, the Parquet file is dictionary-encoded and reads back whole."""
+        data = {
+            'id': ["a", "b", "c", "d", "e"],
+            'category': ["SELL", "SELL", "BUY", "BUY", None],
+            'description': ["Fitbit Charge", "Fitbit Charge", "Apple iPhone", "Ray-Ban", "Ray-Ban"],
+            'quantity': [4, 5, 5, 1, 4],
+            'amount_excl_tax': [399.95, 449.95, 799.95, 269.97, 2199.98],
+            'amount_inc_tax': [479.94, 539.94, 959.94, 323.96, 2639.98]}
+        with tempfile.TemporaryDirectory() as folder:
+            pd.DataFrame(data).to_csv(os.path.join(folder, "retail_15_01_2022.csv"), index=False)
+            streamed_df = pd.concat(iter_transactions(folder, "retail_15_01_2022.csv", chunk_size=2))
+            parquet_df = pd.read_parquet(os.path.join(folder, parquet_file_name("retail_15_01_2022.csv")), engine='fastparquet')
+            self.assertEqual(sorted(os.listdir(folder)), ["retail_15_01_2022.csv", parquet_file_name("retail_15_01_2022.csv")])
+        self.assertIsInstance(parquet_df['description'].dtype, pd.CategoricalDtype)
+        self.assertEqual(parquet_df['description'].tolist(), data['description'])
+        self.assertEqual(parquet_df['category'].tolist(), ["SELL", "SELL", "BUY", "BUY", "nan"])
+        self.assertEqual(streamed_df['name'].tolist(), data['description'])
+
+    def test_id_keys(self):
+        """Test case with UUIDs, parsed to their 128-bit value, and other ids, hashed."""
+        ids = ["0284f92e-54f7-4766-880d-2cc5a8993a89", "94ca3d4f", "0284F92E-54F7-4766-880D-2CC5A8993A89", "0284f92e-54f7-4766-880d-2cc5a8993a8g"]
+        keys = id_keys(pd.Series(ids))
+        self.assertEqual(keys.dtype, np.dtype('S16'))
+        self.assertEqual(keys[0], uuid.UUID(ids[0]).bytes)
+        self.assertEqual(len(set(keys)), 4)
+        self.assertEqual(list(id_keys(pd.Series(ids[::-1]))), list(keys[::-1]))
+
+    def test_duplicate_ids_across_adds(self):
+        """Test case where the copies of an id are added separately, all the copies are flagged."""
+        uuids = [str(uuid.UUID(int=i)) for i in range(5)]
+        duplicate_ids = DuplicateIds(pd.Series(uuids[:3]))
+        self.assertFalse(duplicate_ids.is_duplicated(pd.Series(uuids)).any())
+        duplicate_ids.add(pd.Series([uuids[1], uuids[3], "a"]))
+        duplicate_ids.add(pd.Series([uuids[1], "a"]))
+        self.assertEqual(list(duplicate_ids.is_duplicated(pd.Series(uuids + ["a"]))), [False, True, False, False, False, True])
+        self.assertEqual(duplicate_ids.ids_added, 8)
+        self.assertEqual(duplicate_ids.bytes_per_id, 16 * (5 + 2) / 5)
+
+    def test_shard_byte_ranges(self):
+        """Test case where the file is split in ranges, each one holding whole lines."""
+        with tempfile.TemporaryDirectory() as folder:
+            csv_path = os.path.join(folder, "retail_15_01_2022.csv")
+            pd.DataFrame({'id': [f"id{i}" * (i % 5 + 1) for i in range(50)]}).to_csv(csv_path, index=False)
+            header, ranges = shard_byte_ranges(csv_path, 4, min_shard_bytes=1)
+            with open(csv_path, 'rb') as file:
+                content = file.read()
+            self.assertEqual(header, b"id\n")
+            self.assertEqual(len(ranges), 4)
+            self.assertEqual(b"".join(content[start:end] for start, end in ranges), content[len(header):])
+            self.assertTrue(all(content[end - 1:end] == b"\n" for _, end in ranges))
+            self.assertEqual(shard_byte_ranges(csv_path, 4)[1], [(len(header), len(content))])
+
+    def test_read_transaction_file_parallel(self):
+        """Test case where the bad lines and the duplicated ids are in different shards."""
+        data = {
+            'id': ["94ca3d4f", "9a348783", "9e8e3262", "aad54a55", "ac82915d", "94ca3d4f"] * 3,
+            'category': ["SELL", "BUY", "BUY", "BUY", "SELL", "SELL"] * 3,
+            'description': ["Fitbit Charge", "Apple iPhone", "Ray-Ban", "Levis Jeans", "Fitbit Charge", "Ray-Ban"] * 3,
+            'quantity': ["ERROR", 5, 5, 5, 4, 4] * 3,
+            'amount_excl_tax': [399.95, 449.95, 799.95, 269.97, 2199.98, 399.95] * 3,
+            'amount_inc_tax': [479.94, 539.94, 959.94, 323.96, 2639.98, 479.94] * 3}
+        data['id'] = [f"{id}{i // 6}" if i % 6 in (1, 2) else id for i, id in enumerate(data['id'])]
+        with tempfile.TemporaryDirectory() as folder:
+            csv_path = os.path.join(folder, "retail_15_01_2022.csv")
+            pd.DataFrame(data).to_csv(csv_path, index=False)
+            expected_df, expected_bad_lines = read_transaction_file(pd.read_csv(csv_path))
+            res_df, res_bad_lines = read_transaction_file_parallel(csv_path, 3, min_shard_bytes=1)
+            self.assertEqual(res_bad_lines, expected_bad_lines)
+            pd.testing.assert_frame_equal(res_df, expected_df, check_categorical=False)
+
+            unique_df = transforme_transactions(folder, "retail_15_01_2022.csv", processes=3)
+            self.assertEqual(sorted(unique_df['id']), ["9a3487830", "9a3487831", "9a3487832", "9e8e32620", "9e8e32621", "9e8e32622"])
+
+    def test_find_csv_files(self):
+        """Test case with several files in the data folder, only the CSV files are returned."""
+        with tempfile.TemporaryDirectory() as folder:
+            for file_name in ["retail_16_01_2022.csv", "retail_15_01_2022.csv", "notes.txt"]:
+                open(os.path.join(folder, file_name), "w").close()
+            self.assertEqual(find_csv_files(folder), ["retail_15_01_2022.csv", "retail_16_01_2022.csv"])
+
+    def test_parquet_file_name(self):
+        self.assertEqual(parquet_file_name("retail_15_01_2022.csv"), "retail_data_15_01_2022.parquet")
+        self.assertEqual(parquet_file_name("retail_15_01_2022_2.csv"), "retail_data_15_01_2022_2.parquet")
+
+    def test_copy_to_datalake(self):
+        """Test case where the data folder and the datalake are on the same filesystem, the file is linked."""
+        with tempfile.TemporaryDirectory() as folder:
+            source_path = os.path.join(folder, "retail_15_01_2022.csv")
+            target_path = os.path.join(folder, "datalake.csv")
+            with open(source_path, "w") as source_file:
+                source_file.write("id\n94ca3d4f\n")
+            self.assertEqual(copy_to_datalake(source_path, target_path), "link")
+            self.assertEqual(copy_to_datalake(source_path, target_path), "link")
+            self.assertTrue(os.path.samefile(source_path, target_path))
+            self.assertEqual(os.listdir(folder).count("datalake.csv.tmp"), 0)
+
+    def test_copy_to_datalake_append(self):
+        """Test case where the copy of a growing file is not a link, only the appended bytes are copied."""
+        with tempfile.TemporaryDirectory() as folder:
+            source_path = os.path.join(folder, "retail_15_01_2022.csv")
+            target_path = os.path.join(folder, "datalake.csv")
+            with open(source_path, "w") as source_file:
+                source_file.write("id\n94ca3d4f\n9a348783\n")
+            with open(target_path, "w") as target_file:
+                target_file.write("id\n94ca3d4f\n")
+            self.assertEqual(copy_to_datalake(source_path, target_path, append=True), "append")
+            with open(target_path) as target_file:
+                self.assertEqual(target_file.read(), "id\n94ca3d4f\n9a348783\n")
+
+            # A copy larger than the source is replaced
+            with open(source_path, "w") as source_file:
+                source_file.write("id\n")
+            self.assertEqual(copy_to_datalake(source_path, target_path, append=True), "link")
+
+    def test_synthetic_transactions(self):
+        """Test case with a synthetic file of the benchmarks, its bad lines and duplicated ids are the ones generated."""
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = write_transaction_csv(folder, "2022-01-15", 5000, seed=1, bad_line_rate=0.02, duplicate_rate=0.01)
+            self.assertEqual(file_name, "retail_15_01_2022.csv")
+            df = pd.read_csv(os.path.join(folder, file_name))
+            clean_df, bad_lines = read_transaction_file(df)
+
+        self.assertTrue(60 <= len(bad_lines) <= 140)
+        self.assertEqual(len(clean_df) + len(bad_lines), 5000)
+        self.assertTrue(30 <= df['id'].duplicated().sum() <= 70)
+        self.assertTrue(((clean_df['amount_excl_tax_cents'] * 120 + 50) // 100 == clean_df['amount_inc_tax_cents']).all())
+
+    def test_read_transaction_csv(self):
+        """Test case with bad lines, missing descriptions and a missing id, the typed parse validates as the inferred one."""
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = write_transaction_csv(folder, "2022-01-15", 2000, seed=2, bad_line_rate=0.02)
+            csv_path = os.path.join(folder, file_name)
+            df = pd.read_csv(csv_path)
+            df.loc[[3, 7], 'description'] = np.nan
+            df.loc[11, 'id'] = np.nan
+            df.to_csv(csv_path, index=False)
+            expected_df, expected_bad_lines = read_transaction_file(pd.read_csv(csv_path))
+
+            engines = ['c', 'pyarrow'] if HAS_PYARROW else ['c']
+            for engine in engines:
+                typed_df = read_transaction_csv(csv_path, engine=engine)
+                self.assertEqual(typed_df['category'].dtype, 'category')
+                res_df, res_bad_lines = read_transaction_file(typed_df)
+                self.assertEqual(res_bad_lines, expected_bad_lines)
+                pd.testing.assert_frame_equal(res_df, expected_df)
+                self.assertNotIn('None', res_df['id'].tolist())
+        self.assertRaises(ValueError, read_transaction_csv, csv_path, engine='python')
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_read_transaction_csv_arrow(self):
+        """Test case with a bad line, pyarrow parses the whole file with the declared types, except the column of the bad cell."""
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = write_transaction_csv(folder, "2022-01-15", 2000, seed=3)
+            csv_path = os.path.join(folder, file_name)
+            df = pd.read_csv(csv_path, dtype={'quantity': str})
+            df.loc[5, 'quantity'] = "x"
+            df.loc[9, 'amount_inc_tax'] = np.nan
+            df.to_csv(csv_path, index=False)
+            typed_df = read_transaction_csv(csv_path, engine='pyarrow')
+        self.assertEqual(typed_df.dtypes.astype(str).tolist(), ['object', 'category', 'category', 'object', 'float64', 'float64'])
+        self.assertEqual(typed_df.loc[5, 'quantity'], "x")
+        self.assertTrue(np.isnan(typed_df.loc[9, 'amount_inc_tax']))
+        clean_df, bad_lines = read_transaction_file(typed_df)
+        self.assertEqual(bad_lines, [df.loc[5, 'id']])
+        self.assertTrue(pd.isna(clean_df.loc[clean_df['id'] == df.loc[9, 'id'], 'amount_inc_tax_cents']).all())
+
+    def test_as_string_category(self):
+        """Test case with a categorical column, it is converted as astype(str).astype('category') would."""
+        values = pd.Series(["b", "a", np.nan, "c", "a"], index=[2, 4, 6, 8, 10])
+        expected = values.astype(str).astype('category')
+        pd.testing.assert_series_equal(as_string_category(values.astype('category')), expected)
+        pd.testing.assert_series_equal(as_string_category(values.astype('category').iloc[:2]), expected.iloc[:2].cat.remove_unused_categories())
+
     # @pytest.fixture
     # def test_db():
     #     # Setup: Créer une base de données de test